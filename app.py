@@ -9,6 +9,7 @@ from flask import Flask, request, jsonify
 from flask_babel import Babel
 from flask_migrate import Migrate
 from flask_moment import Moment
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
 import openai
@@ -21,6 +22,25 @@ from models import (
     Producto, Articulo, Testimonial, Afiliado, AdsenseConfig
 )
 from utils import slugify
+from services.click_counter import click_counter
+from services.click_events import clicks_cli
+from services.static_export import export_cli
+from services.click_filter import click_filter
+from services.referral_redirect import referral_links, ReferralRedirectMiddleware
+from services.layout_cache import layout_cache, SOCIAL_MEDIA_LINKS, ADSENSE_CONFIG
+from services.ad_schedule import ad_schedule
+from services.query_stats import query_stats
+from services.invalidation import tag_versions
+from services.page_cache import page_cache
+from services.conditional import content_validators
+from services.markdown_cache import markdown_cache
+from services.template_cache import template_cache, templates_cli
+from services.search_index import search_cli, include_object, register_search_hooks
+from services.suggest_index import suggest_index
+from services.spelling import spelling
+from services.serializers import init_json_provider
+from services.change_feed import register_change_feed_hooks
+from services.compression import compression
 
 # -------------------- CARGAR VARIABLES DE ENTORNO --------------------
 load_dotenv()
@@ -31,8 +51,7 @@ def get_application_locale():
 
 # -------------------- INYECTAR DATOS GLOBALES --------------------
 def inject_social_media_links():
-    links = SocialMediaLink.query.filter_by(is_visible=True).order_by(SocialMediaLink.order_num).all()
-    return dict(social_media_links=links)
+    return dict(social_media_links=layout_cache.lazy(SOCIAL_MEDIA_LINKS))
 
 # -------------------- FÁBRICA DE APLICACIONES PRINCIPALES --------------------
 def create_app():
@@ -45,13 +64,91 @@ def create_app():
     app.config['BABEL_DEFAULT_LOCALE'] = 'es'
     app.config['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
+    # Referral clicks are buffered in memory and written in batches
+    app.config['CLICK_FLUSH_INTERVAL_MS'] = int(os.getenv('CLICK_FLUSH_INTERVAL_MS', 500))
+    app.config['CLICK_FLUSH_MAX_PENDING'] = int(os.getenv('CLICK_FLUSH_MAX_PENDING', 200))
+    app.config['REFERRAL_LINKS_TTL'] = int(os.getenv('REFERRAL_LINKS_TTL', 60))
+    # Optional raw click log (click_event), rolled up into the daily totals
+    app.config['CLICK_EVENT_LOG'] = os.getenv('CLICK_EVENT_LOG', '0') == '1'
+    app.config['CLICK_ROLLUP_INTERVAL_S'] = int(os.getenv('CLICK_ROLLUP_INTERVAL_S', 30))
+    app.config['CLICK_EVENT_RETENTION_DAYS'] = int(os.getenv('CLICK_EVENT_RETENTION_DAYS', 30))
+    # Bot and duplicate clicks are not billed (CLICK_DEDUP_WINDOW_S=0 disables deduplication)
+    app.config['CLICK_FILTER_BOTS'] = os.getenv('CLICK_FILTER_BOTS', '1') == '1'
+    app.config['CLICK_DEDUP_WINDOW_S'] = int(os.getenv('CLICK_DEDUP_WINDOW_S', 30))
+    app.config['CLICK_DEDUP_CAPACITY'] = int(os.getenv('CLICK_DEDUP_CAPACITY', 100000))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted (0: use the socket address)
+    app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))
+    # Social links, AdSense and ads are cached per process; admin edits clear them
+    app.config['LAYOUT_CACHE_TTL'] = int(os.getenv('LAYOUT_CACHE_TTL', 60))
+    # Anonymous catalog pages are cached whole; content changes are tracked with
+    # versioned dependency tags that other workers poll every CACHE_TAG_POLL_S
+    app.config['PAGE_CACHE'] = os.getenv('PAGE_CACHE', '1') == '1'
+    app.config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', 300))
+    app.config['PAGE_CACHE_STALE_S'] = int(os.getenv('PAGE_CACHE_STALE_S', 60))
+    app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 1000))
+    app.config['CACHE_TAG_POLL_S'] = float(os.getenv('CACHE_TAG_POLL_S', 2))
+    # Part of every ETag; defaults to a fingerprint of the templates
+    app.config['RELEASE_ID'] = os.getenv('RELEASE_ID')
+    # flask export site: pre-rendered public pages for static hosting
+    app.config['STATIC_EXPORT_DIR'] = os.getenv('STATIC_EXPORT_DIR', os.path.join(app.instance_path, 'static_site'))
+    app.config['STATIC_EXPORT_BASE_URL'] = os.getenv('STATIC_EXPORT_BASE_URL', 'http://localhost')
+    # Article HTML not stored in articulo.contenido_html is kept in an LRU of this size
+    app.config['MARKDOWN_CACHE_SIZE'] = int(os.getenv('MARKDOWN_CACHE_SIZE', 256))
+    # Compiled templates, prebuilt with 'flask templates compile' ('' disables),
+    # and those loaded while the app is created ('all' for every template)
+    app.config['TEMPLATE_CACHE_DIR'] = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(app.root_path, '.jinja_cache'))
+    app.config['TEMPLATE_WARMUP'] = os.getenv('TEMPLATE_WARMUP', 'base.html,index.html,product_detail.html')
+    # JSON encoder behind jsonify(): 'default' for the standard library one, 'orjson' (if installed) to opt in
+    app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'default')
+    # Rows per page of /api/productos and /api/articulos, unless ?limit= says otherwise (up to the maximum).
+    # Clients that send neither ?limit= nor ?after= get up to API_UNPAGED_LIMIT rows and a Deprecation header.
+    app.config['API_PAGE_SIZE'] = int(os.getenv('API_PAGE_SIZE', 100))
+    app.config['API_MAX_PAGE_SIZE'] = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+    app.config['API_UNPAGED_LIMIT'] = int(os.getenv('API_UNPAGED_LIMIT', 1000))
+    # Seconds a product change waits before /api/productos/changes hands it out (slow commits)
+    app.config['CHANGE_FEED_SETTLE_S'] = float(os.getenv('CHANGE_FEED_SETTLE_S', 5))
+    # gzip/brotli for text responses of at least COMPRESS_MIN_SIZE bytes; HTML_MINIFY strips indentation from pages
+    app.config['COMPRESS'] = os.getenv('COMPRESS', '1') == '1'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_GZIP_LEVEL'] = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    app.config['HTML_MINIFY'] = os.getenv('HTML_MINIFY', '0') == '1'
+    # Keys accepted by /api/productos/batch in one request
+    app.config['API_BATCH_MAX'] = int(os.getenv('API_BATCH_MAX', 500))
+    # Suggestions returned by /api/suggest unless ?limit= asks for fewer or more (max 20)
+    app.config['SUGGEST_LIMIT'] = int(os.getenv('SUGGEST_LIMIT', 8))
+    # "Did you mean" vocabulary: most frequent words kept, and minimum seconds between reloads
+    app.config['SPELLING_MAX_WORDS'] = int(os.getenv('SPELLING_MAX_WORDS', 50000))
+    app.config['SPELLING_REFRESH_S'] = float(os.getenv('SPELLING_REFRESH_S', 300))
+    # Adds X-Query-Count / X-Layout-Skipped headers to every response
+    app.config['QUERY_STATS'] = os.getenv('QUERY_STATS', '0') == '1'
+
     # ----------- EXTENSIONS -----------
     db.init_app(app)
     login_manager.init_app(app)
-    Migrate(app, db)
+    Migrate(app, db, include_object=include_object)
     Babel(app, locale_selector=get_application_locale)
     Moment(app)
     csrf = CSRFProtect(app) # noqa: F841
+    click_filter.init_app(app)
+    click_counter.init_app(app)
+    referral_links.init_app(app)
+    tag_versions.init_app(app)
+    layout_cache.init_app(app)
+    content_validators.init_app(app)
+    page_cache.init_app(app)
+    query_stats.init_app(app)
+    markdown_cache.init_app(app)
+    suggest_index.init_app(app)
+    spelling.init_app(app)
+    init_json_provider(app)
+    compression.init_app(app)
+    app.cli.add_command(clicks_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(search_cli)
+    register_search_hooks()
+    register_change_feed_hooks()
 
     login_manager.login_view = 'admin.admin_login'
     login_manager.login_message_category = 'info'
@@ -69,38 +166,44 @@ def create_app():
     app.register_blueprint(public_bp)
     app.register_blueprint(api_bp)
 
+    # ----------- REFERRAL FAST PATH -----------
+    # /ref/<afiliado_id> is answered from memory before the Flask stack runs
+    app.wsgi_app = ReferralRedirectMiddleware(app.wsgi_app, referral_links, click_counter)
+    if app.config['TRUSTED_PROXIES']:
+        # Outermost, so the referral fast path also sees the real client address
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
     # ----------- GLOBAL CONTEXT INJECTION -----------
     app.context_processor(inject_social_media_links)
 
     @app.context_processor
     def inject_adsense_config():
-        config = AdsenseConfig.query.first()
-        if config:
-            return dict(
-                adsense_client_id=config.adsense_client_id,
-                adsense_slot_1=config.adsense_slot_1,
-                adsense_slot_2=config.adsense_slot_2,
-                adsense_slot_3=config.adsense_slot_3,
-            )
+        # Lazy: the config is only read if the template uses one of these
         return dict(
-            adsense_client_id='',
-            adsense_slot_1='',
-            adsense_slot_2='',
-            adsense_slot_3=''
+            adsense_client_id=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_client_id'),
+            adsense_slot_1=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_1'),
+            adsense_slot_2=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_2'),
+            adsense_slot_3=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_3'),
+            # Names used by the public templates for the same slots
+            adsense_slot_header=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_1'),
+            adsense_slot_sidebar=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_2'),
+            adsense_slot_content=layout_cache.lazy(ADSENSE_CONFIG, 'adsense_slot_3'),
+            adsense_slot_footer='',
         )
 
+    # Templates ask for the ads of their own slot, e.g. ads_for_slot('destacado'),
+    # or for every live one with active_ads('destacado') to rotate them client-side
+    app.add_template_global(ad_schedule.ads_for_slot, 'ads_for_slot')
+    app.add_template_global(ad_schedule.active, 'active_ads')
+
     @app.context_processor
     def inject_now():
         return {'now': datetime.now(timezone.utc)}
 
     # ----------- CUSTOM JINJA2 FILTERS -----------
-    import markdown
+    # 'markdown' is registered by markdown_cache
     from babel.numbers import format_currency as babel_format_currency
 
-    @app.template_filter('markdown')
-    def markdown_filter(text):
-        return markdown.markdown(text)
-
     @app.template_filter('format_currency')
     def format_currency_filter(value, currency='USD', locale='es_MX'):
         try:
@@ -149,6 +252,10 @@ def create_app():
         except Exception as e:
             return jsonify({"error": f"Un error inesperado ocurrió: {str(e)}"}), 500
 
+    # ----------- TEMPLATE WARM-UP -----------
+    # Last, so every filter and global the templates use is registered
+    template_cache.init_app(app)
+
     return app
 
 # -------------------- INITIAL DATA CREATION --------------------
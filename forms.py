@@ -1,7 +1,7 @@
 # C:\Users\joran\OneDrive\data\Documentos\LMSGI\afiliados_app\forms.py
 
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, FloatField, SelectField, SubmitField, PasswordField, BooleanField, DateTimeLocalField
+from wtforms import StringField, TextAreaField, FloatField, SelectField, SubmitField, PasswordField, BooleanField, DateTimeLocalField, IntegerField
 from wtforms.validators import DataRequired, URL, NumberRange, Optional, Length, ValidationError, Email
 from wtforms_sqlalchemy.fields import QuerySelectField
 from models import Producto, Afiliado # Removed AdsenseConfig as it's not directly used here
@@ -121,6 +121,7 @@ class AdvertisementForm(FlaskForm):
 
     start_date = DateTimeLocalField('Fecha de Inicio (Opcional)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
     end_date = DateTimeLocalField('Fecha de Fin (Opcional)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
+    weight = IntegerField('Peso en la rotación', default=1, validators=[DataRequired(), NumberRange(min=1, max=1000)])
 
     submit = SubmitField('Guardar Anuncio')
 
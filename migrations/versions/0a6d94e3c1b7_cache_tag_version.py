@@ -0,0 +1,33 @@
+"""Cache dependency tag versions
+
+Revision ID: 0a6d94e3c1b7
+Revises: f71c3b8e2a05
+Create Date: 2026-10-17 13:42:30.117604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d94e3c1b7'
+down_revision = 'f71c3b8e2a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_tag_version',
+    sa.Column('tag', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+    with op.batch_alter_table('cache_tag_version', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cache_tag_version_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cache_tag_version', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cache_tag_version_version'))
+
+    op.drop_table('cache_tag_version')
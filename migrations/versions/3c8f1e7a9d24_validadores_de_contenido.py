@@ -0,0 +1,33 @@
+"""Content timestamps for conditional GET
+
+Revision ID: 3c8f1e7a9d24
+Revises: 0a6d94e3c1b7
+Create Date: 2026-10-17 14:20:03.655172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f1e7a9d24'
+down_revision = '0a6d94e3c1b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('articulo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fecha_actualizacion', sa.DateTime(), nullable=True))
+    op.execute('UPDATE articulo SET fecha_actualizacion = fecha WHERE fecha_actualizacion IS NULL')
+
+    with op.batch_alter_table('cache_tag_version', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('cache_tag_version', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('articulo', schema=None) as batch_op:
+        batch_op.drop_column('fecha_actualizacion')
@@ -0,0 +1,76 @@
+"""Full-text search index for products and articles
+
+Revision ID: 5b7e0c93a4f1
+Revises: 8d2f5a61c0e9
+Create Date: 2026-10-18 09:12:27.540913
+
+"""
+import re
+from html import unescape
+from unicodedata import normalize
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0c93a4f1'
+down_revision = '8d2f5a61c0e9'
+branch_labels = None
+depends_on = None
+
+
+def fold(value):
+    # Same as services.search_index.fold, frozen for this migration
+    if not value:
+        return ''
+    value = normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^\w\s]+', ' ', value).lower().split())
+
+
+def html_text(html):
+    # Same as services.search_index.html_text, frozen for this migration
+    if not html:
+        return ''
+    html = re.sub(r'<(script|style)\b.*?</\1\s*>', ' ', html, flags=re.IGNORECASE | re.DOTALL)
+    return unescape(re.sub(r'<!--.*?-->|<[^>]*>', ' ', html, flags=re.DOTALL))
+
+
+def upgrade():
+    connection = op.get_bind()
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5("
+                   "kind UNINDEXED, ref_id UNINDEXED, title, body, prefix='2 3')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE TABLE search_index ("
+                   "kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, title TEXT NOT NULL, body TEXT NOT NULL, "
+                   "document tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+                   ") STORED, PRIMARY KEY (kind, ref_id))")
+        op.execute("CREATE INDEX ix_search_index_document ON search_index USING GIN (document)")
+    else:
+        op.create_table(
+            'search_index',
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('ref_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.Text(), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint('kind', 'ref_id')
+        )
+
+    # Backfill (later changes are indexed by the application's session hook)
+    insert = sa.text("INSERT INTO search_index (kind, ref_id, title, body) VALUES (:kind, :ref_id, :title, :body)")
+    # Articles are indexed by their visible text: contenido_html (8d2f5a61c0e9) without the markup
+    for kind, table, title, body, text in (('producto', 'producto', 'nombre', 'descripcion', fold),
+                                           ('articulo', 'articulo', 'titulo', 'contenido_html',
+                                            lambda html: fold(html_text(html)))):
+        rows = connection.execute(sa.text(f"SELECT id, {title}, {body} FROM {table}")).all()
+        if rows:
+            connection.execute(insert, [
+                {'kind': kind, 'ref_id': ref_id, 'title': fold(t), 'body': text(b)} for ref_id, t, b in rows
+            ])
+
+
+def downgrade():
+    op.execute("DROP TABLE search_index")
@@ -0,0 +1,56 @@
+"""Unique (afiliado_id, fecha) on estadisticas_afiliados
+
+Revision ID: 5c1e9a7d3b20
+Revises: a83e70198752
+Create Date: 2026-10-17 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a7d3b20'
+down_revision = 'a83e70198752'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('estadisticas_afiliados')}
+
+    # The first migration created the column as 'clics' while the model uses 'clicks'
+    if 'clics' in columns and 'clicks' not in columns:
+        with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+            batch_op.alter_column('clics', new_column_name='clicks', existing_type=sa.Integer(), existing_nullable=True)
+
+    # Fold duplicate (afiliado_id, fecha) rows into the oldest one before adding the constraint
+    op.execute("""
+        UPDATE estadisticas_afiliados
+        SET clicks = (SELECT SUM(COALESCE(d.clicks, 0)) FROM estadisticas_afiliados d
+                      WHERE d.afiliado_id = estadisticas_afiliados.afiliado_id AND d.fecha = estadisticas_afiliados.fecha),
+            registros = (SELECT SUM(COALESCE(d.registros, 0)) FROM estadisticas_afiliados d
+                         WHERE d.afiliado_id = estadisticas_afiliados.afiliado_id AND d.fecha = estadisticas_afiliados.fecha),
+            ventas = (SELECT SUM(COALESCE(d.ventas, 0)) FROM estadisticas_afiliados d
+                      WHERE d.afiliado_id = estadisticas_afiliados.afiliado_id AND d.fecha = estadisticas_afiliados.fecha),
+            comision_generada = (SELECT SUM(COALESCE(d.comision_generada, 0)) FROM estadisticas_afiliados d
+                                 WHERE d.afiliado_id = estadisticas_afiliados.afiliado_id AND d.fecha = estadisticas_afiliados.fecha)
+        WHERE id IN (SELECT MIN(id) FROM estadisticas_afiliados
+                     WHERE fecha IS NOT NULL
+                     GROUP BY afiliado_id, fecha HAVING COUNT(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM estadisticas_afiliados
+        WHERE fecha IS NOT NULL
+          AND id NOT IN (SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM estadisticas_afiliados
+                                              WHERE fecha IS NOT NULL
+                                              GROUP BY afiliado_id, fecha) AS keep)
+    """)
+
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_estadisticas_afiliados_afiliado_fecha', ['afiliado_id', 'fecha'])
+
+
+def downgrade():
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_estadisticas_afiliados_afiliado_fecha', type_='unique')
@@ -0,0 +1,46 @@
+"""Raw click event log and rollup state
+
+Revision ID: 8d2f4b6a1c97
+Revises: 5c1e9a7d3b20
+Create Date: 2026-10-17 11:02:47.218530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4b6a1c97'
+down_revision = '5c1e9a7d3b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('click_event',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('afiliado_id', sa.Integer(), nullable=False),
+    sa.Column('referrer_hash', sa.BigInteger(), nullable=True),
+    sa.Column('ua_class', sa.SmallInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('click_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_click_event_dia'), ['dia'], unique=False)
+
+    op.create_table('click_rollup_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_event_id', sa.BigInteger(), nullable=False),
+    sa.Column('seen_event_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('click_rollup_state')
+    with op.batch_alter_table('click_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_click_event_dia'))
+
+    op.drop_table('click_event')
@@ -0,0 +1,38 @@
+"""Pre-rendered article HTML
+
+Revision ID: 8d2f5a61c0e9
+Revises: 3c8f1e7a9d24
+Create Date: 2026-10-17 23:05:41.318206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import markdown
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f5a61c0e9'
+down_revision = '3c8f1e7a9d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('articulo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('contenido_html', sa.Text(), nullable=True))
+
+    # Backfill: same rendering as services.markdown_cache.render_markdown
+    articulo = sa.table('articulo', sa.column('id', sa.Integer), sa.column('contenido', sa.Text),
+                        sa.column('contenido_html', sa.Text))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(articulo.c.id, articulo.c.contenido)).all()
+    for articulo_id, contenido in rows:
+        connection.execute(
+            articulo.update().where(articulo.c.id == articulo_id)
+            .values(contenido_html=markdown.markdown(contenido or ''))
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('articulo', schema=None) as batch_op:
+        batch_op.drop_column('contenido_html')
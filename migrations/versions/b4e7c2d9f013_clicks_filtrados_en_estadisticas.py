@@ -0,0 +1,28 @@
+"""Filtered click counters on estadisticas_afiliados
+
+Revision ID: b4e7c2d9f013
+Revises: 8d2f4b6a1c97
+Create Date: 2026-10-17 11:48:05.771942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7c2d9f013'
+down_revision = '8d2f4b6a1c97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('clicks_bot', sa.Integer(), server_default='0', nullable=True))
+        batch_op.add_column(sa.Column('clicks_duplicados', sa.Integer(), server_default='0', nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.drop_column('clicks_duplicados')
+        batch_op.drop_column('clicks_bot')
@@ -0,0 +1,43 @@
+"""Product change feed: update index and tombstones
+
+Revision ID: c6a4e1f08b37
+Revises: 5b7e0c93a4f1
+Create Date: 2026-10-18 10:12:27.540913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a4e1f08b37'
+down_revision = '5b7e0c93a4f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows without a timestamp would never show up in the feed
+    op.execute('UPDATE producto SET fecha_actualizacion = COALESCE(fecha_creacion, CURRENT_TIMESTAMP) '
+               'WHERE fecha_actualizacion IS NULL')
+    with op.batch_alter_table('producto', schema=None) as batch_op:
+        batch_op.create_index('ix_producto_fecha_actualizacion_id', ['fecha_actualizacion', 'id'], unique=False)
+
+    op.create_table('producto_eliminado',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('slug', sa.String(length=200), nullable=False),
+    sa.Column('external_id', sa.String(length=100), nullable=True),
+    sa.Column('fecha_eliminacion', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('producto_eliminado', schema=None) as batch_op:
+        batch_op.create_index('ix_producto_eliminado_fecha_eliminacion_id', ['fecha_eliminacion', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('producto_eliminado', schema=None) as batch_op:
+        batch_op.drop_index('ix_producto_eliminado_fecha_eliminacion_id')
+    op.drop_table('producto_eliminado')
+
+    with op.batch_alter_table('producto', schema=None) as batch_op:
+        batch_op.drop_index('ix_producto_fecha_actualizacion_id')
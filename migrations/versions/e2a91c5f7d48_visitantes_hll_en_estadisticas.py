@@ -0,0 +1,26 @@
+"""Unique visitor sketch on estadisticas_afiliados
+
+Revision ID: e2a91c5f7d48
+Revises: b4e7c2d9f013
+Create Date: 2026-10-17 12:31:44.208365
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a91c5f7d48'
+down_revision = 'b4e7c2d9f013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('visitantes_hll', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('estadisticas_afiliados', schema=None) as batch_op:
+        batch_op.drop_column('visitantes_hll')
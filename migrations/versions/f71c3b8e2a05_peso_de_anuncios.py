@@ -0,0 +1,26 @@
+"""Rotation weight on advertisement
+
+Revision ID: f71c3b8e2a05
+Revises: e2a91c5f7d48
+Create Date: 2026-10-17 13:05:12.480913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f71c3b8e2a05'
+down_revision = 'e2a91c5f7d48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('advertisement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('weight', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('advertisement', schema=None) as batch_op:
+        batch_op.drop_column('weight')
@@ -34,6 +34,10 @@ class Subcategoria(db.Model):
 
 class Producto(db.Model):
     __tablename__ = 'producto'
+    # Change feed order (/api/productos/changes)
+    __table_args__ = (
+        db.Index('ix_producto_fecha_actualizacion_id', 'fecha_actualizacion', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(200), nullable=False)
     slug = db.Column(db.String(200), unique=True, nullable=False)
@@ -43,20 +47,41 @@ class Producto(db.Model):
     link = db.Column(db.String(255), nullable=False)
     subcategoria_id = db.Column(db.Integer, db.ForeignKey('subcategoria.id'), nullable=True)
     external_id = db.Column(db.String(100), unique=True, nullable=True) # ID from external API
-    fecha_creacion = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    fecha_actualizacion = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    fecha_creacion = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    fecha_actualizacion = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f'<Producto {self.nombre}>'
 
+class ProductoEliminado(db.Model):
+    """
+    Tombstone of a deleted product, written in the same transaction as the
+    delete (services/change_feed.py), so replicas following the change feed
+    learn about it.
+    """
+    __tablename__ = 'producto_eliminado'
+    __table_args__ = (
+        db.Index('ix_producto_eliminado_fecha_eliminacion_id', 'fecha_eliminacion', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False) # Id the product had
+    slug = db.Column(db.String(200), nullable=False)
+    external_id = db.Column(db.String(100), nullable=True)
+    fecha_eliminacion = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<ProductoEliminado {self.id}>'
+
 class Articulo(db.Model):
     __tablename__ = 'articulo'
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
     slug = db.Column(db.String(200), unique=True, nullable=False)
     contenido = db.Column(db.Text, nullable=False)
+    # Rendered from contenido on every assignment (services/markdown_cache.py)
+    contenido_html = db.Column(db.Text, nullable=True)
     autor = db.Column(db.String(100), nullable=False)
-    fecha = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    fecha = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    fecha_actualizacion = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     imagen = db.Column(db.String(255), nullable=True)
 
     def __repr__(self):
@@ -132,6 +157,7 @@ class Advertisement(db.Model):
     adsense_slot_id = db.Column(db.String(100), nullable=True)
     start_date = db.Column(db.DateTime, nullable=True)
     end_date = db.Column(db.DateTime, nullable=True)
+    weight = db.Column(db.Integer, default=1, server_default='1', nullable=False) # Share of impressions within its slot
 
     def __repr__(self):
         return f'<Advertisement {self.title} ({self.type})>'
@@ -149,10 +175,17 @@ class Afiliado(db.Model):
 
 class EstadisticaAfiliado(db.Model):
     __tablename__ = 'estadisticas_afiliados'
+    # One row per affiliate and day, so click deltas can be upserted atomically
+    __table_args__ = (
+        db.UniqueConstraint('afiliado_id', 'fecha', name='uq_estadisticas_afiliados_afiliado_fecha'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     afiliado_id = db.Column(db.Integer, db.ForeignKey('afiliados.id'), nullable=False)
     fecha = db.Column(db.Date, default=date.today) # Using date.today for Date type
     clicks = db.Column(db.Integer, default=0)
+    clicks_bot = db.Column(db.Integer, default=0, server_default='0') # Filtered: crawler user agents
+    clicks_duplicados = db.Column(db.Integer, default=0, server_default='0') # Filtered: repeated IP within the dedup window
+    visitantes_hll = db.Column(db.LargeBinary) # HyperLogLog sketch of billable visitors (services/hyperloglog.py)
     registros = db.Column(db.Integer, default=0)
     ventas = db.Column(db.Integer, default=0)
     comision_generada = db.Column(db.Float, default=0.0)
@@ -164,6 +197,48 @@ class EstadisticaAfiliado(db.Model):
     def __repr__(self):
         return f'<EstadisticaAfiliado Afiliado: {self.afiliado_id}, Fecha: {self.fecha}>'
 
+class ClickEvent(db.Model):
+    """
+    Append-only log of raw referral clicks, written in bulk by the click counter
+    and folded into EstadisticaAfiliado by services.click_events.rollup_click_events.
+    """
+    __tablename__ = 'click_event'
+    # INTEGER PRIMARY KEY is the rowid on SQLite; BIGINT elsewhere
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    dia = db.Column(db.Date, nullable=False, index=True) # Day partition, used for rollups and pruning
+    afiliado_id = db.Column(db.Integer, nullable=False) # No FK: the log must never block the hot path
+    referrer_hash = db.Column(db.BigInteger, nullable=True) # 64-bit hash of the referrer origin + path
+    ua_class = db.Column(db.SmallInteger, nullable=False, default=0) # See services.click_events.UA_CLASS_NAMES
+
+    def __repr__(self):
+        return f'<ClickEvent {self.id} Afiliado: {self.afiliado_id}>'
+
+class ClickRollupState(db.Model):
+    """High-water marks of the click_event -> estadisticas_afiliados rollup (single row)."""
+    __tablename__ = 'click_rollup_state'
+    id = db.Column(db.Integer, primary_key=True)
+    last_event_id = db.Column(db.BigInteger, nullable=False, default=0) # Everything <= this id is folded
+    seen_event_id = db.Column(db.BigInteger, nullable=False, default=0) # Max id seen by the previous run
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ClickRollupState {self.last_event_id}>'
+
+class CacheTagVersion(db.Model):
+    """
+    Version of each cache dependency tag (e.g. 'product:3'), bumped in the
+    same transaction as the content change. The '*' row holds the global
+    counter new versions are drawn from (services/invalidation.py).
+    """
+    __tablename__ = 'cache_tag_version'
+    tag = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, nullable=True) # UTC, feeds Last-Modified
+
+    def __repr__(self):
+        return f'<CacheTagVersion {self.tag}={self.version}>'
+
 class AdsenseConfig(db.Model):
     __tablename__ = 'adsense_config'
     id = db.Column(db.Integer, primary_key=True)
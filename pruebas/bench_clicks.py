@@ -0,0 +1,102 @@
+"""
+Throughput benchmark for /ref/<afiliado_id> click counting.
+
+Compares the old strategy (SELECT + read-modify-write + commit per click)
+with the write-behind ClickCounter (in-memory count + batched flush), and
+the per-request cost of the Flask /ref/ view against the WSGI fast path.
+
+    python -m pruebas.bench_clicks [clicks]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['CLICK_FLUSH_INTERVAL_MS'] = '100'
+    os.environ['CLICK_FLUSH_MAX_PENDING'] = '500'
+    from app import create_app
+    from extensions import db
+    from models import Afiliado
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        afiliados = [
+            Afiliado(nombre=f'Afiliado {i}', email=f'a{i}@example.com',
+                     enlace_referido=f'https://example.com/ref/{i}', activo=True)
+            for i in range(10)
+        ]
+        db.session.add_all(afiliados)
+        db.session.commit()
+        return app, [a.id for a in afiliados]
+
+
+def per_click_commit(app, ids, clicks):
+    from extensions import db
+    from models import EstadisticaAfiliado
+    with app.app_context():
+        for i in range(clicks):
+            afiliado_id = ids[i % len(ids)]
+            estadistica = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id, fecha=date.today()).first()
+            if estadistica:
+                estadistica.clicks += 1
+            else:
+                db.session.add(EstadisticaAfiliado(afiliado_id=afiliado_id, clicks=1, fecha=date.today()))
+            db.session.commit()
+
+
+def batched(app, ids, clicks):
+    from services.click_counter import click_counter
+    for i in range(clicks):
+        click_counter.record(ids[i % len(ids)])
+    click_counter.flush()
+
+
+def total_clicks(app):
+    from extensions import db
+    from models import EstadisticaAfiliado
+    with app.app_context():
+        return db.session.query(db.func.sum(EstadisticaAfiliado.clicks)).scalar() or 0
+
+
+def redirect_latency(app, ids, requests):
+    """Microseconds per /ref/ request through the given WSGI callable."""
+    from werkzeug.test import EnvironBuilder
+    from services.click_counter import click_counter
+
+    environ = EnvironBuilder(path=f'/ref/{ids[0]}').get_environ()
+    statuses = []
+    start_response = lambda status, headers, exc_info=None: statuses.append(status)  # noqa: E731
+    results = {}
+    for name, wsgi in (('flask view', app.wsgi_app.wsgi_app), ('wsgi fast path', app.wsgi_app)):
+        wsgi(dict(environ), start_response)
+        start = time.perf_counter()
+        for _ in range(requests):
+            b''.join(wsgi(dict(environ), start_response))
+        results[name] = (time.perf_counter() - start) / requests * 1e6
+    click_counter.flush()
+    return results
+
+
+def main():
+    clicks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        app, ids = build_app(os.path.join(tmp, 'bench.db'))
+        for name, strategy in (('per-click commit', per_click_commit), ('write-behind batch', batched)):
+            before = total_clicks(app)
+            start = time.perf_counter()
+            strategy(app, ids, clicks)
+            elapsed = time.perf_counter() - start
+            written = total_clicks(app) - before
+            print(f"{name:>20}: {clicks} clicks in {elapsed:.3f}s -> {clicks / elapsed:,.0f} clicks/s (written: {written})")
+        for name, micros in redirect_latency(app, ids, clicks).items():
+            print(f"{name:>20}: {micros:,.1f} us per redirect")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Per-view cost of article bodies on /guia/<slug>.
+
+Compares rendering the Markdown on every view (the old 'markdown' filter)
+with the HTML stored in articulo.contenido_html and with the content-hash
+LRU used for text without it. The page cache is disabled so every request
+renders the template.
+
+    python -m pruebas.bench_markdown [requests] [paragraphs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def long_article(paragraphs):
+    sections = []
+    for i in range(paragraphs):
+        sections.append(
+            f"## Sección {i}\n\n"
+            f"Comparamos **modelos** y *precios* con [enlaces](https://example.com/{i}).\n\n"
+            "- Batería de larga duración\n- Pantalla de 14 pulgadas\n- `USB-C` y HDMI\n\n"
+            "> Consejo: revisa la garantía antes de comprar.\n"
+        )
+    return "\n".join(sections)
+
+
+def build_app(db_path, paragraphs):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['PAGE_CACHE'] = '0'
+    from app import create_app
+    from extensions import db
+    from models import Articulo
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(Articulo(titulo='Guía larga', slug='guia-larga', contenido=long_article(paragraphs), autor='Bench'))
+        db.session.commit()
+    return app
+
+
+def markdown_ms(app, requests):
+    """Milliseconds of Markdown work per view, measured at the filter."""
+    import markdown
+    from models import Articulo
+    from services.markdown_cache import markdown_cache
+    with app.app_context():
+        articulo = Articulo.query.filter_by(slug='guia-larga').one()
+        text, stored = articulo.contenido, articulo.contenido_html
+    strategies = (
+        ('every view', lambda: markdown.markdown(text)),
+        ('content-hash LRU', lambda: markdown_cache.filter(text)),
+        ('stored column', lambda: markdown_cache.filter(text, stored)),
+    )
+    results = {}
+    for name, render in strategies:
+        render()
+        start = time.perf_counter()
+        for _ in range(requests):
+            render()
+        results[name] = (time.perf_counter() - start) / requests * 1e3
+    return results
+
+
+def request_ms(app, requests):
+    """Milliseconds per full /guia/<slug> request with each filter."""
+    import markdown
+    from markupsafe import Markup
+    from services.markdown_cache import markdown_cache
+    client = app.test_client()
+    results = {}
+    for name, markdown_filter in (
+        ('every view', lambda text, rendered=None: Markup(markdown.markdown(text))),
+        ('stored column', markdown_cache.filter),
+    ):
+        app.jinja_env.filters['markdown'] = markdown_filter
+        client.get('/guia/guia-larga')
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get('/guia/guia-larga')
+        results[name] = (time.perf_counter() - start) / requests * 1e3
+    app.jinja_env.filters['markdown'] = markdown_cache.filter
+    return results
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    paragraphs = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'), paragraphs)
+        print(f"Article: {len(long_article(paragraphs)):,} characters of Markdown")
+        for name, ms in markdown_ms(app, requests).items():
+            print(f"{'filter, ' + name:>26}: {ms:.3f} ms per view")
+        for name, ms in request_ms(app, requests).items():
+            print(f"{'request, ' + name:>26}: {ms:.3f} ms per view")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Peak memory of a full catalog export: one JSON array vs NDJSON streaming.
+
+Fills a temporary SQLite database with synthetic products, then measures
+each mode in a new process (peak RSS above the RSS right after create_app,
+Linux only):
+
+- list + jsonify: every ORM object loaded with .all(), a list of dicts,
+  then one JSON document (what /api/productos did before pagination)
+- ndjson stream: /api/productos.ndjson read to the end through the test client
+
+    python -m pruebas.bench_ndjson [products]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+from app import create_app
+app = create_app()
+# Current resident set (KiB), not the peak: create_app() may have peaked higher
+with open('/proc/self/statm') as statm:
+    baseline = int(statm.read().split()[1]) * resource.getpagesize() // 1024
+start = time.perf_counter()
+if {mode!r} == 'list':
+    from flask import jsonify
+    from models import Producto
+    with app.test_request_context():
+        size = len(jsonify([{{
+            'id': p.id, 'nombre': p.nombre, 'slug': p.slug, 'precio': p.precio, 'descripcion': p.descripcion,
+            'imagen': p.imagen, 'link': p.link, 'subcategoria_id': p.subcategoria_id, 'external_id': p.external_id,
+            'fecha_creacion': p.fecha_creacion.isoformat() if p.fecha_creacion else None,
+            'fecha_actualizacion': p.fecha_actualizacion.isoformat() if p.fecha_actualizacion else None,
+        }} for p in Producto.query.all()]).get_data())
+else:
+    size = 0
+    with app.test_client() as client:
+        for chunk in client.get('/api/productos.ndjson', buffered=False).response:
+            size += len(chunk)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'bytes': size, 'seconds': elapsed, 'peak_mb': (peak - baseline) / 1024}}))
+"""
+
+
+def fill(total):
+    from app import create_app
+    from extensions import db
+    from models import Categoria, Subcategoria, Producto
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        categoria = Categoria(nombre='Tecnología', slug='tecnologia')
+        db.session.add(categoria)
+        db.session.flush()
+        subcategoria = Subcategoria(nombre='Portátiles', slug='portatiles', categoria_id=categoria.id)
+        db.session.add(subcategoria)
+        db.session.commit()
+        for first in range(0, total, 10000):
+            db.session.execute(db.insert(Producto), [{
+                'nombre': f'Producto de prueba {i}', 'slug': f'producto-{i}', 'precio': 10.0 + i % 500,
+                'descripcion': f'Descripción del producto sintético número {i}, con algo de texto.',
+                'imagen': f'https://cdn.example.com/img/{i}.jpg', 'link': f'https://tienda.example.com/p/{i}',
+                'subcategoria_id': subcategoria.id, 'external_id': f'ext-{i}',
+            } for i in range(first, min(first + 10000, total))])
+        db.session.commit()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", TEMPLATE_WARMUP='',
+                   TEMPLATE_CACHE_DIR='')
+        os.environ.update(env)
+        fill(total)
+        print(f"{total:,} products")
+        for name, mode in (('list + jsonify', 'list'), ('ndjson stream', 'ndjson')):
+            output = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, mode=mode)],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{name:>16}: peak +{result['peak_mb']:7.1f} MB, {result['seconds']:6.1f} s, "
+                  f"{result['bytes'] / 2 ** 20:,.0f} MB written")
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    main()
+    print(f"(total {time.perf_counter() - start:.0f} s)")
@@ -0,0 +1,70 @@
+"""
+Rows per second turned into a JSON body, for 100k products.
+
+Each mode loads every product and encodes one JSON array, as the API
+listings do per page:
+
+- ORM + dicts: Producto.query.all() and a hand-written dict per object
+  (what routes/api.py, admin_products and the chatbot helper did)
+- Core rows + Schema: services/serializers.PRODUCTO on plain rows
+- Core rows + Schema + orjson: the same through OrjsonProvider
+
+    python -m pruebas.bench_serializers [products] [repeats]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def orm_dicts(Producto, dumps):
+    return dumps([{
+        'id': p.id, 'nombre': p.nombre, 'slug': p.slug, 'precio': p.precio, 'descripcion': p.descripcion,
+        'imagen': p.imagen, 'link': p.link, 'subcategoria_id': p.subcategoria_id, 'external_id': p.external_id,
+        'fecha_creacion': p.fecha_creacion.isoformat() if p.fecha_creacion else None,
+        'fecha_actualizacion': p.fecha_actualizacion.isoformat() if p.fecha_actualizacion else None,
+    } for p in Producto.query.all()])
+
+
+def schema_rows(db, PRODUCTO, dumps):
+    return dumps(PRODUCTO.dump(db.session.execute(PRODUCTO.select())))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", TEMPLATE_WARMUP='',
+                          TEMPLATE_CACHE_DIR='', JSON_PROVIDER='default')
+        from pruebas.bench_ndjson import fill
+        fill(total)
+
+        from flask.json.provider import DefaultJSONProvider
+        from app import create_app
+        from extensions import db
+        from models import Producto
+        from services.serializers import PRODUCTO, OrjsonProvider
+
+        app = create_app()
+        standard, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+        modes = (
+            ('ORM + dicts', lambda: orm_dicts(Producto, standard.dumps)),
+            ('Core rows + Schema', lambda: schema_rows(db, PRODUCTO, standard.dumps)),
+            ('Core rows + Schema + orjson', lambda: schema_rows(db, PRODUCTO, fast.dumps)),
+        )
+        print(f"{total:,} products, best of {repeats}")
+        with app.app_context():
+            for name, run in modes:
+                best = float('inf')
+                for _ in range(repeats):
+                    db.session.expunge_all()
+                    start = time.perf_counter()
+                    run()
+                    best = min(best, time.perf_counter() - start)
+                print(f"{name:>28}: {best:6.2f} s, {total / best:10,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+"Did you mean" lookups on a synthetic 100k-product catalog.
+
+Builds the trigram index (services/spelling.TrigramIndex) from the
+vocabulary of generated product names and descriptions, then times the
+correction of misspelled words. Reported: vocabulary size, build time,
+memory held by the index, and lookup latency percentiles.
+
+    python -m pruebas.bench_spelling [products] [lookups]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = ['ca', 'ma', 'ra', 'lap', 'top', 'mo', 'ni', 'tor', 'te', 'cla', 'do', 'ri', 'sa', 'mar', 'ti',
+             'len', 'pro', 'gen', 'di', 'gi', 'tal', 'al', 'ta', 'vo', 'z', 'x', 'po', 'tat', 'il', 'ban']
+
+
+def fake_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def misspell(word, rng):
+    i = rng.randrange(len(word))
+    edit = rng.choice(('drop', 'swap', 'replace'))
+    if edit == 'drop':
+        return word[:i] + word[i + 1:]
+    if edit == 'swap' and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice('aeiourstln') + word[i + 1:]
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    from services.spelling import TrigramIndex
+
+    rng = random.Random(42)
+    # A Zipf-like vocabulary: a few common words, a long tail of brands and models
+    lexicon = [fake_word(rng) for _ in range(80000)]
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(lexicon))))
+    frequencies = Counter()
+    for _ in range(products):
+        frequencies.update(set(rng.choices(lexicon, cum_weights=cum_weights, k=12)))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = TrigramIndex(frequencies)
+    build_ms = (time.perf_counter() - start) * 1e3
+    memory_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+
+    queries = [misspell(rng.choice(index.words[:20000]), rng) for _ in range(lookups)]
+    timings, found = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        found += index.closest(query) is not None
+        timings.append((time.perf_counter() - start) * 1e3)
+    timings.sort()
+    print(f"{products:,} products: {len(index):,} words indexed ({len(frequencies):,} distinct)")
+    print(f"build {build_ms:,.0f} ms, index memory {memory_mb:.1f} MB")
+    print(f"lookups: median {statistics.median(timings):.2f} ms, p99 {timings[int(len(timings) * 0.99)]:.2f} ms, "
+          f"max {timings[-1]:.2f} ms, corrected {found}/{lookups}")
+
+
+if __name__ == '__main__':
+    main()
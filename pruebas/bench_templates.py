@@ -0,0 +1,75 @@
+"""
+Cold-start time to first byte, with and without compiled templates.
+
+Every sample is a new Python process that creates the app and requests
+one page, as a serverless cold start would. Reported per mode: time spent
+in create_app() and time to the first response body (the page cache is off
+so the page is really rendered). Modes:
+
+- no cache: templates parsed and compiled from source on first use
+- bytecode: TEMPLATE_CACHE_DIR prebuilt with 'flask templates compile'
+- bytecode + warm-up: the same, with TEMPLATE_WARMUP loading them in create_app()
+
+    python -m pruebas.bench_templates [samples] [path]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from app import create_app
+from extensions import db
+start = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+before = time.perf_counter()
+response = client.get({path!r})
+response.get_data()
+done = time.perf_counter()
+print(json.dumps({{'status': response.status_code, 'create_ms': (created - start) * 1e3,
+                  'first_byte_ms': (done - before) * 1e3}}))
+"""
+
+
+def run_cold(env, path):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(root=ROOT, path=path)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    path = sys.argv[2] if len(sys.argv) > 2 else '/'
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", PAGE_CACHE='0')
+        cache_dir = os.path.join(tmp, 'jinja_cache')
+        subprocess.run([sys.executable, '-m', 'flask', 'templates', 'compile'], cwd=ROOT, check=True,
+                       env=dict(base_env, FLASK_APP='app:create_app', TEMPLATE_CACHE_DIR=cache_dir),
+                       capture_output=True)
+        modes = (
+            ('no cache', dict(base_env, TEMPLATE_CACHE_DIR='', TEMPLATE_WARMUP='')),
+            ('bytecode', dict(base_env, TEMPLATE_CACHE_DIR=cache_dir, TEMPLATE_WARMUP='')),
+            ('bytecode + warm-up', dict(base_env, TEMPLATE_CACHE_DIR=cache_dir)),
+        )
+        for name, env in modes:
+            runs = [run_cold(env, path) for _ in range(samples)]
+            create = statistics.median(r['create_ms'] for r in runs)
+            first_byte = statistics.median(r['first_byte_ms'] for r in runs)
+            print(f"{name:>20}: create_app {create:7.1f} ms, first byte {first_byte:7.1f} ms, "
+                  f"total {create + first_byte:7.1f} ms (HTTP {runs[0]['status']}, median of {samples})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # The engine is created inside create_app(), so the database has to be
+    # chosen through the environment before the app is built.
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('CLICK_FLUSH_INTERVAL_MS', '60000')
+    monkeypatch.setenv('CLICK_FLUSH_MAX_PENDING', '100000')
+    # Every test client request comes from 127.0.0.1; tests opt into deduplication
+    monkeypatch.setenv('CLICK_DEDUP_WINDOW_S', '0')
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', str(tmp_path / 'jinja_cache'))
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def capture_queries(app):
+    """Context manager factory collecting the SQL statements run inside it."""
+    with app.app_context():
+        engine = db.engine
+
+    @contextlib.contextmanager
+    def capture():
+        queries = []
+        listener = lambda *args: queries.append(args[2])  # noqa: E731
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+    return capture
+
+
+@pytest.fixture
+def admin_client(app, client):
+    """Test client logged in as an administrator."""
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    with app.app_context():
+        admin = User(username='admin_test', password_hash=generate_password_hash('x'), is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def catalogo(app):
+    """
+    One category with two subcategories ('portatiles', 'monitores') and a
+    product, 'laptop-x1', in the first. Returns (producto_id, sub_a, sub_b).
+    """
+    from models import Categoria, Producto, Subcategoria
+
+    with app.app_context():
+        categoria = Categoria(nombre='Tecnología', slug='tecnologia')
+        db.session.add(categoria)
+        db.session.flush()
+        sub_a = Subcategoria(nombre='Portátiles', slug='portatiles', categoria_id=categoria.id)
+        sub_b = Subcategoria(nombre='Monitores', slug='monitores', categoria_id=categoria.id)
+        db.session.add_all([sub_a, sub_b])
+        db.session.flush()
+        producto = Producto(nombre='Laptop X1', slug='laptop-x1', precio=999.0, link='https://tienda.example.com/x1',
+                            descripcion='Portátil ligero.', subcategoria_id=sub_a.id)
+        db.session.add(producto)
+        db.session.commit()
+        return producto.id, sub_a.id, sub_b.id
+
+
+@pytest.fixture
+def crear_productos(app, catalogo):
+    """Factory filling the catalogo fixture's first subcategory up to 'total' products."""
+    from models import Producto
+
+    def crear(total):
+        with app.app_context():
+            db.session.add_all([
+                Producto(nombre=f'Producto {i}', slug=f'producto-{i}', precio=float(i),
+                         link='https://tienda.example.com/p', subcategoria_id=catalogo[1])
+                for i in range(total - 1)
+            ])
+            db.session.commit()
+    return crear
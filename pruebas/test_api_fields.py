@@ -0,0 +1,78 @@
+import json
+
+from extensions import db
+from models import Producto
+
+
+def test_fields_load_only_the_requested_columns(app, client, capture_queries, crear_productos):
+    crear_productos(3)
+    client.get('/api/productos')
+    with capture_queries() as queries:
+        data = client.get('/api/productos?fields=nombre,precio').get_json()
+    assert [set(p) for p in data] == [{'id', 'nombre', 'precio'}] * 3
+    select = [q for q in queries if 'FROM producto' in q]
+    assert len(select) == 1 and 'descripcion' not in select[0]
+
+    line = client.get('/api/productos.ndjson?fields=slug').get_data(as_text=True).splitlines()[0]
+    assert json.loads(line) == {'id': 1, 'slug': 'laptop-x1'}
+    assert client.get('/api/articulos?fields=titulo').status_code == 200
+    rv = client.get('/api/productos?fields=nombre,contraseña')
+    assert rv.status_code == 400 and 'contraseña' in rv.get_json()['mensaje']
+
+
+def test_includes_are_loaded_in_one_query_per_relation(app, client, capture_queries, crear_productos):
+    crear_productos(120)
+    client.get('/api/productos')
+    with capture_queries() as queries:
+        data = client.get('/api/productos?fields=nombre&include=subcategoria,categoria').get_json()
+    assert len(data) == 120
+    assert data[0]['subcategoria']['slug'] == 'portatiles' and data[0]['categoria']['slug'] == 'tecnologia'
+    # Products, then their subcategories, then the categories: not one query per product
+    assert len([q for q in queries if 'cache_tag_version' not in q]) == 3
+
+    rv = client.get('/api/productos/1?include=categoria')
+    assert rv.get_json()['categoria']['nombre'] == 'Tecnología' and 'subcategoria' not in rv.get_json()
+    assert client.get('/api/productos?include=autor').status_code == 400
+
+
+def test_subcategory_products_can_be_left_out_or_trimmed(app, client, crear_productos):
+    crear_productos(3)
+    assert len(client.get('/api/subcategorias/1').get_json()['productos']) == 3
+    assert set(client.get('/api/subcategorias/1').get_json()['productos'][0]) == {
+        'id', 'nombre', 'slug', 'precio', 'imagen', 'link'}
+    assert 'productos' not in client.get('/api/subcategorias/1?include=').get_json()
+    productos = client.get('/api/subcategorias/1?fields=precio').get_json()['productos']
+    assert [set(p) for p in productos] == [{'id', 'precio'}] * 3
+
+
+def test_batch_lookup_keeps_request_order(app, client, capture_queries, crear_productos):
+    crear_productos(5)
+    client.get('/api/productos/batch?ids=1')
+    with capture_queries() as queries:
+        data = client.get('/api/productos/batch?ids=4,2,99,4&fields=nombre').get_json()
+    assert [p['id'] for p in data['productos']] == [4, 2] and data['faltantes'] == [99]
+    assert set(data['productos'][0]) == {'id', 'nombre'}
+    assert len([q for q in queries if 'FROM producto' in q]) == 1
+
+    data = client.get('/api/productos/batch?slugs=producto-2,nada,laptop-x1').get_json()
+    assert [p['slug'] for p in data['productos']] == ['producto-2', 'laptop-x1'] and data['faltantes'] == ['nada']
+    data = client.get('/api/productos/batch?slugs=laptop-x1&fields=precio&include=categoria').get_json()
+    assert data['productos'] == [{'id': 1, 'precio': 999.0, 'categoria': {'id': 1, 'nombre': 'Tecnología',
+                                                                          'slug': 'tecnologia'}}]
+    assert client.get('/api/productos/batch?ids=1,x').status_code == 400
+    assert client.get('/api/productos/batch').status_code == 400
+    assert client.get('/api/productos/batch?ids=' + ','.join(map(str, range(501)))).status_code == 400
+
+
+def test_batch_validators_follow_the_requested_products(app, client, crear_productos):
+    crear_productos(3)
+    etag = client.get('/api/productos/batch?ids=1,2').headers['ETag']
+    assert client.get('/api/productos/batch?ids=1,2', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.get(Producto, 3).precio = 1.0
+        db.session.commit()
+    assert client.get('/api/productos/batch?ids=1,2', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        db.session.get(Producto, 2).precio = 1.0
+        db.session.commit()
+    assert client.get('/api/productos/batch?ids=1,2', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,67 @@
+from sqlalchemy import text
+
+from extensions import db
+from models import Producto, ProductoEliminado
+
+
+def feed(client, since=None, **params):
+    query = '&'.join(f'{key}={value}' for key, value in params.items())
+    rv = client.get(f"/api/productos/changes?{f'since={since}&' if since else ''}{query}")
+    assert rv.status_code == 200
+    return rv.get_json()
+
+
+def test_feed_returns_only_what_changed(app, admin_client, crear_productos):
+    app.config['CHANGE_FEED_SETTLE_S'] = 0
+    crear_productos(5)
+    # Initial sync in pages of two
+    ids, since, pages = [], None, 0
+    while True:
+        data = feed(admin_client, since, limit=2)
+        ids += [p['id'] for p in data['cambios']]
+        since, pages = data['watermark'], pages + 1
+        if data['completo']:
+            break
+    assert ids == [1, 2, 3, 4, 5] and pages == 3
+    assert feed(admin_client, since)['cambios'] == []
+
+    with app.app_context():
+        db.session.get(Producto, 3).precio = 5.0
+        db.session.commit()
+    assert admin_client.post('/admin/products/delete/2').status_code == 302
+    data = feed(admin_client, since, fields='precio')
+    assert data['cambios'] == [{'id': 3, 'precio': 5.0}]
+    assert [(t['id'], t['slug']) for t in data['eliminados']] == [(2, 'producto-0')]
+    assert feed(admin_client, data['watermark']) == {
+        'cambios': [], 'eliminados': [], 'watermark': data['watermark'], 'completo': True}
+
+    # A first sync can also start from a date
+    assert len(feed(admin_client, '2000-01-01T00:00:00%2B00:00')['cambios']) == 4
+    assert admin_client.get('/api/productos/changes?since=basura').status_code == 400
+
+
+def test_recent_changes_wait_for_the_settle_window(app, client, crear_productos):
+    app.config['CHANGE_FEED_SETTLE_S'] = 3600
+    crear_productos(2)
+    data = feed(client)
+    assert data['cambios'] == [] and data['completo']
+
+
+def test_reused_ids_drop_their_tombstone(app, crear_productos):
+    crear_productos(2)
+    with app.app_context():
+        db.session.delete(db.session.get(Producto, 2))
+        db.session.commit()
+        assert db.session.get(ProductoEliminado, 2).slug == 'producto-0'
+        db.session.add(Producto(id=2, nombre='Otro', slug='otro', precio=1.0, link='https://tienda.example.com/o'))
+        db.session.commit()
+        assert db.session.get(ProductoEliminado, 2) is None
+
+
+def test_feed_scans_use_the_timestamp_indexes(app):
+    with app.app_context():
+        for table, column in (('producto', 'fecha_actualizacion'), ('producto_eliminado', 'fecha_eliminacion')):
+            plan = db.session.execute(text(
+                f"EXPLAIN QUERY PLAN SELECT * FROM {table} WHERE ({column}, id) > (:t, 0) ORDER BY {column}, id LIMIT 10"
+            ), {'t': '2024-01-01'}).all()
+            assert f'ix_{table}_{column}_id' in str(plan)
@@ -0,0 +1,307 @@
+import re
+from datetime import date
+
+from extensions import db
+from models import Afiliado, EstadisticaAfiliado
+from services.click_counter import click_counter
+
+
+def crear_afiliado(app, activo=True):
+    with app.app_context():
+        afiliado = Afiliado(
+            nombre='Afiliado Test',
+            email='test@example.com',
+            enlace_referido='https://tienda.example.com/?ref=test',
+            activo=activo
+        )
+        db.session.add(afiliado)
+        db.session.commit()
+        return afiliado.id
+
+
+def crear_afiliado_extra(app):
+    with app.app_context():
+        afiliado = Afiliado(nombre='Otro', email='otro@example.com', enlace_referido='https://otra.example.com/', activo=True)
+        db.session.add(afiliado)
+        db.session.commit()
+        return afiliado.id
+
+
+def clicks_de(app, afiliado_id):
+    with app.app_context():
+        stats = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id).all()
+        return [(s.fecha, s.clicks) for s in stats]
+
+
+def test_ref_redirects_without_writing_stats(app, client):
+    afiliado_id = crear_afiliado(app)
+    rv = client.get(f'/ref/{afiliado_id}')
+    assert rv.status_code == 302
+    assert rv.headers['Location'] == 'https://tienda.example.com/?ref=test'
+    assert clicks_de(app, afiliado_id) == []
+    assert click_counter.pending() == {(afiliado_id, date.today()): 1}
+    click_counter.flush()
+
+
+def test_flush_merges_deltas_into_one_row(app, client):
+    afiliado_id = crear_afiliado(app)
+    for _ in range(25):
+        client.get(f'/ref/{afiliado_id}')
+    assert click_counter.flush() == 25
+    assert clicks_de(app, afiliado_id) == [(date.today(), 25)]
+
+    for _ in range(5):
+        client.get(f'/ref/{afiliado_id}')
+    click_counter.flush()
+    assert clicks_de(app, afiliado_id) == [(date.today(), 30)]
+
+
+def test_unknown_affiliate_is_404(app, client):
+    assert client.get('/ref/999').status_code == 404
+    assert click_counter.pending() == {}
+
+
+def test_concurrent_flushes_never_lose_or_duplicate(app):
+    from concurrent.futures import ThreadPoolExecutor
+    from services.click_counter import ClickCounter
+
+    afiliado_id = crear_afiliado(app)
+    workers, flushes, clicks_per_flush = 16, 20, 7
+
+    def worker():
+        # Each thread plays the role of a separate gunicorn worker with its own buffer
+        counter = ClickCounter(app)
+        for _ in range(flushes):
+            for _ in range(clicks_per_flush):
+                counter.record(afiliado_id)
+            assert counter.flush() == clicks_per_flush
+        counter._stopped.set()
+        counter._wakeup.set()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker) for _ in range(workers)]:
+            future.result()
+
+    assert clicks_de(app, afiliado_id) == [(date.today(), workers * flushes * clicks_per_flush)]
+
+
+def test_duplicate_daily_row_is_rejected(app):
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+
+    afiliado_id = crear_afiliado(app)
+    with app.app_context():
+        db.session.add(EstadisticaAfiliado(afiliado_id=afiliado_id, fecha=date.today(), clicks=1))
+        db.session.add(EstadisticaAfiliado(afiliado_id=afiliado_id, fecha=date.today(), clicks=1))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_fast_path_redirects_without_queries(app, client):
+    from sqlalchemy import event
+    from services.referral_redirect import referral_links
+
+    afiliado_id = crear_afiliado(app)
+    client.get(f'/ref/{afiliado_id}')  # first hit builds the map
+
+    queries = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: queries.append(args[2])  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        rv = client.get(f'/ref/{afiliado_id}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    assert rv.status_code == 302
+    assert rv.headers['Location'] == 'https://tienda.example.com/?ref=test'
+    assert queries == []
+    assert referral_links.get(afiliado_id) == 'https://tienda.example.com/?ref=test'
+    assert click_counter.flush() == 2
+
+
+def test_inactive_affiliate_is_not_redirected(app, client):
+    from services.referral_redirect import referral_links
+
+    afiliado_id = crear_afiliado(app, activo=False)
+    assert client.get(f'/ref/{afiliado_id}').status_code == 404
+    assert referral_links.get(afiliado_id) is None
+
+    with app.app_context():
+        db.session.get(Afiliado, afiliado_id).activo = True
+        db.session.commit()
+        referral_links.reload()
+    assert client.get(f'/ref/{afiliado_id}').status_code == 302
+    click_counter.flush()
+
+
+def test_event_log_rollup_and_prune(app, client):
+    from datetime import datetime, timedelta
+    from models import ClickEvent
+    from services.click_events import UA_DESKTOP, UA_MOBILE, rollup_click_events, prune_click_events
+
+    afiliado_id = crear_afiliado(app)
+    click_counter.event_log = True
+    try:
+        client.get(f'/ref/{afiliado_id}', headers={'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0) Mobile'})
+        client.get(f'/ref/{afiliado_id}', headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)', 'Referer': 'https://blog.example.com/post?x=1'})
+        assert click_counter.flush() == 2
+    finally:
+        click_counter.event_log = False
+
+    with app.app_context():
+        events = ClickEvent.query.order_by(ClickEvent.id).all()
+        assert [e.ua_class for e in events] == [UA_MOBILE, UA_DESKTOP]
+        assert events[0].referrer_hash is None and events[1].referrer_hash is not None
+        # The flush only creates the row (for the visitor sketch); clicks wait for the rollup
+        assert [(s.fecha, s.clicks) for s in EstadisticaAfiliado.query.all()] == [(date.today(), 0)]
+
+        # The first run only records the high-water candidate, the second folds
+        assert rollup_click_events() == 0
+        assert rollup_click_events() == 2
+        assert rollup_click_events() == 0
+        old_day = date.today() - timedelta(days=40)
+        db.session.add(ClickEvent(timestamp=datetime(old_day.year, old_day.month, old_day.day), dia=old_day, afiliado_id=afiliado_id, ua_class=0))
+        db.session.commit()
+        assert prune_click_events(30) == 0  # not rolled up yet, so it is kept
+        rollup_click_events()
+        rollup_click_events()
+        assert prune_click_events(30) == 1
+        assert ClickEvent.query.count() == 2
+    assert sorted(clicks_de(app, afiliado_id)) == sorted([(date.today(), 2), (old_day, 1)])
+
+
+def test_bots_and_duplicates_are_not_billed(app, client):
+    from services.click_filter import click_filter, RotatingBloomFilter
+
+    afiliado_id = crear_afiliado(app)
+    otro_id = crear_afiliado_extra(app)
+    click_filter.duplicates = RotatingBloomFilter(capacity=1000, window=60)
+    try:
+        for _ in range(3):
+            client.get(f'/ref/{afiliado_id}', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        client.get(f'/ref/{afiliado_id}', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        client.get(f'/ref/{otro_id}', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        rv = client.get(f'/ref/{afiliado_id}', headers={'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1)'},
+                        environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        assert rv.status_code == 302  # filtered clicks are still redirected
+        click_counter.flush()
+    finally:
+        click_filter.duplicates = None
+
+    with app.app_context():
+        stat = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id).one()
+        assert (stat.clicks, stat.clicks_duplicados, stat.clicks_bot) == (2, 2, 1)
+        otro = EstadisticaAfiliado.query.filter_by(afiliado_id=otro_id).one()
+        assert (otro.clicks, otro.clicks_duplicados, otro.clicks_bot) == (1, 0, 0)
+
+
+def test_rotating_bloom_filter_window_and_memory():
+    from services.click_filter import RotatingBloomFilter
+
+    bloom = RotatingBloomFilter(capacity=10000, error_rate=0.001, window=3600)
+    size = bloom.memory_bytes()
+    assert bloom.add(b'a') is False
+    assert bloom.add(b'a') is True
+    false_positives = sum(bloom.add(f'key-{i}'.encode()) for i in range(9000))
+    assert false_positives < 9000 * 0.01
+    assert bloom.memory_bytes() == size
+
+    # Filling a generation retires it; keys survive one more generation only
+    bloom = RotatingBloomFilter(capacity=100, window=3600)
+    bloom.add(b'x')
+    for i in range(100):
+        bloom.add(f'fill-{i}'.encode())
+    assert bloom.add(b'x') is True
+    for i in range(200):
+        bloom.add(f'more-{i}'.encode())
+    assert bloom.add(b'x') is False
+
+
+def test_unique_visitors_merge_across_flushes_and_days(app, client):
+    from datetime import timedelta
+    from services.hyperloglog import HyperLogLog, unique_count
+
+    afiliado_id = crear_afiliado(app)
+    ayer = date.today() - timedelta(days=1)
+    ua = 'Mozilla/5.0 (X11; Linux x86_64)'
+    for i in range(40):
+        client.get(f'/ref/{afiliado_id}', headers={'User-Agent': ua}, environ_base={'REMOTE_ADDR': f'10.0.1.{i}'})
+    click_counter.flush()
+    # Same visitors again plus new ones, in another flush
+    for i in range(20, 60):
+        client.get(f'/ref/{afiliado_id}', headers={'User-Agent': ua}, environ_base={'REMOTE_ADDR': f'10.0.1.{i}'})
+    click_counter.flush()
+    for i in range(50, 70):
+        click_counter.record(afiliado_id, fecha=ayer, ip=f'10.0.1.{i}', user_agent=ua)
+    click_counter.flush()
+
+    with app.app_context():
+        hoy = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id, fecha=date.today()).one()
+        previo = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id, fecha=ayer).one()
+        assert hoy.clicks == 80
+        # Estimates: exact counts are 60, 20 and 70 (visitors 50-59 clicked on both days)
+        assert abs(unique_count([hoy.visitantes_hll]) - 60) <= 3
+        assert abs(unique_count([previo.visitantes_hll]) - 20) <= 1
+        assert abs(unique_count([hoy.visitantes_hll, previo.visitantes_hll]) - 70) <= 4
+
+    big = HyperLogLog()
+    for i in range(50000):
+        big.add(f'visitor-{i}')
+    assert abs(big.estimate() - 50000) < 50000 * 0.1
+    assert len(big.to_bytes()) == 1026
+
+
+def test_forwarded_for_only_counts_behind_trusted_proxies(app, client, monkeypatch):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from services.click_filter import click_filter, RotatingBloomFilter
+
+    afiliado_id = crear_afiliado(app)
+    click_filter.duplicates = RotatingBloomFilter(capacity=1000, window=60)
+    try:
+        # A spoofed X-Forwarded-For does not make repeated clicks look new
+        for i in range(3):
+            client.get(f'/ref/{afiliado_id}', headers={'X-Forwarded-For': f'203.0.113.{i}'},
+                       environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        # Behind one trusted proxy, the address it appended is the client's
+        monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+        for i in range(2):
+            client.get(f'/ref/{afiliado_id}', headers={'X-Forwarded-For': f'198.51.100.9, 203.0.113.{i}'},
+                       environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        click_counter.flush()
+    finally:
+        click_filter.duplicates = None
+
+    with app.app_context():
+        stat = EstadisticaAfiliado.query.filter_by(afiliado_id=afiliado_id).one()
+        assert (stat.clicks, stat.clicks_duplicados) == (3, 2)
+
+
+def test_head_requests_redirect_without_counting(app, client):
+    afiliado_id = crear_afiliado(app)
+    rv = client.head(f'/ref/{afiliado_id}')
+    assert rv.status_code == 302 and rv.headers['Location'] == 'https://tienda.example.com/?ref=test'
+    client.get(f'/ref/{afiliado_id}')
+    click_counter.flush()
+    assert clicks_de(app, afiliado_id) == [(date.today(), 1)]
+
+
+def test_admin_can_delete_a_statistic(app, admin_client):
+    afiliado_id = crear_afiliado(app)
+    with app.app_context():
+        stat = EstadisticaAfiliado(afiliado_id=afiliado_id, fecha=date.today(), clicks=3)
+        db.session.add(stat)
+        db.session.commit()
+        stat_id = stat.id
+
+    # The form is posted as the browser would, CSRF token included
+    app.config['WTF_CSRF_ENABLED'] = True
+    html = admin_client.get('/admin/affiliate_statistics').get_data(as_text=True)
+    form = re.search(rf'action="/admin/affiliate_statistics/delete/{stat_id}".*?</form>', html, re.DOTALL).group(0)
+    token = re.search(r'name="csrf_token" value="([^"]+)"', form).group(1)
+    rv = admin_client.post(f'/admin/affiliate_statistics/delete/{stat_id}', data={'csrf_token': token})
+    assert rv.status_code == 302
+    with app.app_context():
+        assert db.session.get(EstadisticaAfiliado, stat_id) is None
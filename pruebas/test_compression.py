@@ -0,0 +1,51 @@
+import gzip
+import json
+
+from services.compression import compression, minify_html
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+
+def test_minify_keeps_significant_whitespace():
+    html = '<div>\n    <p>a  b</p>\n\n   <pre>\n  x\n</pre>\n  <script>\n  // c\n  var a;\n</script>\n</div>'
+    assert minify_html(html) == '<div>\n<p>a  b</p>\n<pre>\n  x\n</pre>\n<script>\n  // c\n  var a;\n</script>\n</div>'
+
+
+def test_pages_are_compressed_once_per_cache_entry(app, client, monkeypatch, catalogo):
+    plain = client.get('/producto/laptop-x1')
+    assert 'Content-Encoding' not in plain.headers and 'Accept-Encoding' in plain.headers['Vary']
+
+    calls = []
+    original = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda data, encoding: calls.append(encoding) or original(data, encoding))
+    for _ in range(3):
+        rv = client.get('/producto/laptop-x1', headers=GZIP)
+        assert rv.headers['Content-Encoding'] == 'gzip' and rv.headers['X-Page-Cache'] == 'HIT'
+        assert gzip.decompress(rv.get_data()) == plain.get_data()
+        assert int(rv.headers['Content-Length']) == len(rv.get_data()) < len(plain.get_data())
+    assert calls == ['gzip']
+
+
+def test_small_and_streamed_api_responses(app, client, crear_productos):
+    crear_productos(300)
+    small = client.get('/api/categorias', headers=GZIP)
+    assert 'Content-Encoding' not in small.headers
+
+    rv = client.get('/api/productos', headers=GZIP)
+    assert rv.headers['Content-Encoding'] == 'gzip' and len(json.loads(gzip.decompress(rv.get_data()))) == 300
+    # Strong validators become weak but still match
+    etag = rv.headers['ETag']
+    assert etag.startswith('W/')
+    assert client.get('/api/productos', headers={**GZIP, 'If-None-Match': etag}).status_code == 304
+
+    rv = client.get('/api/productos.ndjson', headers=GZIP)
+    assert rv.is_streamed and 'Content-Length' not in rv.headers
+    assert len(gzip.decompress(rv.get_data()).splitlines()) == 300
+
+
+def test_html_minification_is_optional(app, client, monkeypatch, catalogo):
+    full = client.get('/producto/laptop-x1').get_data(as_text=True)
+    monkeypatch.setattr(compression, 'minify', True)
+    minified = client.get('/producto/laptop-x1').get_data(as_text=True)
+    assert len(minified) < len(full) and '\n    ' not in minified.split('<script')[0]
+    assert 'Laptop X1' in minified
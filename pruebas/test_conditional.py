@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.http import http_date
+
+from extensions import db
+from models import Producto, Categoria
+from services.conditional import content_validators
+
+
+def test_matching_etag_is_answered_before_the_view(app, client, capture_queries, catalogo):
+    first = client.get('/producto/laptop-x1')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/"')
+    assert 'Last-Modified' in first.headers
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    with capture_queries() as queries:
+        rv = client.get('/producto/laptop-x1', headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.get_data() == b''
+    assert rv.headers['ETag'] == etag
+    assert 'X-Page-Cache' not in rv.headers
+    # Only the slug -> id lookup; the product row itself is never loaded
+    assert len(queries) == 1 and 'producto.nombre' not in queries[0]
+    assert content_validators.not_modified == 1
+
+    # API responses get strong validators
+    api = client.get('/api/productos')
+    assert api.headers['ETag'].startswith('"')
+    assert client.get('/api/productos', headers={'If-None-Match': api.headers['ETag']}).status_code == 304
+
+
+def test_validators_change_with_the_content(app, client, catalogo):
+    producto_id, _, _ = catalogo
+    page = client.get('/producto/laptop-x1')
+    api = client.get(f'/api/productos/{producto_id}')
+    guias = client.get('/guias')
+
+    with app.app_context():
+        db.session.get(Producto, producto_id).precio = 849.5
+        db.session.commit()
+
+    rv = client.get('/producto/laptop-x1', headers={'If-None-Match': page.headers['ETag']})
+    assert rv.status_code == 200
+    assert '849.50' in rv.get_data(as_text=True)
+    assert rv.headers['ETag'] != page.headers['ETag']
+    rv = client.get(f'/api/productos/{producto_id}', headers={'If-None-Match': api.headers['ETag']})
+    assert rv.status_code == 200 and rv.get_json()['precio'] == 849.5
+    # Pages that do not depend on the product keep their validators
+    assert client.get('/guias', headers={'If-None-Match': guias.headers['ETag']}).status_code == 304
+
+
+def test_if_modified_since(app, client, catalogo):
+    rv = client.get('/api/categorias')
+    last_modified = rv.headers['Last-Modified']
+
+    assert client.get('/api/categorias', headers={'If-Modified-Since': last_modified}).status_code == 304
+    earlier = http_date(datetime.now(timezone.utc) - timedelta(days=1))
+    assert client.get('/api/categorias', headers={'If-Modified-Since': earlier}).status_code == 200
+    # If-None-Match takes precedence over If-Modified-Since
+    assert client.get('/api/categorias', headers={
+        'If-Modified-Since': last_modified, 'If-None-Match': '"otro"',
+    }).status_code == 200
+
+
+def test_missing_content_and_errors_get_no_validators(app, client):
+    rv = client.get('/producto/no-existe')
+    assert rv.status_code == 302 and 'ETag' not in rv.headers
+    rv = client.get('/api/productos/999')
+    assert rv.status_code == 404 and 'ETag' not in rv.headers
+
+
+def test_last_modified_is_shared_by_every_worker(app, client):
+    # Nothing has ever changed: no date all workers agree on, only the ETag
+    rv = client.get('/api/articulos')
+    assert 'ETag' in rv.headers and 'Last-Modified' not in rv.headers
+    assert client.get('/api/articulos', headers={'If-Modified-Since': http_date(datetime.now(timezone.utc))}).status_code == 200
+
+    with app.app_context():
+        db.session.add(Categoria(nombre='Hogar', slug='hogar'))
+        db.session.commit()
+    # Articles never changed: the newest change to any content stands in, not the worker's start time
+    categorias = client.get('/api/categorias').headers['Last-Modified']
+    assert client.get('/api/articulos').headers['Last-Modified'] == categorias
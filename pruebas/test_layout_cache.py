@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+from extensions import db
+from models import Advertisement, AdsenseConfig, SocialMediaLink
+from services.layout_cache import layout_cache
+
+LAYOUT_TABLES = ('social_media_link', 'adsense_config', 'advertisement')
+
+
+def layout_queries(queries):
+    return [q for q in queries if any(table in q for table in LAYOUT_TABLES)]
+
+
+def test_warm_render_runs_no_layout_queries(app, client, capture_queries):
+    with app.app_context():
+        db.session.add(SocialMediaLink(platform='Facebook', url='https://facebook.com/x', icon_class='fab fa-facebook-f'))
+        db.session.add(AdsenseConfig(adsense_client_id='ca-pub-1', adsense_slot_1='111'))
+        db.session.commit()
+
+    with capture_queries() as cold:
+        rv = client.get('/politica-de-privacidad')
+    assert rv.status_code == 200
+    assert len(layout_queries(cold)) == 3  # one per payload, AdSense is read once
+
+    with capture_queries() as warm:
+        rv = client.get('/politica-de-privacidad')
+    assert rv.status_code == 200
+    assert layout_queries(warm) == []
+    html = rv.get_data(as_text=True)
+    assert 'https://facebook.com/x' in html
+    assert 'ca-pub-1' in html
+
+
+def test_admin_changes_invalidate_the_cache(app, admin_client):
+    admin_client.get('/politica-de-privacidad')
+    assert 'https://instagram.com/y' not in admin_client.get('/politica-de-privacidad').get_data(as_text=True)
+
+    rv = admin_client.post('/admin/social_media/add', data={'platform': 'Instagram', 'url': 'https://instagram.com/y', 'is_visible': 'y'})
+    assert rv.status_code == 302
+    assert 'https://instagram.com/y' in admin_client.get('/politica-de-privacidad').get_data(as_text=True)
+
+    with app.app_context():
+        link_id = SocialMediaLink.query.filter_by(platform='Instagram').one().id
+    admin_client.post(f'/admin/social_media/delete/{link_id}')
+    assert 'https://instagram.com/y' not in admin_client.get('/politica-de-privacidad').get_data(as_text=True)
+
+
+def test_ad_schedule_switches_exactly_at_boundaries(app):
+    from services.ad_schedule import AdSchedule
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start, end = now + timedelta(hours=1), now + timedelta(hours=2)
+    with app.app_context():
+        db.session.add_all([
+            Advertisement(type='destacado', title='Siempre', is_active=True),
+            Advertisement(type='destacado', title='Programado', is_active=True, start_date=start, end_date=end),
+            Advertisement(type='destacado', title='Apagado', is_active=False),
+            Advertisement(type='recomendado', title='Otro slot', is_active=True),
+        ])
+        db.session.commit()
+        layout_cache.invalidate()
+        schedule = AdSchedule(layout_cache)
+
+        titles = lambda at: [ad['title'] for ad in schedule.active('destacado', now=at)]  # noqa: E731
+        assert titles(now) == ['Siempre']
+        assert schedule.next_transition(now=now) == start
+        assert titles(start - timedelta(microseconds=1)) == ['Siempre']
+        assert titles(start) == ['Siempre', 'Programado']
+        assert titles(end - timedelta(microseconds=1)) == ['Siempre', 'Programado']
+        assert titles(end) == ['Siempre']
+        assert schedule.next_transition(now=end) is None
+        assert [ad['title'] for ad in schedule.active('recomendado', now=now)] == ['Otro slot']
+
+        # Lookups between transitions reuse the schedule
+        rebuilds = schedule.rebuilds
+        for _ in range(100):
+            schedule.ads_for_slot('destacado', now=end)
+        assert schedule.rebuilds == rebuilds
+
+
+def test_ads_rotate_by_weight_and_admin_edits_rebuild(app, admin_client):
+    from services.ad_schedule import ad_schedule
+
+    with app.app_context():
+        db.session.add_all([
+            Advertisement(type='destacado', title='Pesado', is_active=True, weight=3),
+            Advertisement(type='destacado', title='Ligero', is_active=True, weight=1),
+        ])
+        db.session.commit()
+        layout_cache.invalidate()
+        picks = [ad_schedule.ads_for_slot('destacado')[0]['title'] for _ in range(4000)]
+        assert 2700 < picks.count('Pesado') < 3300
+        assert {ad['title'] for ad in ad_schedule.ads_for_slot('destacado', limit=5)} == {'Pesado', 'Ligero'}
+        ligero_id = Advertisement.query.filter_by(title='Ligero').one().id
+
+    rv = admin_client.post(f'/admin/advertisements/delete/{ligero_id}')
+    assert rv.status_code == 302
+    with app.app_context():
+        assert [ad['title'] for ad in ad_schedule.active('destacado')] == ['Pesado']
+    html = admin_client.get('/politica-de-privacidad').get_data(as_text=True)
+    assert 'Pesado' in html and 'Ligero' not in html
+
+
+def test_layout_values_are_only_loaded_when_rendered(app, admin_client, capture_queries):
+    app.config['QUERY_STATS'] = True
+    with app.app_context():
+        db.session.add(SocialMediaLink(platform='Facebook', url='https://facebook.com/x', icon_class='fab fa-facebook-f'))
+        db.session.commit()
+
+    # The sitemap template uses no layout data: nothing is loaded
+    with capture_queries() as queries:
+        rv = admin_client.get('/sitemap.xml')
+    assert rv.status_code == 200
+    assert layout_queries(queries) == []
+    assert rv.headers['X-Layout-Skipped'] == '2'
+    assert rv.headers['X-Query-Count'] == str(len(queries))
+
+    # A full page resolves social links and AdSense once each, however often it reads them
+    rv = admin_client.get('/politica-de-privacidad')
+    assert rv.headers['X-Layout-Skipped'] == '0'
+    assert 'https://facebook.com/x' in rv.get_data(as_text=True)
+
+    # Responses that render no template are left out of the measurement
+    rv = admin_client.get('/api/productos')
+    assert rv.headers['X-Layout-Skipped'] == 'n/a'
+
+    stats = admin_client.get('/admin/query_stats').get_json()
+    assert stats['publico.sitemap']['requests'] == 1
+    assert stats['publico.sitemap']['layout_skipped'] == 2
+    assert stats['api.api_productos']['rendered'] == 0
+    assert stats['api.api_productos']['layout_skipped_per_request'] is None
+    assert stats['publico.privacy_policy']['layout_skipped'] == 0
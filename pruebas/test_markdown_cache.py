@@ -0,0 +1,34 @@
+from extensions import db
+from models import Articulo
+from services.markdown_cache import markdown_cache
+
+
+def test_article_html_is_rendered_when_saved(app, admin_client):
+    rv = admin_client.post('/admin/articles/add', data={
+        'titulo': 'Guía de portátiles', 'contenido': '# Elegir\n\nUn **buen** portátil.', 'autor': 'Ana',
+    })
+    assert rv.status_code == 302
+    with app.app_context():
+        articulo = Articulo.query.filter_by(slug='guia-de-portatiles').one()
+        assert articulo.contenido_html == '<h1>Elegir</h1>\n<p>Un <strong>buen</strong> portátil.</p>'
+        articulo_id = articulo.id
+
+    page = admin_client.get('/guia/guia-de-portatiles').get_data(as_text=True)
+    # Served from the column as HTML, not escaped and not rendered again
+    assert '<strong>buen</strong>' in page
+    assert markdown_cache.misses == 0
+
+    rv = admin_client.post(f'/admin/articles/edit/{articulo_id}', data={
+        'titulo': 'Guía de portátiles', 'contenido': 'Texto *nuevo*.', 'autor': 'Ana',
+    })
+    assert rv.status_code == 302
+    with app.app_context():
+        assert db.session.get(Articulo, articulo_id).contenido_html == '<p>Texto <em>nuevo</em>.</p>'
+
+
+def test_text_without_stored_html_goes_through_the_lru(app):
+    with app.app_context():
+        assert markdown_cache.filter('*a*') == '<p><em>a</em></p>'
+        assert markdown_cache.filter('*a*') == '<p><em>a</em></p>'
+        assert (markdown_cache.hits, markdown_cache.misses) == (1, 1)
+        assert markdown_cache.filter('*a*', '<p>guardado</p>') == '<p>guardado</p>'
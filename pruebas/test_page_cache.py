@@ -0,0 +1,92 @@
+from extensions import db
+from models import Producto, Advertisement
+from services.layout_cache import layout_cache
+from services.page_cache import page_cache
+from services.invalidation import bump_tags, tag_versions
+
+
+def test_anonymous_pages_are_served_from_cache(app, client, capture_queries, catalogo):
+    first = client.get('/producto/laptop-x1')
+    assert first.status_code == 200
+    assert first.headers['X-Page-Cache'] == 'MISS'
+
+    with capture_queries() as queries:
+        second = client.get('/producto/laptop-x1')
+    assert second.headers['X-Page-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+    # Only the slug -> id lookup that gives the page its dependency tags
+    assert len(queries) == 1 and queries[0].startswith('SELECT producto.id AS producto_id \nFROM producto')
+
+    # Page number is part of the key; unknown slugs redirect and are never cached
+    assert client.get('/?page=2').headers['X-Page-Cache'] == 'MISS'
+    assert client.get('/?page=2').headers['X-Page-Cache'] == 'HIT'
+    assert 'X-Page-Cache' not in client.get('/producto/no-existe').headers
+
+
+def test_commits_invalidate_dependent_pages_only(app, client, catalogo):
+    producto_id, sub_a, sub_b = catalogo
+    for url in ('/producto/laptop-x1', '/productos/portatiles', '/productos/monitores', '/guias'):
+        client.get(url)
+
+    with app.app_context():
+        producto = db.session.get(Producto, producto_id)
+        producto.precio = 849.5
+        producto.subcategoria_id = sub_b
+        db.session.commit()
+
+    rv = client.get('/producto/laptop-x1')
+    assert rv.headers['X-Page-Cache'] == 'MISS'
+    assert '849.50' in rv.get_data(as_text=True)
+    # Moving the product changes both subcategory listings
+    assert client.get('/productos/portatiles').headers['X-Page-Cache'] == 'MISS'
+    assert 'Laptop X1' in client.get('/productos/monitores').get_data(as_text=True)
+    assert client.get('/guias').headers['X-Page-Cache'] == 'HIT'
+
+
+def test_changes_from_other_workers_and_stale_while_revalidate(app, client, catalogo):
+    _, sub_a, _ = catalogo
+    client.get('/productos/portatiles')
+    key = ('publico.productos_por_slug', (('slug', 'portatiles'),), 1)
+
+    # Another worker commits: only the tag table changes, found by polling
+    with app.app_context():
+        with db.engine.begin() as connection:
+            bump_tags(connection, {f'subcategory:{sub_a}'})
+    tag_versions.poll_interval = 0
+    try:
+        # While one request is regenerating, the others get the previous copy
+        assert page_cache._claim(key)
+        rv = client.get('/productos/portatiles')
+        assert rv.headers['X-Page-Cache'] == 'STALE'
+        page_cache._regenerating.pop(key).set()
+
+        assert client.get('/productos/portatiles').headers['X-Page-Cache'] == 'MISS'
+        assert client.get('/productos/portatiles').headers['X-Page-Cache'] == 'HIT'
+    finally:
+        tag_versions.poll_interval = 2
+
+
+def test_logged_in_users_bypass_the_cache(app, admin_client, catalogo):
+    admin_client.get('/')
+    assert 'X-Page-Cache' not in admin_client.get('/').headers
+
+
+def test_cached_pages_leave_the_ad_draw_to_the_browser(app, client, catalogo):
+    with app.app_context():
+        db.session.add_all([
+            Advertisement(type='destacado', title='Pesado', is_active=True, weight=3),
+            Advertisement(type='destacado', title='Ligero', is_active=True, weight=1),
+            Advertisement(type='recomendado', title='Unico', is_active=True),
+        ])
+        db.session.commit()
+        layout_cache.invalidate()
+
+    client.get('/producto/laptop-x1')
+    rv = client.get('/producto/laptop-x1')
+    assert rv.headers['X-Page-Cache'] == 'HIT'
+    html = rv.get_data(as_text=True)
+    # Every live ad of a rotating slot, with its weight, in the page every visitor gets
+    assert '<template data-weight="3">' in html and '<template data-weight="1">' in html
+    assert html.count('Pesado') >= 1 and html.count('Ligero') >= 1
+    # A slot with a single live ad needs no draw
+    assert html.count('Unico') == 1
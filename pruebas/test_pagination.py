@@ -0,0 +1,79 @@
+import json
+
+from extensions import db
+from models import Articulo
+from services.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor([42]), 1) == [42]
+
+
+def test_productos_are_paged_by_cursor(app, client, capture_queries, crear_productos):
+    crear_productos(250)
+    ids, url, pages = [], '/api/productos?limit=100', 0
+    while url:
+        with capture_queries() as queries:
+            rv = client.get(url)
+        assert rv.status_code == 200
+        ids.extend(p['id'] for p in rv.get_json())
+        pages += 1
+        # Every page seeks on the primary key instead of skipping rows
+        assert 'ORDER BY producto.id' in queries[-1]
+        if pages > 1:
+            assert 'producto.id >' in queries[-1]
+        cursor = rv.headers.get('X-Next-Cursor')
+        if cursor:
+            assert rv.headers['Link'] == f'<http://localhost/api/productos?limit=100&after={cursor}>; rel="next"'
+        url = f'/api/productos?limit=100&after={cursor}' if cursor else None
+    assert pages == 3 and len(ids) == 250 and ids == sorted(set(ids))
+
+    # Clients that page are not told about the deprecation
+    assert 'Deprecation' not in rv.headers
+    rv = client.get('/api/productos?limit=5000')
+    assert len(rv.get_json()) == 250 and 'X-Next-Cursor' not in rv.headers
+    rv = client.get('/api/productos?limit=10')
+    assert len(rv.get_json()) == 10
+    assert 'limit=10' in rv.headers['Link']
+    assert client.get('/api/productos?after=no-es-un-cursor').status_code == 400
+
+
+def test_unpaged_requests_are_capped_and_deprecated(app, client, crear_productos):
+    crear_productos(250)
+    # Under the cap, clients that predate pagination still get the whole list
+    rv = client.get('/api/productos')
+    assert len(rv.get_json()) == 250 and 'X-Next-Cursor' not in rv.headers
+    assert rv.headers['Deprecation'] == 'true'
+
+    app.config['API_UNPAGED_LIMIT'] = 200
+    rv = client.get('/api/productos')
+    assert len(rv.get_json()) == 200 and rv.headers['Deprecation'] == 'true'
+    rest = client.get(f"/api/productos?after={rv.headers['X-Next-Cursor']}")
+    assert len(rest.get_json()) == 50 and 'Deprecation' not in rest.headers
+
+
+def test_articulos_are_paged_by_cursor(app, client):
+    with app.app_context():
+        db.session.add_all([Articulo(titulo=f'Guía {i}', slug=f'guia-{i}', contenido='...', autor='Ana') for i in range(3)])
+        db.session.commit()
+    first = client.get('/api/articulos?limit=2')
+    second = client.get(f"/api/articulos?limit=2&after={first.headers['X-Next-Cursor']}")
+    assert [a['slug'] for a in first.get_json() + second.get_json()] == ['guia-0', 'guia-1', 'guia-2']
+    assert 'Link' not in second.headers
+
+
+def test_ndjson_exports_stream_every_row(app, client, capture_queries, crear_productos):
+    crear_productos(1500)
+    with capture_queries() as queries:
+        rv = client.get('/api/productos.ndjson')
+        assert rv.is_streamed and rv.mimetype == 'application/x-ndjson'
+        lines = rv.get_data(as_text=True).splitlines()
+    assert len([q for q in queries if 'FROM producto' in q]) == 1 and len(lines) == 1500
+    assert json.loads(lines[0]) == client.get('/api/productos?limit=1').get_json()[0]
+    assert rv.headers['ETag']
+
+    with app.app_context():
+        db.session.add(Articulo(titulo='Guía', slug='guia', contenido='Texto', autor='Ana'))
+        db.session.commit()
+    lines = client.get('/api/articulos.ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['slug'] for line in lines] == ['guia']
@@ -0,0 +1,163 @@
+import time
+
+from extensions import db
+from models import Producto, Articulo
+from services.search_index import fold, search, rebuild, KIND_PRODUCT, KIND_ARTICLE
+from services.spelling import TrigramIndex, spelling
+
+
+def test_fold_matches_slugify_normalization():
+    assert fold('Cámara Réflex  Ñandú: 4K/60fps') == 'camara reflex nandu 4k 60fps'
+    assert fold(None) == ''
+
+
+def test_index_follows_orm_changes_and_ranks_titles_first(app, catalogo):
+    producto_id, sub_a, _ = catalogo
+    with app.app_context():
+        db.session.add_all([
+            Producto(nombre='Funda para portátil', slug='funda', precio=20.0, link='https://tienda.example.com/f',
+                     descripcion='Protege tu Laptop X1 de golpes.', subcategoria_id=sub_a),
+            Articulo(titulo='Cómo elegir cámara', slug='elegir-camara', contenido='Guía de **cámaras** réflex.', autor='Ana'),
+        ])
+        db.session.commit()
+
+        # Prefix matching on folded words; name matches rank above description matches
+        results, total = search('lapt', 10)
+        assert total == 2 and [r['id'] for r in results] == [producto_id, results[1]['id']]
+        assert results[0]['nombre'] == 'Laptop X1' and results[0]['precio'] == 999.0
+        # Products and articles come back in one ranked stream
+        results, total = search('CAMARA reflex', 10)
+        assert total == 1 and results[0]['kind'] == KIND_ARTICLE and results[0]['slug'] == 'elegir-camara'
+        assert results[0]['fecha'] is not None and hasattr(results[0]['fecha'], 'strftime')
+        assert search('cámaras', 10)[1] == 1
+        assert search('', 10) == ([], 0)
+
+        producto = db.session.get(Producto, producto_id)
+        producto.nombre = 'Ultrabook Z'
+        db.session.commit()
+        assert [r['id'] for r in search('ultrabook', 10)[0]] == [producto_id]
+        assert search('laptop', 10)[1] == 1
+
+        db.session.delete(producto)
+        db.session.commit()
+        assert search('ultrabook', 10) == ([], 0)
+
+        with db.engine.begin() as connection:
+            assert rebuild(connection) == 2
+        assert search('funda', 10)[1] == 1
+
+
+def test_article_markup_is_not_indexed(app):
+    with app.app_context():
+        db.session.add(Articulo(titulo='Accesorios', slug='accesorios', autor='Ana', contenido=(
+            'Lee [la guía](https://ejemplo.com/tutorial) &amp; compara.\n\n'
+            '<div class="banner"><img src="foto.jpg" alt="Trípode"></div>'
+        )))
+        db.session.commit()
+
+        def hits():
+            return {term: search(term, 10)[1] for term in ('guia', 'compara', 'tutorial', 'banner', 'href', 'amp', 'img')}
+
+        expected = {'guia': 1, 'compara': 1, 'tutorial': 0, 'banner': 0, 'href': 0, 'amp': 0, 'img': 0}
+        assert hits() == expected
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        assert hits() == expected
+
+
+def test_search_page_is_one_ranked_query(app, client, capture_queries, catalogo):
+    producto_id, sub_a, _ = catalogo
+    with app.app_context():
+        db.session.add_all([
+            Producto(nombre=f'Portátil {i}', slug=f'portatil-{i}', precio=100.0 + i, link='https://tienda.example.com/p',
+                     descripcion='Otro portátil.', subcategoria_id=sub_a)
+            for i in range(10)
+        ] + [Articulo(titulo='Los mejores portátiles', slug='mejores-portatiles', contenido='Lista.', autor='Ana')])
+        db.session.commit()
+
+    client.get('/buscar?q=portatil')  # layout data loaded once
+    with capture_queries() as queries:
+        html = client.get('/buscar?q=portatil').get_data(as_text=True)
+    assert len(queries) == 1 and 'count(*) OVER ()' in queries[0]
+    assert '12 resultados' in html and 'page=2' in html
+    second = client.get('/buscar?q=portatil&page=2').get_data(as_text=True)
+    # 9 + 3 results, the article somewhere among them
+    assert html.count('<article class="col-md-6') == 9
+    assert second.count('<article class="col-md-6') == 3
+    assert 'Los mejores portátiles' in html + second
+    assert 'No se encontraron resultados' in client.get('/buscar?q=inexistente').get_data(as_text=True)
+
+
+def test_trigram_index_prefers_close_and_frequent_words():
+    index = TrigramIndex({'camara': 5, 'camaras': 2, 'cama': 1, 'portatil': 3, '2024': 9, 'tv': 4}, max_words=4)
+    assert len(index) == 4 and '2024' not in index and 'tv' not in index
+    assert index.closest('camra') == 'camara'
+    assert index.closest('portatli') == 'portatil'
+    assert index.closest('zzzz') is None
+    # Capped to the most frequent words
+    assert 'cama' in TrigramIndex({'camara': 5, 'cama': 1}, max_words=2)
+    assert 'cama' not in TrigramIndex({'camara': 5, 'portatil': 3, 'cama': 1}, max_words=2)
+
+
+def test_misspelled_search_shows_corrected_results(app, client, catalogo):
+    with app.app_context():
+        db.session.add(Articulo(titulo='Cómo elegir cámara', slug='elegir-camara', contenido='Réflex o compacta.', autor='Ana'))
+        db.session.commit()
+
+    html = client.get('/buscar?q=laptpo').get_data(as_text=True)
+    assert 'Mostrando resultados para' in html and '>laptop</a>' in html and 'Laptop X1' in html
+    html = client.get('/buscar?q=camra+reflx').get_data(as_text=True)
+    assert '>camara reflex</a>' in html and 'Cómo elegir cámara' in html
+    # Nothing close enough: plain "no results"
+    html = client.get('/buscar?q=qwxz').get_data(as_text=True)
+    assert 'No se encontraron resultados' in html and 'Mostrando resultados para' not in html
+
+
+def test_spelling_reloads_in_the_background(app, admin_client, catalogo):
+    producto_id, sub_a, _ = catalogo
+    with app.app_context():
+        assert spelling.correct('laptpo') == 'laptop'
+    rebuilds = spelling.rebuilds
+    # An admin save does not touch the vocabulary
+    rv = admin_client.post(f'/admin/products/edit/{producto_id}', data={
+        'nombre': 'Ultrabook Z', 'precio': '999', 'categoria_id': str(sub_a),
+        'link': 'https://tienda.example.com/x1', 'descripcion': 'Portátil ligero.', 'imagen': '', 'external_id': '',
+    })
+    assert rv.status_code == 302 and spelling.rebuilds == rebuilds
+
+    spelling.refresh_interval = 0
+    with app.app_context():
+        # Stale: the current vocabulary answers while the new one is built
+        assert spelling.correct('ultrabok') is None
+        deadline = time.monotonic() + 5
+        while spelling.rebuilds == rebuilds and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert spelling.rebuilds == rebuilds + 1
+        assert spelling.correct('ultrabok') == 'ultrabook'
+
+
+def test_migration_backfills_article_text_without_markup(tmp_path, monkeypatch):
+    import os
+    from flask_migrate import upgrade
+    from sqlalchemy import text
+
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'migrado.db'}")
+    monkeypatch.setenv('TEMPLATE_CACHE_DIR', '')
+    from app import create_app
+    app = create_app()
+    migrations = os.path.join(app.root_path, 'migrations')
+    with app.app_context():
+        # An article written before the search index existed
+        upgrade(directory=migrations, revision='3c8f1e7a9d24')
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO articulo (titulo, slug, contenido, autor) VALUES (:titulo, :slug, :contenido, 'Ana')"
+            ), {'titulo': 'Accesorios', 'slug': 'accesorios',
+                'contenido': 'Lee [la guía](https://ejemplo.com/tutorial).\n\n<div class="banner">Trípode</div>'})
+        upgrade(directory=migrations)
+
+        assert search('guia', 10)[1] == 1 and search('tripode', 10)[1] == 1
+        for term in ('tutorial', 'banner', 'class', 'div', 'href'):
+            assert search(term, 10)[1] == 0, term
+        db.session.remove()
+        db.engine.dispose()
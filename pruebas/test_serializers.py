@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from extensions import db
+from services.serializers import PRODUCTO, PRODUCTO_CHATBOT, OrjsonProvider
+
+
+def test_schema_converts_core_rows(app, catalogo):
+    producto_id, _, _ = catalogo
+    with app.app_context():
+        fields = ('id', 'nombre', 'fecha_creacion')
+        [row] = db.session.execute(PRODUCTO.select(fields)).all()
+        data = PRODUCTO.converter(fields)(row)
+        assert data['id'] == producto_id and data['nombre'] == 'Laptop X1'
+        assert datetime.fromisoformat(data['fecha_creacion'])
+        assert PRODUCTO_CHATBOT.dump(db.session.execute(PRODUCTO_CHATBOT.select())) == [{
+            'id': producto_id, 'name': 'Laptop X1', 'price': 999.0, 'description': 'Portátil ligero.',
+            'link': 'https://tienda.example.com/x1'}]
+
+
+def test_orjson_provider_matches_the_default_one(app):
+    value = {'b': [1, 2.5, None], 'a': 'Cámara', 'fecha': datetime(2024, 5, 1, 12, 30)}
+    fast, default = OrjsonProvider(app), DefaultJSONProvider(app)
+    assert json.loads(fast.dumps(value)) == json.loads(default.dumps(value))
+    assert fast.dumps(value).index('"a"') < fast.dumps(value).index('"b"')
+    with app.test_request_context():
+        assert fast.response(value).get_json() == default.response(value).get_json()
+        assert fast.response(value).get_data().endswith(b'\n')
+    assert fast.loads('{"a": [1]}') == {'a': [1]}
+
+
+def test_admin_product_list_uses_rows(app, admin_client, catalogo):
+    html = admin_client.get('/admin/products').get_data(as_text=True)
+    assert 'Laptop X1' in html and 'Tecnología &gt; Portátiles' in html
+
+
+def test_flashed_messages_survive_the_orjson_provider(app, client):
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    app.json = OrjsonProvider(app)
+    with app.app_context():
+        db.session.add(User(username='admin_flash', password_hash=generate_password_hash('x'), is_admin=True))
+        db.session.commit()
+
+    # The session cookie stores (category, message) tuples, tagged by Flask's serializer
+    rv = client.post('/admin/login', data={'username': 'admin_flash', 'password': 'x'}, follow_redirects=True)
+    assert rv.status_code == 200 and 'Inicio de sesión exitoso' in rv.get_data(as_text=True)
+
+    with client.session_transaction() as session:
+        session['_flashes'] = [('info', 'Mensaje enviado.')]
+    rv = client.get('/acerca-de')
+    assert rv.status_code == 200 and 'Mensaje enviado.' in rv.get_data(as_text=True)
@@ -0,0 +1,41 @@
+import json
+import os
+
+from extensions import db
+from models import Producto
+from services.static_export import export_site, MANIFEST_NAME
+
+
+def test_export_renders_sitemap_pages_then_only_what_changed(app, tmp_path, catalogo):
+    producto_id, _, _ = catalogo
+    output = tmp_path / 'site'
+
+    with app.app_context():
+        first = export_site(str(output))
+    assert first['rendered'] > 0 and first['unchanged'] == 0
+    assert (output / 'index.html').exists()
+    assert (output / 'sitemap.xml').exists()
+    assert 'Laptop X1' in (output / 'producto' / 'laptop-x1' / 'index.html').read_text()
+    # Pages with forms (CSRF tokens) stay dynamic
+    assert '/contacto' in first['dynamic'] and not (output / 'contacto').exists()
+    manifest = json.loads((output / MANIFEST_NAME).read_text())
+    assert f'product:{producto_id}' in manifest['pages']['/producto/laptop-x1']['tags']
+
+    with app.app_context():
+        second = export_site(str(output))
+    assert second['rendered'] == 0
+
+    with app.app_context():
+        db.session.get(Producto, producto_id).precio = 849.5
+        db.session.commit()
+        third = export_site(str(output))
+    # Product page, home, categories and the sitemap; guides and legal pages are untouched
+    assert third['rendered'] == 4
+    assert '849.50' in (output / 'producto' / 'laptop-x1' / 'index.html').read_text()
+
+    with app.app_context():
+        db.session.delete(db.session.get(Producto, producto_id))
+        db.session.commit()
+        fourth = export_site(str(output))
+    assert fourth['removed'] == 1
+    assert not os.path.exists(output / 'producto' / 'laptop-x1' / 'index.html')
@@ -0,0 +1,88 @@
+import time
+
+from extensions import db
+from models import Producto, Articulo
+from services.invalidation import bump_tags, tag_versions
+from services.suggest_index import suggest_index, index_keys
+
+
+def test_index_keys_cover_word_starts():
+    assert index_keys('Cámara Réflex 4K') == ['camara-reflex-4k', 'reflex-4k', '4k']
+
+
+def test_suggest_from_memory_with_accent_folding(app, client, capture_queries, catalogo):
+    with app.app_context():
+        db.session.add(Articulo(titulo='Cómo elegir un portátil', slug='elegir-portatil', contenido='...', autor='Ana'))
+        db.session.commit()
+
+    data = client.get('/api/suggest?q=port').get_json()
+    # Whole-text matches first: the subcategory, then the guide matched on a later word
+    assert [s['texto'] for s in data['sugerencias']] == ['Portátiles', 'Cómo elegir un portátil']
+    assert data['sugerencias'][0]['url'] == '/productos/portatiles'
+    assert data['sugerencias'][1]['tipo'] == 'articulo'
+
+    with capture_queries() as queries:
+        data = client.get('/api/suggest?q=LÁPT').get_json()
+    assert queries == []
+    assert data['sugerencias'] == [{'tipo': 'producto', 'texto': 'Laptop X1', 'url': '/producto/laptop-x1'}]
+    assert client.get('/api/suggest?q=').get_json()['sugerencias'] == []
+
+
+def test_local_commits_update_the_index_in_place(app, client, catalogo):
+    producto_id, sub_a, _ = catalogo
+    client.get('/api/suggest?q=lap')
+    rebuilds = suggest_index.rebuilds
+    with app.app_context():
+        producto = db.session.get(Producto, producto_id)
+        producto.nombre = 'Ultrabook Z'
+        db.session.add(Producto(nombre='Laptop Pro', slug='laptop-pro', precio=1500.0,
+                                link='https://tienda.example.com/pro', subcategoria_id=sub_a))
+        db.session.commit()
+
+    assert [s['texto'] for s in client.get('/api/suggest?q=lap').get_json()['sugerencias']] == ['Laptop Pro']
+    assert [s['texto'] for s in client.get('/api/suggest?q=ultra').get_json()['sugerencias']] == ['Ultrabook Z']
+    with app.app_context():
+        db.session.delete(db.session.get(Producto, producto_id))
+        db.session.commit()
+    assert client.get('/api/suggest?q=ultra').get_json()['sugerencias'] == []
+    assert suggest_index.rebuilds == rebuilds
+
+
+def test_other_workers_changes_trigger_a_rebuild(app, client, catalogo):
+    _, sub_a, _ = catalogo
+    client.get('/api/suggest?q=lap')
+    rebuilds = suggest_index.rebuilds
+    # Another worker's write: the rows and the tag move without this process' hooks
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(Producto.__table__.insert().values(
+                nombre='Lámpara LED', slug='lampara-led', precio=30.0, link='https://tienda.example.com/l',
+                subcategoria_id=sub_a))
+            bump_tags(connection, {'products'})
+    tag_versions.poll_interval = 0
+    try:
+        # The lookup answers from the current index and starts a rebuild in the background
+        data = client.get('/api/suggest?q=la').get_json()
+        assert [s['texto'] for s in data['sugerencias']] == ['Laptop X1']
+        deadline = time.monotonic() + 5
+        while suggest_index.rebuilds == rebuilds and time.monotonic() < deadline:
+            time.sleep(0.01)
+        data = client.get('/api/suggest?q=la').get_json()
+    finally:
+        tag_versions.poll_interval = 2
+    assert suggest_index.rebuilds == rebuilds + 1
+    assert [s['texto'] for s in data['sugerencias']] == ['Laptop X1', 'Lámpara LED']
+
+
+def test_admin_saves_do_not_rebuild_the_index(app, admin_client, catalogo):
+    producto_id, sub_a, _ = catalogo
+    admin_client.get('/api/suggest?q=lap')
+    rebuilds = suggest_index.rebuilds
+    rv = admin_client.post(f'/admin/products/edit/{producto_id}', data={
+        'nombre': 'Ultrabook Z', 'precio': '999', 'categoria_id': str(sub_a),
+        'link': 'https://tienda.example.com/x1', 'descripcion': 'Portátil ligero.', 'imagen': '', 'external_id': '',
+    })
+    assert rv.status_code == 302
+    data = admin_client.get('/api/suggest?q=ultra').get_json()
+    assert [s['texto'] for s in data['sugerencias']] == ['Ultrabook Z']
+    assert suggest_index.rebuilds == rebuilds
@@ -0,0 +1,19 @@
+import os
+
+from services.template_cache import template_cache
+
+
+def test_compiled_templates_are_loaded_without_compiling(app, monkeypatch):
+    assert 'base.html' in template_cache.warmed
+    compiled, errors = template_cache.compile_all(app)
+    assert 'index.html' in compiled and 'admin/admin_dashboard.html' in compiled
+    assert len(os.listdir(app.config['TEMPLATE_CACHE_DIR'])) == len(compiled)
+
+    # A new process: empty in-memory cache, bytecode on disk
+    app.jinja_env.cache.clear()
+    calls = []
+    compile_source = app.jinja_env.compile
+    monkeypatch.setattr(app.jinja_env, 'compile', lambda *args, **kwargs: calls.append(args) or compile_source(*args, **kwargs))
+    app.jinja_env.get_template('index.html')
+    app.jinja_env.get_template('admin/admin_base.html')
+    assert calls == []
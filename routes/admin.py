@@ -1,11 +1,11 @@
-from flask import Blueprint, render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, Producto, Categoria, Subcategoria, Articulo, SyncInfo, SocialMediaLink, ContactMessage, Testimonial, Advertisement, Afiliado, EstadisticaAfiliado, AdsenseConfig
 from werkzeug.security import check_password_hash
 from extensions import db
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 # Removed unused imports from flask_wtf and wtforms
 # from flask_wtf import FlaskForm # REMOVE THIS LINE
 # from wtforms import StringField, SelectField, SubmitField # REMOVE THIS LINE
@@ -16,6 +16,11 @@ from forms import LoginForm, ProductForm, CategoryForm, SubCategoryForm, Article
 
 from utils import slugify
 from services.api_sync import fetch_and_update_products_from_external_api
+from services.referral_redirect import referral_links
+from services.hyperloglog import unique_count
+from services.layout_cache import layout_cache, SOCIAL_MEDIA_LINKS, ADSENSE_CONFIG, ADVERTISEMENTS
+from services.query_stats import query_stats
+from services.serializers import PRODUCTO
 
 import functools
 
@@ -93,26 +98,15 @@ def admin_dashboard():
 @bp.route('/products')
 @admin_required
 def admin_products():
-    productos = Producto.query.all()
     category_lookup = {
         subcat.id: f"{cat.nombre} > {subcat.nombre}"
         for cat in Categoria.query.options(joinedload(Categoria.subcategorias)).all()
         for subcat in cat.subcategorias
     }
-    products_for_display = []
-    for p in productos:
-        products_for_display.append({
-            "id": p.id,
-            "nombre": p.nombre,
-            "slug": p.slug,
-            "precio": p.precio,
-            "descripcion": p.descripcion,
-            "imagen": p.imagen,
-            "link": p.link,
-            "subcategoria_id": p.subcategoria_id,
-            "external_id": p.external_id,
-            "categoria_display_name": category_lookup.get(p.subcategoria_id, 'Desconocida')
-        })
+    fields = ('id', 'nombre', 'slug', 'precio', 'descripcion', 'imagen', 'link', 'subcategoria_id', 'external_id')
+    products_for_display = PRODUCTO.dump(db.session.execute(PRODUCTO.select(fields)), fields)
+    for p in products_for_display:
+        p["categoria_display_name"] = category_lookup.get(p["subcategoria_id"], 'Desconocida')
     return render_template('admin/admin_products.html', productos=products_for_display)
 
 @bp.route('/products/add', methods=['GET', 'POST'])
@@ -179,6 +173,7 @@ def admin_edit_product(product_id):
 
         try:
             db.session.commit()
+            layout_cache.invalidate(ADVERTISEMENTS) # Ads embed product data
             flash('Producto actualizado exitosamente!', 'success')
             return redirect(url_for('admin.admin_products'))
         except IntegrityError:
@@ -196,6 +191,7 @@ def admin_delete_product(product_id):
     try:
         db.session.delete(product)
         db.session.commit()
+        layout_cache.invalidate(ADVERTISEMENTS)
         flash('Producto eliminado exitosamente!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -432,6 +428,7 @@ def admin_sync_api_products():
             sync_info.last_sync_count = updated_count
             sync_info.last_synced_api_url = api_url
             db.session.commit()
+            layout_cache.invalidate(ADVERTISEMENTS)
 
             flash(f'Sincronización API completada. Se actualizaron/añadieron {updated_count} productos.', 'success')
         except Exception as e:
@@ -484,6 +481,7 @@ def admin_add_social_media():
         try:
             db.session.add(new_link)
             db.session.commit()
+            layout_cache.invalidate(SOCIAL_MEDIA_LINKS)
             flash('Social media link added successfully!', 'success')
             return redirect(url_for('admin.admin_social_media'))
         except IntegrityError:
@@ -508,6 +506,7 @@ def admin_edit_social_media(link_id):
         link.icon_class = icon_class
         try:
             db.session.commit()
+            layout_cache.invalidate(SOCIAL_MEDIA_LINKS)
             flash('Social media link updated successfully!', 'success')
             return redirect(url_for('admin.admin_social_media'))
         except IntegrityError:
@@ -525,6 +524,7 @@ def admin_delete_social_media(link_id):
     try:
         db.session.delete(link)
         db.session.commit()
+        layout_cache.invalidate(SOCIAL_MEDIA_LINKS)
         flash('Social media link deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -774,11 +774,13 @@ def admin_add_advertisement():
             adsense_client_id=form.adsense_client_id.data,
             adsense_slot_id=form.adsense_slot_id.data,
             start_date=form.start_date.data,
-            end_date=form.end_date.data
+            end_date=form.end_date.data,
+            weight=form.weight.data
         )
         try:
             db.session.add(new_ad)
             db.session.commit()
+            layout_cache.invalidate(ADVERTISEMENTS)
             flash('Advertisement added successfully!', 'success')
             return redirect(url_for('admin.admin_advertisements'))
         except Exception as e:
@@ -802,6 +804,7 @@ def admin_edit_advertisement(ad_id):
         advertisement.product_id = product_id
         try:
             db.session.commit()
+            layout_cache.invalidate(ADVERTISEMENTS)
             flash('Advertisement updated successfully!', 'success')
             return redirect(url_for('admin.admin_advertisements'))
         except Exception as e:
@@ -816,6 +819,7 @@ def admin_delete_advertisement(ad_id):
     try:
         db.session.delete(advertisement)
         db.session.commit()
+        layout_cache.invalidate(ADVERTISEMENTS)
         flash('Advertisement deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -844,6 +848,7 @@ def admin_add_affiliate():
         try:
             db.session.add(new_affiliate)
             db.session.commit()
+            referral_links.reload()
             flash('Affiliate added successfully!', 'success')
             return redirect(url_for('admin.admin_affiliates'))
         except IntegrityError:
@@ -863,6 +868,7 @@ def admin_edit_affiliate(affiliate_id):
         form.populate_obj(affiliate)
         try:
             db.session.commit()
+            referral_links.reload()
             flash('Affiliate updated successfully!', 'success')
             return redirect(url_for('admin.admin_affiliates'))
         except IntegrityError:
@@ -880,6 +886,7 @@ def admin_delete_affiliate(affiliate_id):
     try:
         db.session.delete(affiliate)
         db.session.commit()
+        referral_links.reload()
         flash('Affiliate deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -891,7 +898,24 @@ def admin_delete_affiliate(affiliate_id):
 @admin_required
 def admin_affiliate_statistics():
     stats = EstadisticaAfiliado.query.options(joinedload(EstadisticaAfiliado.afiliado)).order_by(EstadisticaAfiliado.fecha.desc()).all()
-    return render_template('admin/admin_affiliate_statistics.html', stats=stats)
+    # Unique visitors come from merging the daily HyperLogLog sketches, so a
+    # visitor who clicked on several days is only counted once per period
+    unique_visitors = {stat.id: unique_count([stat.visitantes_hll]) for stat in stats}
+    today = date.today()
+    periods = {'week': today - timedelta(days=6), 'month': today - timedelta(days=29)}
+    sketches_by_affiliate = {}
+    for stat in stats:
+        summary = sketches_by_affiliate.setdefault(stat.afiliado_id, {'afiliado': stat.afiliado, 'week': [], 'month': []})
+        for period, since in periods.items():
+            if stat.fecha and stat.fecha >= since:
+                summary[period].append(stat.visitantes_hll)
+    affiliate_uniques = [{
+        'afiliado': summary['afiliado'],
+        'week': unique_count(summary['week']),
+        'month': unique_count(summary['month']),
+    } for summary in sketches_by_affiliate.values()]
+    return render_template('admin/admin_affiliate_statistics.html', stats=stats,
+                           unique_visitors=unique_visitors, affiliate_uniques=affiliate_uniques)
 
 @bp.route('/affiliate_statistics/add', methods=['GET', 'POST'])
 @admin_required
@@ -957,6 +981,13 @@ def admin_delete_affiliate_statistic(stat_id):
         flash(f'Error deleting affiliate statistic: {e}', 'danger')
     return redirect(url_for('admin.admin_affiliate_statistics'))
 
+# --- Query instrumentation ---
+@bp.route('/query_stats')
+@admin_required
+def admin_query_stats():
+    """Per-endpoint query counts and skipped layout lookups for this worker process."""
+    return jsonify(query_stats.snapshot())
+
 # --- Admin Adsense Configuration ---
 @bp.route('/adsense_config', methods=['GET', 'POST'])
 @admin_required
@@ -973,12 +1004,14 @@ def admin_adsense_config():
         )
         db.session.add(config)
         db.session.commit()
+        layout_cache.invalidate(ADSENSE_CONFIG)
 
     form = AdsenseConfigForm(obj=config)
     if form.validate_on_submit():
         form.populate_obj(config)
         try:
             db.session.commit()
+            layout_cache.invalidate(ADSENSE_CONFIG)
             flash('AdSense configuration updated successfully!', 'success')
             return redirect(url_for('admin.admin_dashboard')) # Redirect to dashboard after saving
         except Exception as e:
@@ -1,144 +1,298 @@
 # C:\Users\joran\OneDrive\data\Documentos\LMSGI\afiliados_app\routes\api.py
 
-from flask import Blueprint, jsonify # Removed 'request' as it's not used in this file
-# Removed 'from app import db' as 'db' is not directly used in this file's queries
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context, url_for
+from extensions import db
 from models import Producto, Categoria, Subcategoria, Articulo # Ensure Subcategoria is imported explicitly
-from sqlalchemy.orm import joinedload # To efficiently load related data
+from services.conditional import content_validators
+from services.suggest_index import suggest_index, ENDPOINTS
+from services.pagination import InvalidCursor, page_args, listing_page_args, keyset_page, paginated
+from services.serializers import PRODUCTO, ARTICULO, CATEGORIA, SUBCATEGORIA
+from services.change_feed import changes
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Get all products
+# Rows fetched per round trip by the NDJSON exports
+EXPORT_BATCH_SIZE = 1000
+
+# Products embedded in a subcategory, unless ?fields= says otherwise
+SUBCATEGORIA_PRODUCTO_FIELDS = ('id', 'nombre', 'slug', 'precio', 'imagen', 'link')
+# Related rows a product listing can embed with ?include=
+PRODUCTO_INCLUDES = ('subcategoria', 'categoria')
+
+
+class InvalidParameter(ValueError):
+    pass
+
+
+def requested(param, available, default=None):
+    """
+    Names listed in ?<param>=a,b that are in 'available', in the order of
+    'available'; 'default' when the parameter is absent. Unknown names are
+    a 400, not silently dropped.
+    """
+    raw = request.args.get(param)
+    if raw is None:
+        return default
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = names.difference(available)
+    if unknown:
+        raise InvalidParameter(f"Valor desconocido en '{param}': {', '.join(sorted(unknown))}")
+    return tuple(name for name in available if name in names)
+
+
+def requested_fields(available, default=None):
+    """?fields= of a schema; 'id' always comes first."""
+    fields = requested('fields', available, default or available)
+    return fields if 'id' in fields else ('id', *fields)
+
+
+def producto_columns(fields, include):
+    """Product columns to select: 'fields', plus the key the includes hang from."""
+    if include and 'subcategoria_id' not in fields:
+        return (*fields, 'subcategoria_id')
+    return fields
+
+
+def con_relaciones(productos, fields, include):
+    """
+    Embeds the ?include= rows into product dicts: one IN query per relation
+    for the whole page, instead of one lookup per product.
+    """
+    if not include:
+        return productos
+    ids = {p['subcategoria_id'] for p in productos} - {None}
+    subcategorias = {sc['id']: sc for sc in SUBCATEGORIA.dump(db.session.execute(
+        SUBCATEGORIA.select().where(Subcategoria.id.in_(ids))
+    ))} if ids else {}
+    categorias = {}
+    if 'categoria' in include and subcategorias:
+        categorias = {c['id']: c for c in CATEGORIA.dump(db.session.execute(
+            CATEGORIA.select().where(Categoria.id.in_({sc['categoria_id'] for sc in subcategorias.values()}))
+        ))}
+    for p in productos:
+        sc = subcategorias.get(p['subcategoria_id'])
+        if 'subcategoria' in include:
+            p['subcategoria'] = sc
+        if 'categoria' in include:
+            p['categoria'] = categorias.get(sc['categoria_id']) if sc else None
+        if 'subcategoria_id' not in fields:
+            del p['subcategoria_id']
+    return productos
+
+
+def producto_tags(*tags):
+    """Embedded subcategories and categories make the response depend on 'categories' too."""
+    return set(tags) | ({'categories'} if request.args.get('include') else set())
+
+
+def batch_keys():
+    """
+    ('id', ids) or ('slug', slugs) from ?ids=1,2 or ?slugs=a,b, in request
+    order without repeats; at most API_BATCH_MAX of them.
+    """
+    ids, slugs = request.args.get('ids'), request.args.get('slugs')
+    if (ids is None) == (slugs is None):
+        raise InvalidParameter("Indique 'ids' o 'slugs' (solo uno de los dos)")
+    kind, raw = ('id', ids) if ids is not None else ('slug', slugs)
+    keys = list(dict.fromkeys(key.strip() for key in raw.split(',') if key.strip()))
+    if kind == 'id':
+        try:
+            keys = list(dict.fromkeys(int(key) for key in keys))
+        except ValueError:
+            raise InvalidParameter("'ids' debe ser una lista de números separados por comas")
+    limit = current_app.config.get('API_BATCH_MAX', 500)
+    if len(keys) > limit:
+        raise InvalidParameter(f"Como máximo {limit} productos por petición")
+    return kind, keys
+
+
+def batch_tags():
+    """
+    product:<id> of every key, so the validators only change with those
+    products. Slugs need an id lookup, and a slug not found yet depends on
+    'products' (it may be created).
+    """
+    kind, keys = batch_keys()
+    if kind == 'id':
+        return producto_tags(*(f'product:{key}' for key in keys))
+    ids = db.session.execute(db.select(Producto.id).where(Producto.slug.in_(keys))).scalars().all() if keys else []
+    tags = {f'product:{producto_id}' for producto_id in ids}
+    if len(ids) < len(keys):
+        tags.add('products')
+    return producto_tags(*tags)
+
+
+def ndjson_export(schema, fields):
+    """
+    Streams every row of 'schema' as one JSON object per line.
+
+    Rows come from a server-side cursor EXPORT_BATCH_SIZE at a time (plain
+    rows, no ORM objects) and each batch is written out before the next one
+    is fetched, so memory use does not depend on the size of the table.
+    """
+    dumps = current_app.json.dumps
+    convert = schema.converter(fields)
+
+    def generate():
+        result = db.session.execute(
+            schema.select(fields).order_by(schema.columns(fields)[0]),
+            execution_options={'yield_per': EXPORT_BATCH_SIZE}
+        )
+        for rows in result.partitions():
+            yield ''.join(dumps(convert(row)) + '\n' for row in rows)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@bp.errorhandler(InvalidCursor)
+def cursor_invalido(error):
+    return jsonify({"mensaje": "Cursor de paginación no válido"}), 400
+
+
+@bp.errorhandler(InvalidParameter)
+def parametro_invalido(error):
+    return jsonify({"mensaje": str(error)}), 400
+
+
+# Get products, one page at a time (?limit=&after=, see services/pagination.py),
+# with only the ?fields= asked for and ?include=subcategoria,categoria embedded
 @bp.route('/productos', methods=['GET'])
+@content_validators.conditional(lambda: producto_tags('products'))
 def api_productos():
-    productos = Producto.query.all()
-    productos_data = [{
-        "id": p.id,
-        "nombre": p.nombre,
-        "slug": p.slug,
-        "precio": p.precio,
-        "descripcion": p.descripcion,
-        "imagen": p.imagen,
-        "link": p.link,
-        "subcategoria_id": p.subcategoria_id,
-        "external_id": p.external_id,
-        "fecha_creacion": p.fecha_creacion.isoformat() if p.fecha_creacion else None,
-        "fecha_actualizacion": p.fecha_actualizacion.isoformat() if p.fecha_actualizacion else None
-    } for p in productos]
-    return jsonify(productos_data)
+    limit, after = listing_page_args()
+    fields = requested_fields(PRODUCTO.fields)
+    include = requested('include', PRODUCTO_INCLUDES, ())
+    columns = producto_columns(fields, include)
+    rows, next_cursor = keyset_page(PRODUCTO.select(columns), (Producto.id,), limit, after)
+    return paginated(con_relaciones(PRODUCTO.dump(rows, columns), fields, include), next_cursor)
+
+# The whole catalog, one product per line, for partner integrations
+@bp.route('/productos.ndjson', methods=['GET'])
+@content_validators.conditional(lambda: {'products'})
+def api_productos_ndjson():
+    return ndjson_export(PRODUCTO, requested_fields(PRODUCTO.fields))
+
+# Several products by id or slug in one request and one IN query: ?ids=1,2,3 or ?slugs=a,b
+# (plus ?fields= and ?include=). Products come back in request order, unknown keys in "faltantes".
+@bp.route('/productos/batch', methods=['GET'])
+@content_validators.conditional(batch_tags)
+def api_productos_batch():
+    kind, keys = batch_keys()
+    fields = requested_fields(PRODUCTO.fields)
+    include = requested('include', PRODUCTO_INCLUDES, ())
+    columns = producto_columns(fields, include)
+    if kind not in columns:
+        columns = (*columns, kind)
+    rows = db.session.execute(PRODUCTO.select(columns).where(getattr(Producto, kind).in_(keys))) if keys else []
+    found = {p[kind]: p for p in PRODUCTO.dump(rows, columns)}
+    productos = con_relaciones([found[key] for key in keys if key in found], fields, include)
+    if kind not in fields:
+        for p in productos:
+            del p[kind]
+    return jsonify({"productos": productos, "faltantes": [key for key in keys if key not in found]})
+
+# Products created, updated or deleted since ?since= (a watermark from the previous call,
+# or an ISO date to start from), for replicas that only want to apply the differences
+@bp.route('/productos/changes', methods=['GET'])
+def api_productos_changes():
+    limit, _ = page_args()
+    productos, eliminados, watermark, completo = changes(
+        request.args.get('since'), limit, requested_fields(PRODUCTO.fields),
+        settle=current_app.config.get('CHANGE_FEED_SETTLE_S', 5)
+    )
+    response = jsonify({"cambios": productos, "eliminados": eliminados, "watermark": watermark, "completo": completo})
+    # Depends on the clock as well as the content: no validators, always asked again
+    response.cache_control.no_store = True
+    return response
 
 # Get a product by ID
 @bp.route('/productos/<int:producto_id>', methods=['GET'])
+@content_validators.conditional(lambda producto_id: producto_tags(f'product:{producto_id}'))
 def api_producto_por_id(producto_id):
-    producto = Producto.query.get(producto_id)
-    if producto:
-        return jsonify({
-            "id": producto.id,
-            "nombre": producto.nombre,
-            "slug": producto.slug,
-            "precio": producto.precio,
-            "descripcion": producto.descripcion,
-            "imagen": producto.imagen,
-            "link": producto.link,
-            "subcategoria_id": producto.subcategoria_id,
-            "external_id": producto.external_id,
-            "fecha_creacion": producto.fecha_creacion.isoformat() if producto.fecha_creacion else None,
-            "fecha_actualizacion": producto.fecha_actualizacion.isoformat() if producto.fecha_actualizacion else None
-        })
+    fields = requested_fields(PRODUCTO.fields)
+    include = requested('include', PRODUCTO_INCLUDES, ())
+    columns = producto_columns(fields, include)
+    row = db.session.execute(PRODUCTO.select(columns).where(Producto.id == producto_id)).first()
+    if row:
+        return jsonify(con_relaciones([PRODUCTO.converter(columns)(row)], fields, include)[0])
     return jsonify({"mensaje": "Producto no encontrado"}), 404
 
 # Get all categories
 @bp.route('/categorias', methods=['GET'])
+@content_validators.conditional(lambda: {'categories'})
 def api_categorias():
-    categorias = Categoria.query.all()
-    categorias_data = [{
-        "id": c.id,
-        "nombre": c.nombre,
-        "slug": c.slug
-    } for c in categorias]
-    return jsonify(categorias_data)
+    return jsonify(CATEGORIA.dump(db.session.execute(CATEGORIA.select().order_by(Categoria.id))))
 
 # Get a category by ID with its subcategories
 @bp.route('/categorias/<int:categoria_id>', methods=['GET'])
+@content_validators.conditional(lambda categoria_id: {'categories'})
 def api_categoria_por_id(categoria_id):
-    # Use joinedload to prevent N+1 query problem for subcategories
-    categoria = Categoria.query.options(joinedload(Categoria.subcategorias)).get(categoria_id)
-    if categoria:
-        subcategorias_data = [{
-            "id": sc.id,
-            "nombre": sc.nombre,
-            "slug": sc.slug,
-            "categoria_id": sc.categoria_id
-        } for sc in categoria.subcategorias]
-        return jsonify({
-            "id": categoria.id,
-            "nombre": categoria.nombre,
-            "slug": categoria.slug,
-            "subcategorias": subcategorias_data
-        })
+    row = db.session.execute(CATEGORIA.select().where(Categoria.id == categoria_id)).first()
+    if row:
+        categoria = CATEGORIA.converter()(row)
+        categoria["subcategorias"] = SUBCATEGORIA.dump(db.session.execute(
+            SUBCATEGORIA.select().where(Subcategoria.categoria_id == categoria_id).order_by(Subcategoria.id)
+        ))
+        return jsonify(categoria)
     return jsonify({"mensaje": "Categoría no encontrada"}), 404
 
 # Get all subcategories (New endpoint, useful for nested relationships)
 @bp.route('/subcategorias', methods=['GET'])
+@content_validators.conditional(lambda: {'categories'})
 def api_subcategorias():
-    subcategorias = Subcategoria.query.all()
-    subcategorias_data = [{
-        "id": sc.id,
-        "nombre": sc.nombre,
-        "slug": sc.slug,
-        "categoria_id": sc.categoria_id
-    } for sc in subcategorias]
-    return jsonify(subcategorias_data)
+    return jsonify(SUBCATEGORIA.dump(db.session.execute(SUBCATEGORIA.select().order_by(Subcategoria.id))))
 
 # Get a subcategory by ID with its products (New endpoint)
 @bp.route('/subcategorias/<int:subcategoria_id>', methods=['GET'])
+@content_validators.conditional(lambda subcategoria_id: {f'subcategory:{subcategoria_id}'})
 def api_subcategoria_por_id(subcategoria_id):
-    subcategoria = Subcategoria.query.options(joinedload(Subcategoria.productos)).get(subcategoria_id)
-    if subcategoria:
-        productos_data = [{
-            "id": p.id,
-            "nombre": p.nombre,
-            "slug": p.slug,
-            "precio": p.precio,
-            "imagen": p.imagen,
-            "link": p.link
-        } for p in subcategoria.productos]
-        return jsonify({
-            "id": subcategoria.id,
-            "nombre": subcategoria.nombre,
-            "slug": subcategoria.slug,
-            "categoria_id": subcategoria.categoria_id,
-            "productos": productos_data
-        })
+    # Products are embedded unless ?include= leaves them out; ?fields= picks their fields
+    include = requested('include', ('productos',), ('productos',))
+    row = db.session.execute(SUBCATEGORIA.select().where(Subcategoria.id == subcategoria_id)).first()
+    if row:
+        subcategoria = SUBCATEGORIA.converter()(row)
+        if include:
+            fields = requested_fields(PRODUCTO.fields, SUBCATEGORIA_PRODUCTO_FIELDS)
+            subcategoria["productos"] = PRODUCTO.dump(db.session.execute(
+                PRODUCTO.select(fields).where(Producto.subcategoria_id == subcategoria_id).order_by(Producto.id)
+            ), fields)
+        return jsonify(subcategoria)
     return jsonify({"mensaje": "Subcategoría no encontrada"}), 404
 
 
-# Get all articles
+# Get articles, one page at a time (?limit=&after=), with only the ?fields= asked for
 @bp.route('/articulos', methods=['GET'])
+@content_validators.conditional(lambda: {'articles'})
 def api_articulos():
-    articulos = Articulo.query.all()
-    articulos_data = [{
-        "id": a.id,
-        "titulo": a.titulo,
-        "slug": a.slug, # Corrected: Added slug field
-        "contenido": a.contenido,
-        "autor": a.autor, # Corrected: 'Autor' to 'autor'
-        "fecha": a.fecha.isoformat() if a.fecha else None,
-        "imagen": a.imagen
-    } for a in articulos]
-    return jsonify(articulos_data)
+    limit, after = listing_page_args()
+    fields = requested_fields(ARTICULO.fields)
+    rows, next_cursor = keyset_page(ARTICULO.select(fields), (Articulo.id,), limit, after)
+    return paginated(ARTICULO.dump(rows, fields), next_cursor)
+
+# Every article, one per line
+@bp.route('/articulos.ndjson', methods=['GET'])
+@content_validators.conditional(lambda: {'articles'})
+def api_articulos_ndjson():
+    return ndjson_export(ARTICULO, requested_fields(ARTICULO.fields))
 
 # Obtener un artículo por ID
 @bp.route('/articulos/<int:articulo_id>', methods=['GET'])
+@content_validators.conditional(lambda articulo_id: {f'article:{articulo_id}'})
 def api_articulo_por_id(articulo_id):
-    articulo = Articulo.query.get(articulo_id)
-    if articulo:
-        return jsonify({
-            "id": articulo.id,
-            "titulo": articulo.titulo,
-            "slug": articulo.slug,
-            "contenido": articulo.contenido,
-            "autor": articulo.autor,
-            "fecha": articulo.fecha.isoformat() if articulo.fecha else None,
-            "imagen": articulo.imagen
-        })
-    return jsonify({"mensaje": "Artículo no encontrado"}), 404
\ No newline at end of file
+    fields = requested_fields(ARTICULO.fields)
+    row = db.session.execute(ARTICULO.select(fields).where(Articulo.id == articulo_id)).first()
+    if row:
+        return jsonify(ARTICULO.converter(fields)(row))
+    return jsonify({"mensaje": "Artículo no encontrado"}), 404
+
+# Search box suggestions, served from memory (services/suggest_index.py)
+@bp.route('/suggest', methods=['GET'])
+def api_suggest():
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', suggest_index.limit, type=int), 20))
+    sugerencias = [{
+        "tipo": kind,
+        "texto": label,
+        "url": url_for(ENDPOINTS[kind], slug=slug)
+    } for kind, label, slug in suggest_index.suggest(query, limit)]
+    return jsonify({"q": query, "sugerencias": sugerencias})
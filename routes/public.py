@@ -5,14 +5,21 @@ from datetime import datetime, date, timezone
 # Third-party imports
 import openai
 from dotenv import load_dotenv
-from flask import Blueprint, render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request, abort
 from sqlalchemy import func
-from sqlalchemy.orm import joinedload
 
 # Local application imports
-from models import Producto, Categoria, Subcategoria, Articulo, ContactMessage, Testimonial, Advertisement, Afiliado, EstadisticaAfiliado, AdsenseConfig
+from models import Producto, Categoria, Subcategoria, Articulo, ContactMessage, Testimonial, Afiliado
 from forms import PublicTestimonialForm
 from extensions import db # Corrected 'De extensiones Importar DB'
+from services.click_counter import click_counter
+from services.click_filter import client_ip
+from services.conditional import content_validators
+from services.invalidation import tag_versions
+from services.page_cache import page_cache
+from services.search_index import search, KIND_PRODUCT, KIND_ARTICLE
+from services.spelling import spelling
+from services.serializers import PRODUCTO_CHATBOT
 
 # Load environment variables as early as possible
 load_dotenv()
@@ -39,17 +46,7 @@ def get_all_products_for_chatbot():
     Handles possible database errors.
     """
     try: # Corrected 'Intente:'
-        products = Producto.query.all()
-        products_data = []
-        for p in products:
-            products_data.append({
-                "id": p.id,
-                "name": p.nombre,
-                "price": p.precio,
-                "description": p.descripcion,
-                "link": p.link
-            })
-        return products_data
+        return PRODUCTO_CHATBOT.dump(db.session.execute(PRODUCTO_CHATBOT.select()))
     except Exception as e: # Corrected 'excepto la excepción como e:'
         print(f"Error getting products for chatbot: {e}")
         return []
@@ -107,51 +104,24 @@ def get_general_help_info():
     guides_url = url_for('publico.guias', _external=True)
     return {"help_info": f"You can find detailed guides and additional help in our Guides section: {guides_url}."}
 
-### Context Processors
+# --- Content dependencies (cache tags) of the catalog pages ---
+# These run before the view to build its ETag / Last-Modified, so they only
+# look up ids. None means the slug does not exist: the view handles it.
 
+def product_tags(slug):
+    producto_id = db.session.query(Producto.id).filter_by(slug=slug).scalar()
+    return None if producto_id is None else {f'product:{producto_id}'}
 
-@bp.context_processor
-def inject_active_advertisements():
-    """
-    Injects a list of active advertisements into the template context.
-    Advertisements are filtered by is_active=True and by start/end dates if defined.
-    """
-    now_utc = datetime.now(timezone.utc)
-    active_ads = Advertisement.query.options(joinedload(Advertisement.product)).filter(
-        Advertisement.is_active,
-        (Advertisement.start_date.is_(None)) | (Advertisement.start_date <= now_utc),
-        (Advertisement.end_date.is_(None)) | (Advertisement.end_date >= now_utc)
-    ).all()
-    return dict(active_advertisements=active_ads)
-
-@bp.context_processor
-def inject_adsense_config():
-    """
-    Injects the global AdSense configuration into the template context,
-    fetching the data from the database.
-    """
-    adsense_config_db = AdsenseConfig.query.first()
-# In routes/public.py, inside inject_adsense_config
-
-    if adsense_config_db: # Corrected 'Si' to 'if'
-        return dict(
-            adsense_client_id=adsense_config_db.adsense_client_id, # Added this back
-            adsense_slot_header=adsense_config_db.adsense_slot_1, # Assuming slot_1 for header
-            adsense_slot_sidebar=adsense_config_db.adsense_slot_2, # Corrected to use existing slot_2
-            adsense_slot_content=adsense_config_db.adsense_slot_3, # Corrected to use existing slot_3
-            adsense_slot_footer='' # Or assign another existing slot, or keep it empty if not available
-        )
-    else: # Corrected 'más' to 'else'
-        return dict(
-            adsense_client_id='',
-            adsense_slot_header='',
-            adsense_slot_sidebar='',
-            adsense_slot_content='',
-            adsense_slot_footer=''
-        )
+def subcategory_tags(slug):
+    subcat_id = db.session.query(Subcategoria.id).filter_by(slug=slug).scalar()
+    return None if subcat_id is None else {f'subcategory:{subcat_id}'}
 
+def article_tags(slug):
+    articulo_id = db.session.query(Articulo.id).filter_by(slug=slug).scalar()
+    return None if articulo_id is None else {f'article:{articulo_id}'}
 
 @bp.route('/')
+@page_cache.cached(lambda: {'products'})
 def index():
     """Renders the main index page with paginated products."""
     page = request.args.get('page', 1, type=int)
@@ -162,6 +132,7 @@ def index():
     return render_template('index.html', productos=productos, page=page, total_pages=total_pages)
 
 @bp.route('/producto/<slug>')
+@page_cache.cached(product_tags)
 def product_detail(slug):
     """Renders the detail page for a specific product based on its slug."""
     producto = Producto.query.filter_by(slug=slug).first()
@@ -171,6 +142,7 @@ def product_detail(slug):
     return redirect(url_for('publico.index'))
 
 @bp.route('/categorias')
+@page_cache.cached(lambda: {'categories', 'products'})
 def show_categorias():
     """Renders the categories page, displaying all categories and product counts per subcategory."""
     categorias = Categoria.query.all()
@@ -188,6 +160,7 @@ def show_categorias():
     )
 
 @bp.route('/productos/<slug>')
+@page_cache.cached(subcategory_tags)
 def productos_por_slug(slug):
     """Renders a page displaying products within a specific subcategory based on its slug."""
     subcat = Subcategoria.query.filter_by(slug=slug).first()
@@ -206,6 +179,7 @@ def productos_por_slug(slug):
     return redirect(url_for('publico.show_categorias'))
 
 @bp.route('/guias')
+@page_cache.cached(lambda: {'articles'})
 def guias():
     """Renders the guides page with paginated articles."""
     page = request.args.get('page', 1, type=int)
@@ -231,6 +205,7 @@ def guias():
     return render_template('guias.html', articulos=articulos, page=page, total_pages=total_pages)
 
 @bp.route('/guia/<slug>')
+@page_cache.cached(article_tags)
 def guia_detalle(slug):
     """Renders the detail page for a specific article based on its slug."""
     articulo = Articulo.query.filter_by(slug=slug).first()
@@ -325,21 +300,25 @@ def contacto():
     return render_template('contact.html', success=success, errors=errors)
 
 @bp.route('/politica-de-privacidad')
+@content_validators.conditional(set, layout=True)
 def privacy_policy():
     """Renders the privacy policy page."""
     return render_template('privacy_policy.html')
 
 @bp.route('/terminos-condiciones')
+@content_validators.conditional(set, layout=True)
 def terms_conditions():
     """Renders the terms and conditions page."""
     return render_template('terms_conditions.html')
 
 @bp.route('/politica-de-cookies')
+@content_validators.conditional(set, layout=True)
 def cookie_policy():
     """Renders the cookie policy page."""
     return render_template('cookie_policy.html')
 
 @bp.route('/sitemap.xml')
+@content_validators.conditional(lambda: {'products', 'articles'})
 def sitemap():
     """Generates and serves the sitemap.xml for SEO."""
     base_url = request.url_root.rstrip('/')
@@ -356,6 +335,7 @@ def sitemap():
     for product in Producto.query.all():
         urls.append({
             "loc": f"{base_url}{url_for('publico.product_detail', slug=product.slug)}",
+            "lastmod": product.fecha_actualizacion.strftime("%Y-%m-%d") if product.fecha_actualizacion else None,
             "changefreq": "weekly",
             "priority": "0.8"
         })
@@ -365,7 +345,10 @@ def sitemap():
             "changefreq": "weekly",
             "priority": "0.8"
         })
-    return render_template('sitemap.xml', urls=urls, today=datetime.now().strftime("%Y-%m-%d"))
+    # Same date as Last-Modified, so the sitemap only changes along with its ETag
+    last_modified = (tag_versions.last_modified({'products', 'articles'}) or tag_versions.latest_change()
+                     or datetime.now(timezone.utc))
+    return render_template('sitemap.xml', urls=urls, today=last_modified.strftime("%Y-%m-%d"))
 
 @bp.route('/robots.txt')
 def robots_txt():
@@ -379,58 +362,32 @@ def robots_txt():
 @bp.route('/buscar')
 def search_results():
     """
-    Renders the search results page, searching both products and articles.
+    Renders the search results page: products and articles ranked together,
+    one page per query (see services/search_index.search). When nothing
+    matches, the results of the spelling-corrected query are shown instead.
     """
     query = request.args.get('q', '').strip()
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 9
 
-    # --- ADD THIS DEBUG PRINT STATEMENT ---
-    print(f"DEBUG: Search query received: '{query}'")
-    # -------------------------------------
-
-    productos_found = []
-    articulos_found = []
-    total_pages = 1
-
-    if query:
-        products_query = Producto.query.filter(
-            (Producto.nombre.ilike(f'%{query}%')) |
-            (Producto.descripcion.ilike(f'%{query}%'))
-        )
-        articles_query = Articulo.query.filter(
-            (Articulo.titulo.ilike(f'%{query}%')) |
-            (Articulo.contenido.ilike(f'%{query}%'))
-        )
-
-        productos_pagination = products_query.paginate(page=page, per_page=per_page, error_out=False)
-        productos_found = productos_pagination.items
-
-        # --- ADD THESE DEBUG PRINT STATEMENTS ---
-        print(f"DEBUG: Found {len(productos_found)} products for query '{query}'")
-        for p in productos_found:
-            print(f"     - Product: {p.nombre} (ID: {p.id})")
-        # -------------------------------------
-
-        total_products_pages = productos_pagination.pages
-
-        articulos_pagination = articles_query.paginate(page=page, per_page=per_page, error_out=False)
-        articulos_found = articulos_pagination.items
-
-        # --- ADD THESE DEBUG PRINT STATEMENTS ---
-        print(f"DEBUG: Found {len(articulos_found)} articles for query '{query}'")
-        for a in articulos_found:
-            print(f"     - Article: {a.titulo} (ID: {a.id})")
-        # -------------------------------------
-
-        total_articles_pages = articulos_pagination.pages
-
-        total_pages = max(total_products_pages, total_articles_pages) if productos_found or articulos_found else 1
+    resultados, total = search(query, per_page, (page - 1) * per_page) if query else ([], 0)
+    corrected = None
+    # Past the last page total is 0 too; only the first page is corrected
+    if query and not total and page == 1:
+        corrected = spelling.correct(query)
+        if corrected:
+            resultados, total = search(corrected, per_page)
+            if not total:
+                corrected = None
+    total_pages = max(-(-total // per_page), 1)
 
     return render_template('search_results.html',
                            query=query,
-                           productos=productos_found,
-                           articulos=articulos_found,
+                           corrected=corrected,
+                           resultados=resultados,
+                           productos=[r for r in resultados if r['kind'] == KIND_PRODUCT],
+                           articulos=[r for r in resultados if r['kind'] == KIND_ARTICLE],
+                           total=total,
                            page=page, # Corrected 'página=página,'
                            total_pages=total_pages)
 
@@ -438,23 +395,15 @@ def search_results():
 
 @bp.route('/ref/<int:afiliado_id>')
 def register_click(afiliado_id):
+    """
+    Redirects to the affiliate's referral link. The click is only counted in
+    memory here; click_counter writes it to EstadisticaAfiliado in a batch.
+    Active affiliates are normally served by ReferralRedirectMiddleware and
+    never reach this view.
+    """
     afiliado = Afiliado.query.get_or_404(afiliado_id)
-
-    estadistica = EstadisticaAfiliado.query.filter_by(
-        afiliado_id=afiliado.id,
-        fecha=date.today()
-    ).first() # Corrected '.primero()'
-
-    if estadistica:
-        estadistica.clics += 1 # Assuming 'clics' is the correct attribute name in your model
-    else: # Corrected 'más:'
-        estadistica = EstadisticaAfiliado(
-            afiliado_id=afiliado.id,
-            clics=1, # Assuming 'clics' is the correct attribute name in your model
-            fecha=date.today()
-        )
-        db.session.add(estadistica)
-
-    db.session.commit()
-
-    return redirect(afiliado.enlace_referido) # Ensure 'enlace_referido' is the correct attribute name for the affiliate URL in your Afiliado model
\ No newline at end of file
+    if afiliado.activo is False:
+        abort(404)
+    if request.method == 'GET': # HEAD: link checkers and previews are not clicks
+        click_counter.record(afiliado.id, referrer=request.referrer, user_agent=request.user_agent.string, ip=client_ip(request.environ))
+    return redirect(afiliado.enlace_referido)
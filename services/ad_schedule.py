@@ -0,0 +1,95 @@
+import random
+import threading
+from bisect import bisect_right
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from services.layout_cache import layout_cache, ADVERTISEMENTS
+
+# Used as "no pending transition" / "no transition yet"
+NEVER = datetime.max.replace(tzinfo=timezone.utc)
+EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+class AdSchedule:
+    """
+    Live advertisements per slot (Advertisement.type), kept up to date by time.
+
+    The schedule is computed from the cached advertisement snapshots together
+    with the next moment any ad starts or ends. Until that moment, looking up
+    a slot is a single dict access. An ad is live from start_date (inclusive)
+    to end_date (exclusive), so it appears and expires exactly on its
+    boundaries. The schedule is also rebuilt whenever the layout cache hands
+    out a new snapshot, i.e. after an admin edit or once LAYOUT_CACHE_TTL
+    expires.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        # (source snapshot, {slot: (ads, cumulative weights)}, next transition, last transition)
+        self._state = (None, {}, NEVER, EPOCH)
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _build(self, ads, now):
+        slots = {}
+        next_transition, last_transition = NEVER, EPOCH
+        for ad in ads:
+            start, end = ad['start_date'], ad['end_date']
+            if start is not None and start > now:
+                next_transition = min(next_transition, start)
+                continue
+            if start is not None:
+                last_transition = max(last_transition, start)
+            if end is not None and end <= now:
+                last_transition = max(last_transition, end)
+                continue
+            if end is not None:
+                next_transition = min(next_transition, end)
+            if ad['weight'] > 0:
+                slots.setdefault(ad['type'], []).append(ad)
+        return (ads, {
+            slot: (tuple(live), tuple(accumulate(ad['weight'] for ad in live)))
+            for slot, live in slots.items()
+        }, next_transition, last_transition)
+
+    def _current(self, now):
+        ads = self.cache.get(ADVERTISEMENTS)
+        state = self._state
+        if state[0] is not ads or now >= state[2]:
+            with self._lock:
+                state = self._state
+                if state[0] is not ads or now >= state[2]:
+                    state = self._state = self._build(ads, now)
+                    self.rebuilds += 1
+        return state
+
+    def next_transition(self, now=None):
+        """The next moment an ad starts or ends, or None if nothing is scheduled."""
+        transition = self._current(now or datetime.now(timezone.utc))[2]
+        return None if transition is NEVER else transition
+
+    def last_transition(self, now=None):
+        """The latest moment, up to now, at which an ad started or ended, or None."""
+        transition = self._current(now or datetime.now(timezone.utc))[3]
+        return None if transition is EPOCH else transition
+
+    def active(self, slot, now=None):
+        """Every live ad of a slot, in id order."""
+        return list(self._current(now or datetime.now(timezone.utc))[1].get(slot, ((), ()))[0])
+
+    def ads_for_slot(self, slot, limit=1, now=None):
+        """
+        Picks up to 'limit' distinct live ads of a slot. Each one is drawn
+        with probability proportional to its weight among those not yet drawn.
+        """
+        live, cumulative = self._current(now or datetime.now(timezone.utc))[1].get(slot, ((), ()))
+        if not live or limit <= 0:
+            return []
+        if limit == 1:
+            return [live[bisect_right(cumulative, random.random() * cumulative[-1])]]
+        # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+        return sorted(live, key=lambda ad: random.random() ** (1.0 / ad['weight']), reverse=True)[:limit]
+
+
+ad_schedule = AdSchedule(layout_cache)
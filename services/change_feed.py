@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, tuple_
+
+from extensions import db
+from models import Producto, ProductoEliminado
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor
+from services.serializers import PRODUCTO, Schema
+
+ELIMINADO = Schema(ProductoEliminado, ('id', 'slug', 'external_id', 'fecha_eliminacion'))
+# Cursor position before any row
+START = (datetime(1970, 1, 1), 0)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_watermark(value):
+    """
+    (products position, tombstones position) from ?since=: a watermark token
+    returned by an earlier call, or an ISO 8601 date for a first sync from
+    that moment. Each position is a (timestamp, id) pair.
+    """
+    if not value:
+        return START, START
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        updated, updated_id, deleted, deleted_id = decode_cursor(value, 4)
+        try:
+            return ((datetime.fromisoformat(updated), int(updated_id)),
+                    (datetime.fromisoformat(deleted), int(deleted_id)))
+        except (TypeError, ValueError) as e:
+            raise InvalidCursor(str(e)) from e
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return (since, 0), (since, 0)
+
+
+def changes(since, limit, fields=None, settle=0):
+    """
+    Products created, updated or deleted after the watermark 'since'.
+
+    Two keyset scans, each on a (timestamp, id) index: producto by
+    fecha_actualizacion and producto_eliminado by fecha_eliminacion, at most
+    'limit' rows each. The work done is proportional to the changes returned,
+    not to the catalog.
+
+    Rows newer than 'settle' seconds are left for the next call: their
+    timestamps are taken before commit, so a slow transaction can still add
+    rows a little behind the newest ones already visible.
+
+    Returns (products, tombstones, new watermark, caught up).
+    """
+    (updated, deleted) = parse_watermark(since)
+    fields = tuple(fields or PRODUCTO.fields)
+    columns = fields + tuple(key for key in ('id', 'fecha_actualizacion') if key not in fields)
+    until = _utcnow() - timedelta(seconds=settle)
+
+    rows = db.session.execute(
+        PRODUCTO.select(columns)
+        .where(tuple_(Producto.fecha_actualizacion, Producto.id) > tuple_(*updated))
+        .where(Producto.fecha_actualizacion <= until)
+        .order_by(Producto.fecha_actualizacion, Producto.id)
+        .limit(limit)
+    ).all()
+    tombstones = db.session.execute(
+        ELIMINADO.select()
+        .where(tuple_(ProductoEliminado.fecha_eliminacion, ProductoEliminado.id) > tuple_(*deleted))
+        .where(ProductoEliminado.fecha_eliminacion <= until)
+        .order_by(ProductoEliminado.fecha_eliminacion, ProductoEliminado.id)
+        .limit(limit)
+    ).all()
+
+    if rows:
+        updated = (rows[-1].fecha_actualizacion, rows[-1].id)
+    if tombstones:
+        deleted = (tombstones[-1].fecha_eliminacion, tombstones[-1].id)
+    watermark = encode_cursor([updated[0].isoformat(), updated[1], deleted[0].isoformat(), deleted[1]])
+
+    productos = PRODUCTO.dump(rows, columns)
+    for key in set(columns) - set(fields):
+        for producto in productos:
+            del producto[key]
+    caught_up = len(rows) < limit and len(tombstones) < limit
+    return productos, ELIMINADO.dump(tombstones), watermark, caught_up
+
+
+# -------------------- Session hooks --------------------
+def _after_flush(session, flush_context):
+    deleted = [instance for instance in session.deleted if isinstance(instance, Producto)]
+    created = [instance.id for instance in session.new if isinstance(instance, Producto)]
+    if not (deleted or created):
+        return
+    connection = session.connection()
+    table = ProductoEliminado.__table__
+    ids = created + [instance.id for instance in deleted]
+    # A reused id (SQLite can hand out the id of the last deleted row) is alive again
+    connection.execute(table.delete().where(table.c.id.in_(ids)))
+    if deleted:
+        now = _utcnow()
+        connection.execute(table.insert(), [
+            {'id': instance.id, 'slug': instance.slug, 'external_id': instance.external_id, 'fecha_eliminacion': now}
+            for instance in deleted
+        ])
+
+
+def register_change_feed_hooks():
+    """Writes a tombstone for every product deleted through the ORM session."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
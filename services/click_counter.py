@@ -0,0 +1,292 @@
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import EstadisticaAfiliado, ClickEvent
+from services.click_events import build_click_events, rollup_click_events, prune_click_events
+from services.click_filter import click_filter
+from services.hyperloglog import HyperLogLog
+
+# Dialects that support INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def upsert_daily_stats(rows):
+    """
+    Adds counter deltas to the (afiliado_id, fecha) rows of
+    'estadisticas_afiliados', creating the rows that do not exist yet.
+
+    Each row is a dict with 'afiliado_id', 'fecha' and the counters to add,
+    e.g. {'afiliado_id': 1, 'fecha': date.today(), 'clicks': 3}. On SQLite and
+    PostgreSQL all rows go out as a single INSERT ... ON CONFLICT DO UPDATE
+    SET clicks = clicks + excluded.clicks, so concurrent workers never lose
+    increments. The caller commits.
+    """
+    if not rows:
+        return
+    table = EstadisticaAfiliado.__table__
+    counters = sorted({name for row in rows for name in row} - {'afiliado_id', 'fecha'})
+    rows = [{name: row.get(name, 0) for name in ['afiliado_id', 'fecha'] + counters} for row in rows]
+
+    insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.afiliado_id, table.c.fecha],
+            set_={name: func.coalesce(table.c[name], 0) + stmt.excluded[name] for name in counters}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Other dialects: one UPDATE per row, INSERT when nothing was updated
+    for row in rows:
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.afiliado_id == row['afiliado_id'], table.c.fecha == row['fecha'])
+            .values({name: func.coalesce(table.c[name], 0) + row[name] for name in counters})
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(row))
+
+
+def merge_visitor_sketches(visitors):
+    """
+    Merges in-memory visitor sketches into the 'visitantes_hll' column.
+
+    'visitors' maps (afiliado_id, fecha) -> HyperLogLog. The rows must exist
+    already and should have been written by this same transaction (see
+    upsert_daily_stats): the upsert holds their row lock, so the
+    read-merge-write below cannot interleave with another worker's flush.
+    The caller commits.
+    """
+    if not visitors:
+        return
+    table = EstadisticaAfiliado.__table__
+    stored = db.session.execute(
+        db.select(table.c.afiliado_id, table.c.fecha, table.c.visitantes_hll).where(
+            table.c.afiliado_id.in_({afiliado_id for afiliado_id, _ in visitors}),
+            table.c.fecha.in_({fecha for _, fecha in visitors})
+        )
+    ).all()
+    stored = {(afiliado_id, fecha): blob for afiliado_id, fecha, blob in stored}
+    params = []
+    for key, sketch in visitors.items():
+        if stored.get(key):
+            sketch = HyperLogLog.from_bytes(stored[key]).merge(sketch)
+        params.append({'b_afiliado_id': key[0], 'b_fecha': key[1], 'b_hll': sketch.to_bytes()})
+    db.session.execute(
+        table.update()
+        .where(table.c.afiliado_id == bindparam('b_afiliado_id'), table.c.fecha == bindparam('b_fecha'))
+        .values(visitantes_hll=bindparam('b_hll')),
+        params
+    )
+
+
+class ClickCounter:
+    """
+    Write-behind counter for affiliate referral clicks.
+
+    Clicks are accumulated in memory per (afiliado_id, fecha) and flushed to
+    'estadisticas_afiliados' as merged deltas in a single transaction, either
+    every CLICK_FLUSH_INTERVAL_MS milliseconds or as soon as
+    CLICK_FLUSH_MAX_PENDING clicks are waiting, whichever comes first.
+    Pending clicks are also flushed when the worker process exits.
+
+    With CLICK_EVENT_LOG enabled each click is kept as a raw event instead
+    and the flush appends them to 'click_event' in bulk. The same background
+    thread then folds them into the daily totals every CLICK_ROLLUP_INTERVAL_S
+    seconds and prunes events older than CLICK_EVENT_RETENTION_DAYS.
+
+    When a ClickFilter is attached, bot and duplicate clicks are not counted
+    as 'clicks' (nor logged); they only add to the 'clicks_bot' and
+    'clicks_duplicados' columns of the same daily row.
+
+    Billable clicks also feed a HyperLogLog of visitors (IP + user agent)
+    per daily row, merged into 'visitantes_hll' by the same flush.
+    """
+
+    def __init__(self, app=None, click_filter=None):
+        self.app = None
+        self.click_filter = click_filter
+        self.interval = 0.5
+        self.max_pending = 200
+        self.event_log = False
+        self.rollup_interval = 30
+        self.retention_days = 30
+        self._pending = defaultdict(int)
+        self._pending_count = 0
+        self._events = []
+        self._visitors = {}
+        self._last_rollup = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('CLICK_FLUSH_INTERVAL_MS', 500) / 1000.0
+        self.max_pending = max(1, app.config.get('CLICK_FLUSH_MAX_PENDING', 200))
+        self.event_log = app.config.get('CLICK_EVENT_LOG', False)
+        self.rollup_interval = app.config.get('CLICK_ROLLUP_INTERVAL_S', 30)
+        self.retention_days = app.config.get('CLICK_EVENT_RETENTION_DAYS', 30)
+        app.extensions['click_counter'] = self
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def record(self, afiliado_id, fecha=None, referrer=None, user_agent=None, ip=None):
+        """
+        Counts one click in memory. Never touches the database.
+        Returns None when the click is billable, otherwise the counter column
+        it was filtered into.
+        """
+        fecha = fecha or date.today()
+        reason = self.click_filter.check(afiliado_id, ip, user_agent) if self.click_filter else None
+        with self._lock:
+            if reason:
+                self._pending[(afiliado_id, fecha, reason)] += 1
+            elif self.event_log:
+                # Hashing and classification happen at flush time, off the request path
+                self._events.append((datetime.now(timezone.utc), afiliado_id, fecha, referrer, user_agent))
+            else:
+                self._pending[(afiliado_id, fecha, 'clicks')] += 1
+            if not reason and (ip or user_agent):
+                self._visitors.setdefault((afiliado_id, fecha), set()).add((ip, user_agent))
+            self._pending_count += 1
+            full = self._pending_count >= self.max_pending
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+        return reason
+
+    def pending(self, column='clicks'):
+        """Returns a copy of the not yet flushed deltas of one counter column."""
+        with self._lock:
+            pending = defaultdict(int)
+            for (afiliado_id, fecha, name), delta in self._pending.items():
+                if name == column:
+                    pending[(afiliado_id, fecha)] += delta
+            if column == 'clicks':
+                for _, afiliado_id, fecha, _, _ in self._events:
+                    pending[(afiliado_id, fecha)] += 1
+            return dict(pending)
+
+    def flush(self):
+        """
+        Writes every pending delta in one transaction.
+        Returns the number of clicks written. On failure the deltas are put
+        back so they are retried on the next flush instead of being lost.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._events:
+                    return 0
+                batch, self._pending = self._pending, defaultdict(int)
+                events, self._events = self._events, []
+                visitors, self._visitors = self._visitors, {}
+                self._pending_count = 0
+
+            try:
+                with self.app.app_context():
+                    self._write(batch, events, visitors)
+            except Exception as e:
+                print(f"Error flushing affiliate clicks: {e}")
+                with self._lock:
+                    for key, delta in batch.items():
+                        self._pending[key] += delta
+                    self._events[:0] = events
+                    for key, seen in visitors.items():
+                        self._visitors.setdefault(key, set()).update(seen)
+                    self._pending_count += sum(batch.values()) + len(events)
+                return 0
+            return sum(batch.values()) + len(events)
+
+    def rollup(self):
+        """Folds logged events into the daily totals and prunes old ones."""
+        self._last_rollup = time.monotonic()
+        try:
+            with self.app.app_context():
+                folded = rollup_click_events()
+                if self.retention_days:
+                    prune_click_events(self.retention_days)
+                return folded
+        except Exception as e:
+            print(f"Error rolling up click events: {e}")
+            return 0
+
+    def shutdown(self):
+        """Stops the background flusher and writes whatever is still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        if self.app is not None:
+            self.flush()
+
+    def _write(self, batch, events, visitors):
+        if events:
+            db.session.execute(ClickEvent.__table__.insert(), build_click_events(events))
+        rows = defaultdict(dict)
+        for (afiliado_id, fecha, column), delta in batch.items():
+            rows[(afiliado_id, fecha)][column] = delta
+        for key in visitors:
+            # Make sure the row exists (and is locked) even when its clicks
+            # are still in the event log waiting for the rollup
+            rows[key].setdefault('clicks', 0)
+        upsert_daily_stats([
+            {'afiliado_id': afiliado_id, 'fecha': fecha, **counters}
+            for (afiliado_id, fecha), counters in rows.items()
+        ])
+        sketches = {}
+        for key, seen in visitors.items():
+            sketch = sketches[key] = HyperLogLog()
+            for ip, user_agent in seen:
+                sketch.add(f'{ip}|{user_agent}')
+        merge_visitor_sketches(sketches)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork (gunicorn --preload), so the flusher is
+        # started lazily from whichever process actually records clicks.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='click-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.flush()
+            if self.event_log and time.monotonic() - self._last_rollup >= self.rollup_interval:
+                self.rollup()
+
+
+click_counter = ClickCounter(click_filter=click_filter)
@@ -0,0 +1,179 @@
+import hashlib
+import re
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Afiliado, ClickEvent, ClickRollupState
+
+# User-agent classes stored in ClickEvent.ua_class
+UA_OTHER, UA_DESKTOP, UA_MOBILE, UA_TABLET, UA_BOT = range(5)
+UA_CLASS_NAMES = {
+    UA_OTHER: 'otro',
+    UA_DESKTOP: 'escritorio',
+    UA_MOBILE: 'movil',
+    UA_TABLET: 'tablet',
+    UA_BOT: 'bot',
+}
+
+# Compiled once at import; checked in this order
+BOT_UA_RE = re.compile(
+    r'bot\b|bot/|crawl|spider|slurp|mediapartners|facebookexternalhit|embedly|preview|'
+    r'headless|phantomjs|curl/|wget/|python-requests|python-urllib|aiohttp|httpclient|'
+    r'okhttp|go-http-client|java/|libwww|scrapy|monitor|uptime|pingdom|scanner',
+    re.IGNORECASE
+)
+TABLET_UA_RE = re.compile(r'ipad|tablet|kindle|silk/|playbook|android(?!.*mobile)', re.IGNORECASE)
+MOBILE_UA_RE = re.compile(r'mobi|iphone|ipod|android|blackberry|opera mini|windows phone|iemobile', re.IGNORECASE)
+DESKTOP_UA_RE = re.compile(r'windows nt|macintosh|x11|linux|cros', re.IGNORECASE)
+
+
+def classify_user_agent(user_agent):
+    """Maps a User-Agent header to one of the UA_* classes."""
+    if not user_agent:
+        return UA_OTHER
+    if BOT_UA_RE.search(user_agent):
+        return UA_BOT
+    if TABLET_UA_RE.search(user_agent):
+        return UA_TABLET
+    if MOBILE_UA_RE.search(user_agent):
+        return UA_MOBILE
+    if DESKTOP_UA_RE.search(user_agent):
+        return UA_DESKTOP
+    return UA_OTHER
+
+
+def hash_referrer(referrer):
+    """
+    Signed 64-bit hash of the referrer's host and path (query and fragment are
+    dropped so clicks group by page). Returns None when there is no referrer.
+    """
+    if not referrer:
+        return None
+    parts = urlsplit(referrer)
+    key = f"{parts.netloc.lower()}{parts.path or '/'}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def build_click_events(raw_events):
+    """Turns (timestamp, afiliado_id, dia, referrer, user_agent) tuples into click_event rows."""
+    return [{
+        'timestamp': timestamp,
+        'dia': dia,
+        'afiliado_id': afiliado_id,
+        'referrer_hash': hash_referrer(referrer),
+        'ua_class': classify_user_agent(user_agent),
+    } for timestamp, afiliado_id, dia, referrer, user_agent in raw_events]
+
+
+def rollup_click_events(batch_size=50000):
+    """
+    Folds new click events into 'estadisticas_afiliados'.
+
+    Only events between the stored high-water mark and the highest id seen by
+    the *previous* run are folded. Ids are handed out before commit, so a
+    flush that commits out of order can still add an event below the
+    highest id already seen. The one-run lag covers that as long as every
+    flush transaction commits within one rollup interval
+    (CLICK_ROLLUP_INTERVAL_S). An event committed later than that, below a
+    mark already folded past, is never counted. The mark is
+    advanced with a compare-and-set, so several workers can run this at once
+    without counting an event twice. Returns the number of events folded.
+    """
+    from services.click_counter import upsert_daily_stats
+
+    state = db.session.get(ClickRollupState, 1)
+    if state is None:
+        try:
+            db.session.add(ClickRollupState(id=1, last_event_id=0, seen_event_id=0))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback() # Created by another worker in the meantime
+        state = db.session.get(ClickRollupState, 1)
+    last_id, seen_id = state.last_event_id, state.seen_event_id
+    upto = min(seen_id, last_id + batch_size)
+
+    folded = 0
+    if upto > last_id:
+        rows = db.session.query(
+            ClickEvent.afiliado_id, ClickEvent.dia, func.count(ClickEvent.id)
+        ).join(
+            Afiliado, Afiliado.id == ClickEvent.afiliado_id # Events of deleted affiliates are dropped
+        ).filter(
+            ClickEvent.id > last_id, ClickEvent.id <= upto
+        ).group_by(ClickEvent.afiliado_id, ClickEvent.dia).all()
+        upsert_daily_stats([
+            {'afiliado_id': afiliado_id, 'fecha': dia, 'clicks': count}
+            for afiliado_id, dia, count in rows
+        ])
+        folded = sum(count for _, _, count in rows)
+
+    current_max = db.session.query(func.max(ClickEvent.id)).scalar() or 0
+    advanced = db.session.query(ClickRollupState).filter(
+        ClickRollupState.id == 1,
+        ClickRollupState.last_event_id == last_id
+    ).update({
+        'last_event_id': upto if upto > last_id else last_id,
+        'seen_event_id': max(seen_id, current_max),
+        'updated_at': datetime.now(timezone.utc),
+    }, synchronize_session=False)
+    if advanced != 1:
+        # Another worker folded this range first
+        db.session.rollback()
+        return 0
+    db.session.commit()
+    return folded
+
+
+def prune_click_events(keep_days):
+    """
+    Deletes raw events older than 'keep_days' days, one day partition at a
+    time, and never an event that has not been rolled up yet.
+    Returns the number of events deleted.
+    """
+    state = db.session.get(ClickRollupState, 1)
+    if state is None or not state.last_event_id:
+        return 0
+    cutoff = date.today() - timedelta(days=keep_days)
+    dias = [dia for (dia,) in db.session.query(ClickEvent.dia).filter(ClickEvent.dia < cutoff).distinct().order_by(ClickEvent.dia)]
+    deleted = 0
+    for dia in dias:
+        deleted += db.session.query(ClickEvent).filter(
+            ClickEvent.dia == dia,
+            ClickEvent.id <= state.last_event_id
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
+
+
+# -------------------- CLI: flask clicks ... --------------------
+clicks_cli = AppGroup('clicks', help='Mantenimiento del registro de clics de afiliados.')
+
+
+@clicks_cli.command('rollup')
+def rollup_command():
+    """Folds pending click events into estadisticas_afiliados."""
+    # The first pass may only record the current max id; keep going until caught up
+    total = rollup_click_events()
+    while True:
+        state = db.session.get(ClickRollupState, 1)
+        db.session.refresh(state)
+        if state.last_event_id >= state.seen_event_id:
+            break
+        total += rollup_click_events()
+    click.echo(f"Eventos consolidados: {total}")
+
+
+@clicks_cli.command('prune')
+@click.option('--keep-days', type=int, default=None, help='Días de eventos crudos a conservar.')
+def prune_command(keep_days):
+    """Deletes raw click events older than the retention window."""
+    if keep_days is None:
+        keep_days = current_app.config['CLICK_EVENT_RETENTION_DAYS']
+    click.echo(f"Eventos eliminados: {prune_click_events(keep_days)}")
@@ -0,0 +1,110 @@
+import hashlib
+import math
+import threading
+import time
+
+from services.click_events import BOT_UA_RE
+
+# Reasons returned by ClickFilter.check(); each one has its own counter column
+FILTERED_BOT = 'clicks_bot'
+FILTERED_DUPLICATE = 'clicks_duplicados'
+
+
+class RotatingBloomFilter:
+    """
+    Sliding-window set membership with a fixed memory cap.
+
+    Two Bloom filters ("generations") are kept. Keys are added to the current
+    one and looked up in both. The current generation is retired every
+    'window' seconds, or earlier once it holds 'capacity' keys so the false
+    positive rate never exceeds 'error_rate'. A key is therefore remembered
+    for at least one window and at most two. Memory is two bit arrays of
+    -capacity * ln(error_rate) / ln(2)^2 bits each, whatever the traffic.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, window=30.0):
+        self.capacity = capacity
+        self.window = window
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._current = bytearray((self.num_bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _rotate_if_due(self):
+        if self._count >= self.capacity or time.monotonic() - self._rotated_at >= self.window:
+            self._previous = self._current
+            self._current = bytearray(len(self._previous))
+            self._count = 0
+            self._rotated_at = time.monotonic()
+
+    def add(self, key):
+        """Adds 'key' (bytes). Returns True if it was (probably) already present."""
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate_if_due()
+            current, previous = self._current, self._previous
+            seen_current = all(current[p >> 3] & (1 << (p & 7)) for p in positions)
+            if seen_current:
+                return True
+            seen_previous = all(previous[p >> 3] & (1 << (p & 7)) for p in positions)
+            for p in positions:
+                current[p >> 3] |= 1 << (p & 7)
+            self._count += 1
+            return seen_previous
+
+    def memory_bytes(self):
+        return len(self._current) + len(self._previous)
+
+
+class ClickFilter:
+    """
+    Drops non-billable referral clicks before they are counted: requests from
+    known crawlers (precompiled user-agent matcher) and repeated clicks from
+    the same IP on the same affiliate within CLICK_DEDUP_WINDOW_S seconds.
+    IPs are only ever kept as part of a hash inside the Bloom filter.
+    """
+
+    def __init__(self, app=None):
+        self.filter_bots = True
+        self.duplicates = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.filter_bots = app.config.get('CLICK_FILTER_BOTS', True)
+        window = app.config.get('CLICK_DEDUP_WINDOW_S', 30)
+        self.duplicates = RotatingBloomFilter(
+            capacity=app.config.get('CLICK_DEDUP_CAPACITY', 100000),
+            window=window
+        ) if window else None
+
+    def check(self, afiliado_id, ip=None, user_agent=None):
+        """Returns None for a billable click, or FILTERED_BOT / FILTERED_DUPLICATE."""
+        if self.filter_bots and user_agent and BOT_UA_RE.search(user_agent):
+            return FILTERED_BOT
+        if self.duplicates is not None and ip:
+            if self.duplicates.add(f'{ip}|{afiliado_id}'.encode('utf-8')):
+                return FILTERED_DUPLICATE
+        return None
+
+
+def client_ip(environ):
+    """
+    Client address from a WSGI environ. X-Forwarded-For is not read here:
+    any client can send one. Behind TRUSTED_PROXIES reverse proxies,
+    ProxyFix (app.py) has already put the address they saw in REMOTE_ADDR.
+    """
+    return environ.get('REMOTE_ADDR')
+
+
+click_filter = ClickFilter()
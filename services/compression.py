@@ -0,0 +1,145 @@
+import re
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'application/xml', 'application/json',
+    'application/x-ndjson', 'application/javascript', 'text/javascript', 'image/svg+xml',
+}
+# Whitespace inside these elements is significant (or code) and is left alone
+PROTECTED_RE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+INDENTATION_RE = re.compile(r'[ \t\r\f\v]*\n\s*')
+
+
+def minify_html(html):
+    """
+    Drops indentation and blank lines: every whitespace run that contains a
+    line break becomes a single newline, which renders the same. <pre>,
+    <textarea>, <script> and <style> contents are kept as they are.
+    """
+    parts = PROTECTED_RE.split(html)
+    # split() yields text, protected block, tag name, text, ...
+    return ''.join(
+        INDENTATION_RE.sub('\n', part) if i % 3 == 0 else part if i % 3 == 1 else ''
+        for i, part in enumerate(parts)
+    )
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        # Sync flush: each chunk reaches the client now, not when the buffer fills
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Compression:
+    """
+    gzip / brotli Content-Encoding for HTML, JSON and other text responses,
+    and optional minification of the HTML pages.
+
+    The encoding follows Accept-Encoding (brotli only when the module is
+    installed). Bodies under COMPRESS_MIN_SIZE bytes are sent as they are;
+    streamed responses (the NDJSON exports) are compressed chunk by chunk
+    and flushed after each one. A view, or the page cache, can put a dict
+    on response.encoded_bodies: minified and compressed bodies are then
+    kept there and reused, so a cached page is only compressed once per
+    encoding instead of on every hit.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_size = 500
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.minify = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+        self.minify = app.config.get('HTML_MINIFY', False)
+        app.after_request(self._after_request)
+        app.extensions['compression'] = self
+
+    def encodings(self):
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def _encoding(self):
+        return request.accept_encodings.best_match(self.encodings())
+
+    def _after_request(self, response):
+        if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+                or not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers):
+            return response
+        memo = getattr(response, 'encoded_bodies', None)
+        if memo is None:
+            memo = {}
+
+        if self.minify and response.mimetype == 'text/html' and not response.is_streamed:
+            minified = memo.get('minified')
+            if minified is None:
+                minified = memo['minified'] = minify_html(response.get_data(as_text=True)).encode()
+            response.set_data(minified)
+
+        if not self.enabled:
+            return response
+        # The body differs with Accept-Encoding even when this one is not compressed
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            stream = _brotli_stream if encoding == 'br' else _gzip_stream
+            level = self.brotli_quality if encoding == 'br' else self.gzip_level
+            response.response = stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = memo.get(encoding)
+            if body is None:
+                data = response.get_data()
+                if len(data) < self.min_size:
+                    return response
+                body = memo[encoding] = self.compress(data, encoding)
+            response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # A compressed body is not byte-identical to the uncompressed one (RFC 9110, 8.8.1)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+
+compression = Compression()
@@ -0,0 +1,122 @@
+import functools
+import hashlib
+import os
+from datetime import timezone
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+
+from services.ad_schedule import ad_schedule
+from services.invalidation import tag_versions, LAYOUT_TAG
+
+
+class ContentValidators:
+    """
+    ETag / Last-Modified validators for views whose output only depends on
+    tagged content (see services/invalidation.py), plus the 304 short-cut.
+
+    The validators are derived from this process's tag versions alone, so a
+    matching If-None-Match or If-Modified-Since is answered before the view
+    runs: no template is rendered and no full row is loaded. Besides the
+    content tags, HTML pages depend on the layout (ads, social links,
+    AdSense), on the logged-in user and on the current release of the
+    templates; those go into their (weak) ETag too.
+
+    Last-Modified comes from the cache_tag_version timestamps only, so every
+    worker behind a load balancer hands out the same date for a page.
+    """
+
+    def __init__(self, app=None):
+        self.release = ''
+        self.not_modified = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.release = app.config.get('RELEASE_ID') or self._templates_fingerprint(app)
+        self.not_modified = 0
+        app.extensions['content_validators'] = self
+
+    def _templates_fingerprint(self, app):
+        digest = hashlib.blake2b(digest_size=8)
+        for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(f'{path}:{os.stat(path).st_mtime_ns};'.encode())
+        return digest.hexdigest()
+
+    def conditional(self, dependencies, layout=False):
+        """
+        Decorator. 'dependencies' gets the view arguments and returns the
+        content tags of the response, or None to run the view unconditionally
+        (e.g. the slug does not exist). It must stay cheap: an id lookup at most.
+        'layout' marks HTML pages rendered inside the site layout.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+                if layout and session.get('_flashes'):
+                    # Pending messages are shown once
+                    return view(*args, **kwargs)
+                tags = dependencies(**kwargs)
+                if tags is None:
+                    return view(*args, **kwargs)
+                tags = set(tags)
+                if layout:
+                    tags.add(LAYOUT_TAG)
+                g.content_tags = tags
+
+                etag, last_modified = self._validators(tags, layout)
+                if self._matches(etag, last_modified):
+                    self.not_modified += 1
+                    response = current_app.response_class(status=304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag, weak=layout)
+                if last_modified is not None:
+                    response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+                # Caches may keep the body but must ask before reusing it
+                response.cache_control.no_cache = True
+                if layout:
+                    response.vary.add('Cookie')
+                    if current_user.is_authenticated:
+                        response.cache_control.private = True
+                return response
+            return wrapper
+        return decorator
+
+    def _validators(self, tags, layout):
+        versions = tag_versions.snapshot()
+        parts = [self.release, request.path, request.query_string.decode('latin-1')]
+        parts.extend(f'{tag}={versions.get(tag, 0)}' for tag in sorted(tags))
+        candidates = [tag_versions.last_modified(tags)]
+        if layout:
+            user_id = current_user.get_id() if current_user.is_authenticated else ''
+            parts.append(f'user={user_id}')
+            # The sidebar shows the ads live right now
+            last_ad = ad_schedule.last_transition()
+            parts.append(f'ads={last_ad.isoformat() if last_ad else ""}')
+            if last_ad is not None:
+                candidates.append(last_ad.astimezone(timezone.utc).replace(tzinfo=None, microsecond=0))
+        etag = hashlib.blake2b('|'.join(parts).encode(), digest_size=16).hexdigest()
+        last_modified = max((value for value in candidates if value is not None), default=None)
+        if last_modified is None:
+            # None of the tags changed since the table was created: nothing
+            # they cover is newer than the latest change to any tag. Without
+            # any change at all there is no date every worker agrees on.
+            last_modified = tag_versions.latest_change()
+        return etag, last_modified
+
+    def _matches(self, etag, last_modified):
+        if request.if_none_match:
+            # If-None-Match always uses the weak comparison (RFC 9110, 13.1.2)
+            return request.if_none_match.contains_weak(etag)
+        since = request.if_modified_since
+        return since is not None and last_modified is not None and last_modified <= since.replace(tzinfo=None)
+
+
+content_validators = ContentValidators()
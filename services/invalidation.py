@@ -0,0 +1,195 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event, inspect
+
+from extensions import db
+from models import (
+    Producto, Subcategoria, Categoria, Articulo, SocialMediaLink, AdsenseConfig,
+    Advertisement, CacheTagVersion
+)
+from services.click_counter import UPSERT_DIALECTS
+
+# Row of cache_tag_version holding the global version counter
+GLOBAL_TAG = '*'
+# Data rendered on every page (sidebar ads, social links, AdSense)
+LAYOUT_TAG = 'layout'
+
+
+def tags_for(instance):
+    """Cache dependency tags affected by a change to 'instance'."""
+    if isinstance(instance, Producto):
+        tags = {f'product:{instance.id}', 'products'}
+        # A product moved to another subcategory changes both listings
+        subcategorias = {instance.subcategoria_id, *inspect(instance).attrs.subcategoria_id.history.deleted}
+        tags.update(f'subcategory:{sub_id}' for sub_id in subcategorias if sub_id is not None)
+        return tags
+    if isinstance(instance, Subcategoria):
+        return {f'subcategory:{instance.id}', 'categories'}
+    if isinstance(instance, Categoria):
+        return {f'category:{instance.id}', 'categories'}
+    if isinstance(instance, Articulo):
+        return {f'article:{instance.id}', 'articles'}
+    if isinstance(instance, (SocialMediaLink, AdsenseConfig, Advertisement)):
+        return {LAYOUT_TAG}
+    return set()
+
+
+def _next_version(connection):
+    table = CacheTagVersion.__table__
+    insert = UPSERT_DIALECTS.get(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(tag=GLOBAL_TAG, version=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.tag], set_={'version': table.c.version + 1}
+        ))
+    elif not connection.execute(
+        table.update().where(table.c.tag == GLOBAL_TAG).values(version=table.c.version + 1)
+    ).rowcount:
+        connection.execute(table.insert().values(tag=GLOBAL_TAG, version=1))
+    # The counter row stays locked until commit, so versions commit in order
+    return connection.execute(db.select(table.c.version).where(table.c.tag == GLOBAL_TAG)).scalar_one()
+
+
+def bump_tags(connection, tags):
+    """
+    Gives 'tags' a new version inside the current transaction.
+    Returns {tag: (version, updated_at)}.
+    """
+    if not tags:
+        return {}
+    table = CacheTagVersion.__table__
+    version = _next_version(connection)
+    # HTTP dates have one-second resolution (Last-Modified)
+    updated_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    rows = [{'tag': tag, 'version': version, 'updated_at': updated_at} for tag in sorted(tags)]
+    insert = UPSERT_DIALECTS.get(connection.dialect.name)
+    if insert is not None:
+        stmt = insert(table).values(rows)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.tag],
+            set_={'version': stmt.excluded.version, 'updated_at': stmt.excluded.updated_at}
+        ))
+    else:
+        for row in rows:
+            if not connection.execute(
+                table.update().where(table.c.tag == row['tag']).values(version=version, updated_at=updated_at)
+            ).rowcount:
+                connection.execute(table.insert().values(row))
+    return {tag: (version, updated_at) for tag in tags}
+
+
+class TagVersions:
+    """
+    This process's view of 'cache_tag_version'.
+
+    Commits made by this process are applied right away (see the session
+    hooks below). Changes committed by other workers are picked up by
+    polling for versions above the highest one seen, at most every
+    CACHE_TAG_POLL_S seconds, so staying current costs one indexed query
+    per interval rather than one per request.
+    """
+
+    def __init__(self, app=None):
+        self.poll_interval = 2.0
+        self._versions = {}
+        self._modified = {}
+        self._seen = 0
+        self._polled_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.poll_interval = app.config.get('CACHE_TAG_POLL_S', 2)
+        with self._lock:
+            self._versions = {}
+            self._modified = {}
+            self._seen = 0
+            self._polled_at = None
+        app.extensions['tag_versions'] = self
+        register_session_hooks()
+
+    def snapshot(self):
+        """Current {tag: version} map (never mutated in place). Needs an app context."""
+        if self._polled_at is None or time.monotonic() - self._polled_at >= self.poll_interval:
+            self.refresh()
+        return self._versions
+
+    def get(self, tag):
+        return self.snapshot().get(tag, 0)
+
+    def last_modified(self, tags):
+        """Latest change (naive UTC) among 'tags', or None if none was ever changed."""
+        self.snapshot()
+        modified = self._modified
+        return max((modified[tag] for tag in tags if tag in modified), default=None)
+
+    def latest_change(self):
+        """Latest change (naive UTC) to any tag, the same in every worker once polled, or None."""
+        self.snapshot()
+        return max(self._modified.values(), default=None)
+
+    def refresh(self):
+        table = CacheTagVersion.__table__
+        try:
+            rows = db.session.execute(
+                db.select(table.c.tag, table.c.version, table.c.updated_at).where(table.c.version > self._seen)
+            ).all()
+        except Exception as e:
+            print(f"Error polling cache tag versions: {e}")
+            db.session.rollback()
+            self._polled_at = time.monotonic()
+            return
+        self._merge({tag: (version, updated_at) for tag, version, updated_at in rows}, polled=True)
+        self._polled_at = time.monotonic()
+
+    def _merge(self, versions, polled=False):
+        if not versions:
+            return
+        with self._lock:
+            merged, modified = dict(self._versions), dict(self._modified)
+            for tag, (version, updated_at) in versions.items():
+                if version > merged.get(tag, 0):
+                    merged[tag] = version
+                    if updated_at is not None:
+                        modified[tag] = updated_at
+            self._versions, self._modified = merged, modified
+            if polled:
+                # Local commits do not move the mark: other workers may
+                # still commit lower versions that were not polled yet
+                self._seen = max(self._seen, *(version for version, _ in versions.values()))
+
+
+tag_versions = TagVersions()
+
+
+# -------------------- Session hooks --------------------
+def _after_flush(session, flush_context):
+    tags = set()
+    for instance in session.new | session.deleted:
+        tags |= tags_for(instance)
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            tags |= tags_for(instance)
+    if tags:
+        session.info.setdefault('cache_tags', {}).update(bump_tags(session.connection(), tags))
+
+
+def _after_commit(session):
+    bumped = session.info.pop('cache_tags', None)
+    if bumped:
+        tag_versions._merge(bumped)
+
+
+def _after_rollback(session):
+    session.info.pop('cache_tags', None)
+
+
+def register_session_hooks():
+    """Bumps the tags of every ORM change in the same transaction as the change."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,156 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g
+from sqlalchemy.orm import joinedload
+from werkzeug.local import LocalProxy
+
+from models import Advertisement, AdsenseConfig, SocialMediaLink
+from services.invalidation import tag_versions, LAYOUT_TAG
+
+# Cache keys, one per layout payload
+SOCIAL_MEDIA_LINKS = 'social_media_links'
+ADSENSE_CONFIG = 'adsense_config'
+ADVERTISEMENTS = 'advertisements'
+
+
+def load_social_media_links():
+    links = SocialMediaLink.query.filter_by(is_visible=True).order_by(SocialMediaLink.order_num).all()
+    return [{
+        'id': link.id,
+        'platform': link.platform,
+        'url': link.url,
+        'icon_class': link.icon_class,
+        'is_visible': link.is_visible,
+        'order_num': link.order_num,
+    } for link in links]
+
+
+def load_adsense_config():
+    config = AdsenseConfig.query.first()
+    if config is None:
+        return {'adsense_client_id': '', 'adsense_slot_1': '', 'adsense_slot_2': '', 'adsense_slot_3': ''}
+    return {
+        'adsense_client_id': config.adsense_client_id,
+        'adsense_slot_1': config.adsense_slot_1,
+        'adsense_slot_2': config.adsense_slot_2,
+        'adsense_slot_3': config.adsense_slot_3,
+    }
+
+
+def _as_utc(value):
+    # SQLite hands DateTime columns back naive; they are stored in UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def load_advertisements():
+    """
+    Active advertisements that have not ended yet, including the ones
+    scheduled for later. Which of them are live at a given moment is decided
+    by services.ad_schedule.AdSchedule.
+    """
+    ads = Advertisement.query.options(joinedload(Advertisement.product)).filter(
+        Advertisement.is_active,
+        (Advertisement.end_date.is_(None)) | (Advertisement.end_date >= datetime.now(timezone.utc))
+    ).order_by(Advertisement.id).all()
+    return [{
+        'id': ad.id,
+        'type': ad.type,
+        'title': ad.title,
+        'is_active': ad.is_active,
+        'text_content': ad.text_content,
+        'button_text': ad.button_text,
+        'button_url': ad.button_url,
+        'image_url': ad.image_url,
+        'product_id': ad.product_id,
+        'product': {
+            'id': ad.product.id,
+            'nombre': ad.product.nombre,
+            'slug': ad.product.slug,
+            'precio': ad.product.precio,
+            'imagen': ad.product.imagen,
+            'link': ad.product.link,
+        } if ad.product else None,
+        'adsense_client_id': ad.adsense_client_id,
+        'adsense_slot_id': ad.adsense_slot_id,
+        'start_date': _as_utc(ad.start_date),
+        'end_date': _as_utc(ad.end_date),
+        'weight': ad.weight if ad.weight is not None else 1,
+    } for ad in ads]
+
+
+class LayoutCache:
+    """
+    Process-level cache for the nearly static data every page layout needs
+    (social links, AdSense settings, advertisements).
+
+    Entries are plain dicts and lists, never ORM instances, so they can be
+    shared between requests and threads safely. The admin routes call
+    invalidate() right after committing a change. Other worker processes
+    notice the change through the 'layout' cache tag (services/invalidation.py)
+    within CACHE_TAG_POLL_S seconds, and reload at least every
+    LAYOUT_CACHE_TTL seconds in any case.
+    """
+
+    LOADERS = {
+        SOCIAL_MEDIA_LINKS: load_social_media_links,
+        ADSENSE_CONFIG: load_adsense_config,
+        ADVERTISEMENTS: load_advertisements,
+    }
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LAYOUT_CACHE_TTL', 60)
+        self._entries = {}
+        app.extensions['layout_cache'] = self
+
+    def get(self, name):
+        """Returns the cached payload, loading it on a miss. Needs an app context."""
+        version = tag_versions.get(LAYOUT_TAG)
+        entry = self._entries.get(name)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl and entry[2] == version:
+            return entry[1]
+        generation = self._generation
+        value = self.LOADERS[name]()
+        with self._lock:
+            # Not stored if an invalidation ran while it was loading
+            if generation == self._generation:
+                self._entries[name] = (time.monotonic(), value, version)
+        return value
+
+    def invalidate(self, *names):
+        """Drops the given entries (all of them when called without names)."""
+        with self._lock:
+            self._generation += 1
+            if not names:
+                self._entries.clear()
+            for name in names:
+                self._entries.pop(name, None)
+
+    def lazy(self, name, key=None):
+        """
+        Proxy for a payload (or one key of it) for context processors. It is
+        only looked up when a template actually uses it, and then memoized in
+        'g' so the rest of the request sees the same snapshot.
+        """
+        g.setdefault('layout_injected', set()).add(name)
+
+        def resolve():
+            values = g.setdefault('layout_values', {})
+            if name not in values:
+                values[name] = self.get(name)
+            return values[name] if key is None else values[name][key]
+        return LocalProxy(resolve)
+
+
+layout_cache = LayoutCache()
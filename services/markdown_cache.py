@@ -0,0 +1,80 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+from markupsafe import Markup
+from sqlalchemy import event
+
+from models import Articulo
+
+
+def render_markdown(text):
+    return markdown.markdown(text or '')
+
+
+def content_hash(text):
+    return hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).digest()
+
+
+class MarkdownCache:
+    """
+    Article HTML, rendered once instead of on every view.
+
+    Articulo.contenido_html is filled whenever 'contenido' is assigned (admin
+    add/edit, seeds, imports), so it is written in the same commit as the
+    text it comes from. The 'markdown' template filter uses that column and
+    only renders text without one, through an LRU keyed by the hash of the
+    text: an edit gives a new key, so nothing has to be invalidated.
+    """
+
+    def __init__(self, app=None):
+        self.maxsize = 256
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('MARKDOWN_CACHE_SIZE', 256)
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+        app.extensions['markdown_cache'] = self
+        app.add_template_filter(self.filter, 'markdown')
+        register_model_hooks()
+
+    def render(self, text):
+        key = content_hash(text)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+        html = render_markdown(text)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = html
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return html
+
+    def filter(self, text, rendered=None):
+        """{{ articulo.contenido | markdown(articulo.contenido_html) }}"""
+        return Markup(rendered if rendered is not None else self.render(text))
+
+
+markdown_cache = MarkdownCache()
+
+
+# -------------------- Model hooks --------------------
+def _render_contenido(target, value, oldvalue, initiator):
+    target.contenido_html = render_markdown(value)
+
+
+def register_model_hooks():
+    """Keeps Articulo.contenido_html in step with every assignment to contenido."""
+    if not event.contains(Articulo.contenido, 'set', _render_contenido):
+        event.listen(Articulo.contenido, 'set', _render_contenido)
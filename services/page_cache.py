@@ -0,0 +1,183 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+
+from services.ad_schedule import ad_schedule
+from services.conditional import content_validators
+from services.invalidation import tag_versions
+
+
+class CachedPage:
+    __slots__ = ('body', 'status', 'headers', 'versions', 'fresh_until', 'stale_until', 'encoded_bodies')
+
+    def __init__(self, body, status, headers, versions, fresh_until, stale_until):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.versions = versions # {tag: version} the page was rendered from
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.encoded_bodies = {} # Minified / compressed variants of body (services/compression.py)
+
+    def is_current(self, versions):
+        return all(versions.get(tag, 0) == version for tag, version in self.versions.items())
+
+
+class PageCache:
+    """
+    Full-response cache for anonymous GET requests to public catalog pages.
+
+    Entries are keyed by endpoint, view arguments and page number, and record
+    the version of every dependency tag (e.g. 'product:3', 'subcategory:1',
+    see services/invalidation.py) they were rendered from. The tags come from
+    the view's 'dependencies' function, which also gives the page its ETag
+    and Last-Modified validators (services/conditional.py). A commit that
+    changes a tagged row bumps the tag, which turns every page depending on
+    it stale in all workers; there is no explicit purge to forget.
+
+    A stale entry keeps being served for up to PAGE_CACHE_STALE_S seconds
+    while a single request regenerates it, so a purge of a popular page does
+    not send every concurrent visitor to the database at once. Entries also
+    expire after PAGE_CACHE_TTL seconds, or when an ad starts or ends.
+
+    A cached page is the same for every visitor, so nothing in it may be
+    drawn per request: a weighted ad pick made while rendering would be
+    shown to everyone until the entry expires. Slots with several live ads
+    embed all of them and the browser does the draw (partials/sidebar_ads.html).
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.ttl = 300
+        self.stale_ttl = 60
+        self.max_entries = 1000
+        self._entries = OrderedDict()
+        self._regenerating = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale_hits = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PAGE_CACHE', True)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        self.stale_ttl = app.config.get('PAGE_CACHE_STALE_S', 60)
+        self.max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 1000)
+        self.clear()
+        app.extensions['page_cache'] = self
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._regenerating.clear()
+            self.hits = self.misses = self.stale_hits = 0
+
+    def cached(self, dependencies):
+        """
+        Decorator for views whose output only depends on tagged content.
+        'dependencies' is as in ContentValidators.conditional: requests that
+        still match the client's copy get a 304 before reaching the cache.
+        """
+        def decorator(view):
+            return content_validators.conditional(dependencies, layout=True)(self._cache(view))
+        return decorator
+
+    def _cache(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            tags = g.get('content_tags')
+            if tags is None or not self._cacheable():
+                return view(*args, **kwargs)
+            key = (request.endpoint, tuple(sorted(request.view_args.items())), request.args.get('page', 1, type=int))
+            versions = tag_versions.snapshot()
+            now = time.monotonic()
+
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                if now < entry.fresh_until and entry.is_current(versions):
+                    self.hits += 1
+                    return self._serve(key, entry, 'HIT')
+                if not self._claim(key):
+                    # Another request is regenerating it; this one gets the old copy
+                    self.stale_hits += 1
+                    return self._serve(key, entry, 'STALE')
+            elif not self._claim(key):
+                # First render already in progress: wait for it instead of rendering twice
+                with self._lock:
+                    pending = self._regenerating.get(key)
+                if pending is not None:
+                    pending.wait(5)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self._serve(key, entry, 'HIT')
+                return view(*args, **kwargs)
+
+            self.misses += 1
+            try:
+                return self._render(key, view, args, kwargs, tags, versions)
+            finally:
+                with self._lock:
+                    done = self._regenerating.pop(key, None)
+                if done is not None:
+                    done.set()
+        return wrapper
+
+    def _cacheable(self):
+        return (
+            self.enabled
+            and request.method in ('GET', 'HEAD')
+            and not current_user.is_authenticated
+            and not session.get('_flashes') # Pending messages are shown once
+        )
+
+    def _claim(self, key):
+        with self._lock:
+            if key in self._regenerating:
+                return False
+            self._regenerating[key] = threading.Event()
+            return True
+
+    def _render(self, key, view, args, kwargs, tags, versions):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough or session.get('_flashes'):
+            return response
+        now = time.monotonic()
+        fresh_for = self.ttl
+        next_ad = ad_schedule.next_transition()
+        if next_ad is not None:
+            # The page embeds the ads that are live right now
+            fresh_for = min(fresh_for, max(0.0, (next_ad - datetime.now(timezone.utc)).total_seconds()))
+        entry = CachedPage(
+            body=response.get_data(),
+            status=response.status_code,
+            headers=[(k, v) for k, v in response.headers.items() if k.lower() not in ('set-cookie', 'content-length')],
+            versions={tag: versions.get(tag, 0) for tag in tags},
+            fresh_until=now + fresh_for,
+            stale_until=now + fresh_for + self.stale_ttl,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        response.headers['X-Page-Cache'] = 'MISS'
+        response.encoded_bodies = entry.encoded_bodies
+        return response
+
+    def _serve(self, key, entry, status):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        response = current_app.response_class(entry.body, status=entry.status, headers=entry.headers)
+        response.headers['X-Page-Cache'] = status
+        response.encoded_bodies = entry.encoded_bodies
+        return response
+
+
+page_cache = PageCache()
@@ -0,0 +1,100 @@
+import base64
+import json
+from urllib.parse import urlencode
+
+from flask import current_app, jsonify, request
+from sqlalchemy import tuple_
+
+from extensions import db
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque token for the sort key of the last row of a page."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError as e:
+        raise InvalidCursor(str(e)) from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('unexpected cursor shape')
+    return values
+
+
+def page_args(size=1):
+    """
+    (limit, after) from ?limit=&after=. 'limit' defaults to API_PAGE_SIZE and
+    is capped at API_MAX_PAGE_SIZE; 'after' is the decoded cursor of 'size'
+    values, or None.
+    """
+    limit = request.args.get('limit', current_app.config.get('API_PAGE_SIZE', 100), type=int)
+    limit = max(1, min(limit, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+    token = request.args.get('after')
+    return limit, decode_cursor(token, size) if token else None
+
+
+def unpaged_request():
+    """True for clients that send neither ?limit= nor ?after=, i.e. predate pagination."""
+    return 'limit' not in request.args and 'after' not in request.args
+
+
+def listing_page_args(size=1):
+    """
+    page_args() for listings that returned every row before they were paged.
+
+    Clients that do not page still get one response, but it is capped at
+    API_UNPAGED_LIMIT rows, so a large table no longer turns into a
+    multi-megabyte body built in memory. Rows past the cap are behind the
+    same Link / X-Next-Cursor headers as any page, and paginated() flags the
+    response as deprecated.
+    """
+    if unpaged_request():
+        return current_app.config.get('API_UNPAGED_LIMIT', 1000), None
+    return page_args(size)
+
+
+def keyset_page(statement, columns, limit, after=None):
+    """
+    One page of the select 'statement' ordered by 'columns', a unique key
+    such as the primary key, starting right after the cursor values 'after'.
+
+    The WHERE key > cursor clause lets the index seek straight to the page,
+    so page 1,000 costs what page one does, unlike OFFSET, which reads and
+    drops every row before it. One extra row is fetched to know whether there
+    is a next page. Returns (rows, next cursor or None).
+    """
+    if after is not None:
+        if len(columns) == 1:
+            statement = statement.where(columns[0] > after[0])
+        else:
+            statement = statement.where(tuple_(*columns) > tuple_(*after))
+    rows = db.session.execute(statement.order_by(*columns).limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], column.key) for column in columns)
+
+
+def paginated(data, next_cursor):
+    """
+    JSON response for a page: the body is the list itself, as before; the
+    next page is announced in a Link header (rel="next") and X-Next-Cursor.
+    Responses to clients that do not page carry 'Deprecation: true'.
+    """
+    response = jsonify(data)
+    if unpaged_request():
+        response.headers['Deprecation'] = 'true'
+
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,73 @@
+import threading
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+
+class QueryStats:
+    """
+    Per-endpoint SQL query counts, plus how many lazily injected layout
+    payloads (see LayoutCache.lazy) each endpoint never had to resolve. Every
+    skipped payload is a lookup the eager context processors used to make on
+    each render, and a query whenever the layout cache was cold.
+
+    With QUERY_STATS enabled each response also carries the numbers of its
+    own request in the X-Query-Count and X-Layout-Skipped headers; the
+    latter is 'n/a' when no template was rendered (redirects, JSON, 304s).
+    """
+
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.endpoints = {}
+        app.extensions['query_stats'] = self
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count_query)
+        app.after_request(self._after_request)
+
+    def _count_query(self, *args):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    def _after_request(self, response):
+        queries = g.get('query_count', 0)
+        # Only requests that rendered a template ran the context processors
+        injected = g.get('layout_injected')
+        skipped = None if injected is None else len(injected - set(g.get('layout_values', {})))
+        with self._lock:
+            stats = self.endpoints.setdefault(request.endpoint or '<unmatched>', {
+                'requests': 0, 'queries': 0, 'rendered': 0, 'layout_skipped': 0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += queries
+            if skipped is not None:
+                stats['rendered'] += 1
+                stats['layout_skipped'] += skipped
+        if current_app.config.get('QUERY_STATS'):
+            response.headers['X-Query-Count'] = str(queries)
+            response.headers['X-Layout-Skipped'] = 'n/a' if skipped is None else str(skipped)
+        return response
+
+    def snapshot(self):
+        """
+        Copy of the per-endpoint totals, with per-request averages. Skipped
+        layout payloads are averaged over the requests that rendered a
+        template (None if none did).
+        """
+        with self._lock:
+            return {
+                endpoint: dict(stats,
+                               queries_per_request=round(stats['queries'] / stats['requests'], 2),
+                               layout_skipped_per_request=(round(stats['layout_skipped'] / stats['rendered'], 2)
+                                                           if stats['rendered'] else None))
+                for endpoint, stats in self.endpoints.items()
+            }
+
+
+query_stats = QueryStats()
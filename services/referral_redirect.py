@@ -0,0 +1,120 @@
+import threading
+import time
+
+from sqlalchemy import or_
+from werkzeug.urls import iri_to_uri
+
+from extensions import db
+from models import Afiliado
+from services.click_filter import client_ip
+
+
+class ReferralLinks:
+    """
+    In-memory map of afiliado_id -> enlace_referido for active affiliates.
+
+    The map is rebuilt by the admin affiliate routes right after they commit.
+    Other worker processes pick up those changes when their copy is older
+    than REFERRAL_LINKS_TTL seconds; that reload runs in a background thread
+    so the redirect itself never waits on the database.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.ttl = 60
+        self._links = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('REFERRAL_LINKS_TTL', 60)
+        self._links = None
+        app.extensions['referral_links'] = self
+
+    def get(self, afiliado_id):
+        """Returns the (URI-encoded) referral link, or None if unknown or inactive."""
+        links = self._links
+        if links is None:
+            links = self.reload()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            self._refresh_in_background()
+        return links.get(afiliado_id)
+
+    def reload(self):
+        """Rebuilds the map from the database. Needs no active app context."""
+        with self.app.app_context():
+            rows = db.session.query(Afiliado.id, Afiliado.enlace_referido).filter(
+                # Rows created before the 'activo' column existed are NULL
+                or_(Afiliado.activo.is_(True), Afiliado.activo.is_(None))
+            ).all()
+        links = {afiliado_id: iri_to_uri(enlace) for afiliado_id, enlace in rows if enlace}
+        with self._lock:
+            self._links = links
+            self._loaded_at = time.monotonic()
+        return links
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Error reloading referral links: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name='referral-links-reload', daemon=True).start()
+
+
+class ReferralRedirectMiddleware:
+    """
+    WSGI middleware that answers GET /ref/<afiliado_id> before Flask sees the
+    request: no routing, no app context, no context processors and no
+    database reads. The click is handed to the click counter; HEAD requests
+    get the same redirect but are not counted.
+
+    Anything it cannot answer (unknown or inactive affiliates, other methods
+    or paths) falls through to the wrapped Flask app unchanged.
+    """
+
+    PREFIX = '/ref/'
+
+    def __init__(self, wsgi_app, links, counter):
+        self.wsgi_app = wsgi_app
+        self.links = links
+        self.counter = counter
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(self.PREFIX) and environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            afiliado_id = path[len(self.PREFIX):]
+            if afiliado_id.isascii() and afiliado_id.isdigit():
+                afiliado_id = int(afiliado_id)
+                location = self.links.get(afiliado_id)
+                if location is not None:
+                    # HEAD comes from link checkers and previews, not from visitors
+                    if environ['REQUEST_METHOD'] == 'GET':
+                        self.counter.record(
+                            afiliado_id,
+                            referrer=environ.get('HTTP_REFERER'),
+                            user_agent=environ.get('HTTP_USER_AGENT'),
+                            ip=client_ip(environ)
+                        )
+                    start_response('302 FOUND', [
+                        ('Location', location),
+                        ('Content-Length', '0'),
+                        ('Cache-Control', 'no-store'),
+                    ])
+                    return [b'']
+        return self.wsgi_app(environ, start_response)
+
+
+referral_links = ReferralLinks()
@@ -0,0 +1,248 @@
+import re
+from html import unescape
+from unicodedata import normalize
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, text
+
+from extensions import db
+from models import Producto, Articulo
+from services.markdown_cache import render_markdown
+
+INDEX_TABLE = 'search_index'
+# Result kinds (search_index.kind)
+KIND_PRODUCT = 'producto'
+KIND_ARTICLE = 'articulo'
+# Title matches count ten times more than body matches
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+
+NON_WORD_RE = re.compile(r'[^\w\s]+')
+# Markup is not text: element contents that are code, then comments and tags
+HIDDEN_ELEMENT_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<!--.*?-->|<[^>]*>', re.DOTALL)
+
+
+def fold(value):
+    """
+    Lower-cased ASCII text with accents removed, the same normalization as
+    utils.slugify but keeping words apart: 'Cámara Réflex' -> 'camara reflex'.
+    """
+    if not value:
+        return ''
+    value = normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(NON_WORD_RE.sub(' ', value).lower().split())
+
+
+def html_text(html):
+    """Visible text of an HTML fragment: no tags, attribute values or entities."""
+    if not html:
+        return ''
+    return unescape(TAG_RE.sub(' ', HIDDEN_ELEMENT_RE.sub(' ', html)))
+
+
+def article_body(contenido, contenido_html):
+    """Indexed text of an article: its rendered HTML (markdown_cache.py) without the markup."""
+    return fold(html_text(contenido_html if contenido_html is not None else render_markdown(contenido)))
+
+
+def query_terms(query):
+    """Folded words of a search box query; each one matches as a prefix."""
+    return fold(query).split()
+
+
+# -------------------- Schema --------------------
+def create_index_table(connection):
+    """Creates the full-text table for the connection's dialect (idempotent)."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, prefix='2 3')"
+        ))
+    elif dialect == 'postgresql':
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, title TEXT NOT NULL, body TEXT NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+            ") STORED, PRIMARY KEY (kind, ref_id))"
+        ))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{INDEX_TABLE}_document ON {INDEX_TABLE} USING GIN (document)"
+        ))
+    else:
+        # No full-text support: same columns, matched with LIKE on the folded text
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, title TEXT NOT NULL, body TEXT NOT NULL, "
+            "PRIMARY KEY (kind, ref_id))"
+        ))
+
+
+def drop_index_table(connection):
+    connection.execute(text(f"DROP TABLE IF EXISTS {INDEX_TABLE}"))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Keeps Alembic autogenerate away from the index (and FTS5's shadow tables)."""
+    return not (type_ == 'table' and reflected and compare_to is None and name.startswith(INDEX_TABLE))
+
+
+# -------------------- Documents --------------------
+def document_for(instance):
+    """(kind, id, title, body) indexed for a product or article, or None."""
+    if isinstance(instance, Producto):
+        return KIND_PRODUCT, instance.id, fold(instance.nombre), fold(instance.descripcion)
+    if isinstance(instance, Articulo):
+        return KIND_ARTICLE, instance.id, fold(instance.titulo), article_body(instance.contenido, instance.contenido_html)
+    return None
+
+
+def delete_documents(connection, keys):
+    if keys:
+        connection.execute(
+            text(f"DELETE FROM {INDEX_TABLE} WHERE kind = :kind AND ref_id = :ref_id"),
+            [{'kind': kind, 'ref_id': ref_id} for kind, ref_id in keys]
+        )
+
+
+def write_documents(connection, documents):
+    """Replaces the index rows of 'documents' [(kind, id, title, body)]."""
+    if not documents:
+        return
+    delete_documents(connection, [(kind, ref_id) for kind, ref_id, _, _ in documents])
+    connection.execute(
+        text(f"INSERT INTO {INDEX_TABLE} (kind, ref_id, title, body) VALUES (:kind, :ref_id, :title, :body)"),
+        [{'kind': kind, 'ref_id': ref_id, 'title': title, 'body': body} for kind, ref_id, title, body in documents]
+    )
+
+
+def rebuild(connection, batch_size=500):
+    """Reindexes every product and article. Returns the number of documents."""
+    create_index_table(connection)
+    connection.execute(text(f"DELETE FROM {INDEX_TABLE}"))
+    total = 0
+    for kind, columns, body in (
+        (KIND_PRODUCT, (Producto.id, Producto.nombre, Producto.descripcion), fold),
+        (KIND_ARTICLE, (Articulo.id, Articulo.titulo, Articulo.contenido, Articulo.contenido_html), article_body),
+    ):
+        result = connection.execution_options(yield_per=batch_size).execute(db.select(*columns).order_by(columns[0]))
+        for rows in result.partitions():
+            connection.execute(
+                text(f"INSERT INTO {INDEX_TABLE} (kind, ref_id, title, body) VALUES (:kind, :ref_id, :title, :body)"),
+                [{'kind': kind, 'ref_id': ref_id, 'title': fold(title), 'body': body(*values)}
+                 for ref_id, title, *values in rows]
+            )
+            total += len(rows)
+    return total
+
+
+# -------------------- Queries --------------------
+def _match(dialect, terms):
+    """(WHERE clause, rank expression, params) matching every term as a prefix."""
+    if dialect == 'sqlite':
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        return (f"{INDEX_TABLE} MATCH :match",
+                f"bm25({INDEX_TABLE}, 0, 0, {TITLE_WEIGHT}, {BODY_WEIGHT})",
+                {'match': expression})
+    if dialect == 'postgresql':
+        expression = ' & '.join(f'{term}:*' for term in terms)
+        return ("document @@ to_tsquery('simple', :match)",
+                "-ts_rank(document, to_tsquery('simple', :match))",
+                {'match': expression})
+    clauses, params = [], {}
+    for i, term in enumerate(terms):
+        clauses.append(f"(title LIKE :t{i} OR body LIKE :t{i})")
+        params[f't{i}'] = f'%{term}%'
+    return ' AND '.join(clauses), 'ref_id', params
+
+
+def search(query, limit, offset=0):
+    """
+    One page of products and articles matching every word of 'query', ranked
+    together, best match first. Returns (results, total).
+
+    A single round trip: the rows to display are joined in, and the total
+    comes from a window count over the same match. Past the last page no
+    row carries it, so total is then 0.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], 0
+    connection = db.session.connection()
+    where, rank, params = _match(connection.dialect.name, terms)
+    params.update(limit=limit, offset=offset)
+    statement = text(
+        f"WITH hits AS (SELECT kind, ref_id, {rank} AS rank FROM {INDEX_TABLE} WHERE {where}) "
+        "SELECT hits.kind, hits.ref_id, count(*) OVER () AS total, "
+        "p.nombre, p.slug AS p_slug, p.precio, p.descripcion, p.imagen, p.link, "
+        "a.titulo, a.slug AS a_slug, a.contenido, a.fecha "
+        "FROM hits "
+        f"LEFT JOIN producto p ON hits.kind = '{KIND_PRODUCT}' AND p.id = hits.ref_id "
+        f"LEFT JOIN articulo a ON hits.kind = '{KIND_ARTICLE}' AND a.id = hits.ref_id "
+        "ORDER BY hits.rank, hits.kind, hits.ref_id LIMIT :limit OFFSET :offset"
+    ).columns(precio=db.Float, fecha=db.DateTime)
+    results, total = [], 0
+    for row in connection.execute(statement, params):
+        total = row.total
+        if row.kind == KIND_PRODUCT and row.p_slug is not None:
+            results.append({'kind': KIND_PRODUCT, 'id': int(row.ref_id), 'nombre': row.nombre, 'slug': row.p_slug,
+                            'precio': row.precio, 'descripcion': row.descripcion, 'imagen': row.imagen, 'link': row.link})
+        elif row.kind == KIND_ARTICLE and row.a_slug is not None:
+            results.append({'kind': KIND_ARTICLE, 'id': int(row.ref_id), 'titulo': row.titulo, 'slug': row.a_slug,
+                            'contenido': row.contenido, 'fecha': row.fecha})
+    return results, total
+
+
+# -------------------- Session hooks --------------------
+def _after_flush(session, flush_context):
+    documents, removed = {}, set()
+    for instance in session.new:
+        document = document_for(instance)
+        if document is not None:
+            documents[document[:2]] = document
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            document = document_for(instance)
+            if document is not None:
+                documents[document[:2]] = document
+    for instance in session.deleted:
+        document = document_for(instance)
+        if document is not None:
+            removed.add(document[:2])
+            documents.pop(document[:2], None)
+    if documents or removed:
+        connection = session.connection()
+        delete_documents(connection, removed)
+        write_documents(connection, list(documents.values()))
+
+
+def register_search_hooks():
+    """Indexes products and articles in the same transaction as their changes."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+    # db.create_all() / drop_all() (tests, first run) handle the index too
+    if not event.contains(db.metadata, 'after_create', _after_create):
+        event.listen(db.metadata, 'after_create', _after_create)
+        event.listen(db.metadata, 'before_drop', _before_drop)
+
+
+def _after_create(target, connection, **kw):
+    create_index_table(connection)
+
+
+def _before_drop(target, connection, **kw):
+    drop_index_table(connection)
+
+
+# -------------------- CLI: flask search ... --------------------
+search_cli = AppGroup('search', help='Índice de búsqueda de productos y artículos.')
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Rebuilds the full-text index from the producto and articulo tables."""
+    with db.engine.begin() as connection:
+        total = rebuild(connection)
+    click.echo(f"Documentos indexados: {total}")
@@ -0,0 +1,118 @@
+from flask.json.provider import DefaultJSONProvider
+
+from extensions import db
+from models import Producto, Articulo, Categoria, Subcategoria
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+
+class Schema:
+    """
+    JSON shape of a model, applied to plain Core rows.
+
+    'fields' maps each JSON key to a model attribute (a tuple when they have
+    the same names). select() builds the statement for a subset of keys and
+    converter() the function turning each of its rows into a dict: a zip of
+    keys and values, with dates as ISO 8601 strings. No ORM objects, no
+    identity map, and no per-row attribute lookups.
+    """
+
+    def __init__(self, model, fields):
+        if not isinstance(fields, dict):
+            fields = {name: name for name in fields}
+        self.model = model
+        self.fields = tuple(fields)
+        self._attributes = fields
+        self._converters = {}
+
+    def columns(self, fields=None):
+        return [getattr(self.model, self._attributes[key]) for key in (fields or self.fields)]
+
+    def select(self, fields=None):
+        return db.select(*self.columns(fields))
+
+    def converter(self, fields=None):
+        """row -> dict for rows of select(fields), built once per field list."""
+        keys = tuple(fields or self.fields)
+        convert = self._converters.get(keys)
+        if convert is None:
+            dates = [key for key, column in zip(keys, self.columns(keys))
+                     if isinstance(column.type, (db.DateTime, db.Date))]
+
+            def convert(row):
+                data = dict(zip(keys, row))
+                for key in dates:
+                    if data[key] is not None:
+                        data[key] = data[key].isoformat()
+                return data
+
+            self._converters[keys] = convert
+        return convert
+
+    def dump(self, rows, fields=None):
+        convert = self.converter(fields)
+        return [convert(row) for row in rows]
+
+
+PRODUCTO = Schema(Producto, ('id', 'nombre', 'slug', 'precio', 'descripcion', 'imagen', 'link', 'subcategoria_id',
+                             'external_id', 'fecha_creacion', 'fecha_actualizacion'))
+ARTICULO = Schema(Articulo, ('id', 'titulo', 'slug', 'contenido', 'autor', 'fecha', 'fecha_actualizacion', 'imagen'))
+CATEGORIA = Schema(Categoria, ('id', 'nombre', 'slug'))
+SUBCATEGORIA = Schema(Subcategoria, ('id', 'nombre', 'slug', 'categoria_id'))
+# Products as the chatbot prompt describes them
+PRODUCTO_CHATBOT = Schema(Producto, {'id': 'id', 'name': 'nombre', 'price': 'precio',
+                                     'description': 'descripcion', 'link': 'link'})
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, for jsonify() and app.json.
+
+    Output matches DefaultJSONProvider: sorted keys, compact unless
+    debugging, and dates still go through its default() (HTTP dates), like
+    every other type orjson does not know. Non-ASCII text is written as
+    UTF-8 instead of \\u escapes, which decodes to the same value.
+
+    Calls with extra arguments go to DefaultJSONProvider: orjson has no
+    equivalent for them, and the session cookie serializer decodes with
+    loads(..., object_hook=...) to restore tuples, bytes and the like.
+    """
+
+    def _options(self, indent=False):
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._options(indent)) + b'\n',
+            mimetype=self.mimetype
+        )
+
+
+def init_json_provider(app):
+    """Installs OrjsonProvider when JSON_PROVIDER is 'orjson' and orjson is installed."""
+    if app.config.get('JSON_PROVIDER') == 'orjson':
+        if orjson is None:
+            print("JSON_PROVIDER=orjson but orjson is not installed; using the standard JSON encoder.")
+        else:
+            app.json = OrjsonProvider(app)
+    return app.json
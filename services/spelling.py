@@ -0,0 +1,177 @@
+import threading
+import time
+from array import array
+from collections import Counter
+
+from sqlalchemy import text
+
+from extensions import db
+from services.invalidation import tag_versions
+from services.search_index import INDEX_TABLE, query_terms
+
+# Cache tags (services/invalidation.py) of the indexed products and articles
+SOURCE_TAGS = ('products', 'articles')
+# Words shorter than this have too few trigrams to be corrected reliably
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = 30
+# Minimum trigram similarity (shared / union) of a correction, as pg_trgm's default
+MIN_SIMILARITY = 0.3
+
+
+def trigrams(word):
+    """Character trigrams of a folded word, padded like pg_trgm: 'sol' -> '  s', ' so', 'sol', 'ol '."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Trigram postings over a fixed vocabulary.
+
+    Words are numbered by descending frequency, and every trigram maps to an
+    array('I') of the numbers of the words containing it, so memory grows
+    with the vocabulary size only (a few MB for 50,000 words). A lookup
+    counts the shared trigrams of the words listed under the query's
+    trigrams; no word is compared character by character.
+    """
+
+    def __init__(self, frequencies=(), max_words=50000):
+        words = [
+            word for word, _ in Counter(frequencies).most_common()
+            if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH and not word.isdigit()
+        ][:max_words]
+        self.words = words
+        self._ids = {word: i for i, word in enumerate(words)}
+        self._sizes = array('B', (len(trigrams(word)) for word in words))
+        postings = {}
+        for i, word in enumerate(words):
+            for gram in trigrams(word):
+                postings.setdefault(gram, array('I')).append(i)
+        self._postings = postings
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self._ids
+
+    def closest(self, word, min_similarity=MIN_SIMILARITY):
+        """The most similar known word, or None. Ties go to the more frequent word."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                shared.update(postings)
+        # A word can't reach min_similarity sharing fewer than this many trigrams
+        min_shared = min_similarity * len(grams)
+        best, best_score = None, min_similarity
+        for i, count in shared.items():
+            if count < min_shared:
+                continue
+            score = count / (len(grams) + self._sizes[i] - count)
+            # Lower ids are more frequent, so they win ties
+            if score > best_score or (score == best_score and (best is None or i < best)):
+                best, best_score = i, score
+        return self.words[best] if best is not None else None
+
+
+class Spelling:
+    """
+    "Did you mean" corrections for searches that find nothing.
+
+    The vocabulary is every folded word of the search index (product names
+    and descriptions, article titles and bodies), capped at SPELLING_MAX_WORDS
+    most frequent words. It is loaded on first use and reloaded, at most every
+    SPELLING_REFRESH_S seconds, once the products or articles tags have moved.
+    The reload runs in a background thread while the current index keeps
+    answering, so no search or admin save waits for it. A new word therefore
+    takes a while to be suggested, which is harmless: the index is only
+    consulted after an exact search came back empty.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_words = 50000
+        self.refresh_interval = 300
+        self._index = None
+        self._versions = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self.rebuilds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_words = app.config.get('SPELLING_MAX_WORDS', 50000)
+        self.refresh_interval = app.config.get('SPELLING_REFRESH_S', 300)
+        self._index, self._versions, self._built_at = None, {}, None
+        app.extensions['spelling'] = self
+
+    def rebuild(self):
+        versions = tag_versions.snapshot()
+        frequencies = Counter()
+        result = db.session.connection().execution_options(yield_per=1000).execute(
+            text(f"SELECT title, body FROM {INDEX_TABLE}")
+        )
+        for rows in result.partitions():
+            for title, body in rows:
+                # Document frequency: a word repeated in one description counts once
+                frequencies.update(set(f'{title} {body}'.split()))
+        index = TrigramIndex(frequencies, self.max_words)
+        with self._lock:
+            self._index = index
+            self._versions = {tag: versions.get(tag, 0) for tag in SOURCE_TAGS}
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+        return index
+
+    @property
+    def index(self):
+        index = self._index
+        if index is None:
+            return self.rebuild()
+        if time.monotonic() - self._built_at >= self.refresh_interval:
+            versions = tag_versions.snapshot()
+            if any(versions.get(tag, 0) > self._versions.get(tag, 0) for tag in SOURCE_TAGS):
+                self._rebuild_in_background()
+        return index
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                with self.app.app_context():
+                    self.rebuild()
+            except Exception as e:
+                print(f"Error rebuilding the spelling index: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=run, name='spelling-rebuild', daemon=True).start()
+
+    def correct(self, query):
+        """
+        'query' with its unknown words replaced by the closest known ones, or
+        None when there is nothing to correct.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        index = self.index
+        corrected = []
+        for term in terms:
+            if term in index or len(term) < MIN_WORD_LENGTH:
+                corrected.append(term)
+            else:
+                corrected.append(index.closest(term) or term)
+        return ' '.join(corrected) if corrected != terms else None
+
+
+spelling = Spelling()
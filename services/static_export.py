@@ -0,0 +1,165 @@
+import contextlib
+import json
+import os
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit
+
+import click
+from flask import current_app, g, request_finished
+from flask.cli import AppGroup
+
+from services.ad_schedule import ad_schedule
+from services.conditional import content_validators
+from services.invalidation import tag_versions
+
+MANIFEST_NAME = '.export-manifest.json'
+SITEMAP_PATH = '/sitemap.xml'
+SITEMAP_NS = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+
+
+def output_file(path):
+    """Relative file for a URL path: /producto/x -> producto/x/index.html."""
+    path = path.strip('/')
+    if not path:
+        return 'index.html'
+    if '.' in path.rsplit('/', 1)[-1]:
+        return path
+    return f'{path}/index.html'
+
+
+def _write_atomic(target, data):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f'{target}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, target)
+
+
+@contextlib.contextmanager
+def _capture_content_tags(app):
+    """Collects the dependency tags (see services/conditional.py) of each request."""
+    captured = {}
+
+    def record(sender, response, **extra):
+        # Requests made under the CLI's app context share its 'g'
+        captured['tags'] = g.pop('content_tags', None)
+
+    request_finished.connect(record, app)
+    try:
+        yield captured
+    finally:
+        request_finished.disconnect(record, app)
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_site(output_dir, base_url='http://localhost', full=False):
+    """
+    Renders every page listed in the sitemap (and the sitemap itself) into
+    'output_dir' as static files.
+
+    The manifest next to them records, for each file, the version of every
+    dependency tag it was rendered from ('product:3', 'articles', 'layout',
+    ...). Later runs only render the files whose tags moved since, remove
+    the files whose URL left the sitemap, and start over when the release
+    or the live ads change. Pages that do not declare their dependencies
+    (forms with CSRF tokens, search) are left to the dynamic app.
+    Returns the counts of rendered, unchanged and removed files, plus the
+    paths left dynamic and those that failed to render.
+    """
+    app = current_app._get_current_object()
+    tag_versions.refresh()
+    last_ad = ad_schedule.last_transition()
+    state = {
+        'release': content_validators.release,
+        'ads': last_ad.isoformat() if last_ad else None,
+    }
+    manifest = load_manifest(output_dir)
+    if full or manifest.get('state') != state:
+        manifest = {}
+    pages = manifest.get('pages', {})
+    result = {'rendered': 0, 'unchanged': 0, 'removed': 0, 'dynamic': [], 'failed': []}
+
+    client = app.test_client()
+    with _capture_content_tags(app) as captured:
+        def render(path):
+            captured.clear()
+            response = client.get(path, base_url=base_url)
+            return response, captured.get('tags')
+
+        def is_current(entry):
+            versions = tag_versions.snapshot()
+            return all(versions.get(tag, 0) == version for tag, version in entry['tags'].items())
+
+        # The sitemap is itself an exported page; its body lists the others
+        response, sitemap_tags = render(SITEMAP_PATH)
+        if response.status_code != 200:
+            raise click.ClickException(f'No se pudo generar el sitemap ({response.status_code}).')
+        sitemap_body = response.get_data()
+        paths = [SITEMAP_PATH]
+        for loc in ET.fromstring(sitemap_body).iterfind('sm:url/sm:loc', SITEMAP_NS):
+            path = urlsplit(loc.text.strip()).path or '/'
+            if path not in paths:
+                paths.append(path)
+
+        new_pages = {}
+        for path in paths:
+            entry = pages.get(path)
+            if entry is not None and is_current(entry) and os.path.exists(os.path.join(output_dir, entry['file'])):
+                new_pages[path] = entry
+                result['unchanged'] += 1
+                continue
+            if path == SITEMAP_PATH:
+                body, tags = sitemap_body, sitemap_tags
+            else:
+                response, tags = render(path)
+                if response.status_code != 200:
+                    result['failed'].append((path, response.status_code))
+                    continue
+                if tags is None:
+                    result['dynamic'].append(path)
+                    continue
+                body = response.get_data()
+            # Versions as of this render; a commit racing it only causes an extra rebuild next run
+            versions = tag_versions.snapshot()
+            entry = {'file': output_file(path), 'tags': {tag: versions.get(tag, 0) for tag in sorted(tags)}}
+            _write_atomic(os.path.join(output_dir, entry['file']), body)
+            new_pages[path] = entry
+            result['rendered'] += 1
+
+    for path, entry in pages.items():
+        if path not in new_pages and not any(p['file'] == entry['file'] for p in new_pages.values()):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(output_dir, entry['file']))
+            result['removed'] += 1
+
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME),
+                  json.dumps({'state': state, 'pages': new_pages}, indent=1, sort_keys=True).encode())
+    return result
+
+
+# -------------------- CLI: flask export ... --------------------
+export_cli = AppGroup('export', help='Exportación estática del sitio público.')
+
+
+@export_cli.command('site')
+@click.option('--output', default=None, help='Directorio de salida (STATIC_EXPORT_DIR por defecto).')
+@click.option('--base-url', default=None, help='URL pública del sitio (STATIC_EXPORT_BASE_URL por defecto).')
+@click.option('--full', is_flag=True, help='Regenera todas las páginas aunque no hayan cambiado.')
+def export_site_command(output, base_url, full):
+    """Pre-renders the sitemap pages; only changed pages are rebuilt."""
+    output = output or current_app.config['STATIC_EXPORT_DIR']
+    base_url = base_url or current_app.config['STATIC_EXPORT_BASE_URL']
+    result = export_site(output, base_url=base_url, full=full)
+    click.echo(f"Páginas generadas: {result['rendered']}, sin cambios: {result['unchanged']}, "
+               f"eliminadas: {result['removed']}")
+    for path in result['dynamic']:
+        click.echo(f"  Dinámica (no exportada): {path}")
+    for path, status in result['failed']:
+        click.echo(f"  Error {status}: {path}", err=True)
@@ -0,0 +1,213 @@
+import threading
+from bisect import bisect_left, insort
+
+from sqlalchemy import event
+
+from extensions import db
+from models import Producto, Articulo, Subcategoria
+from services.invalidation import tag_versions
+from utils import slugify
+
+# Suggestion kinds and the endpoint each one links to
+KIND_PRODUCT, KIND_ARTICLE, KIND_SUBCATEGORY = 'producto', 'articulo', 'subcategoria'
+ENDPOINTS = {
+    KIND_PRODUCT: 'publico.product_detail',
+    KIND_ARTICLE: 'publico.guia_detalle',
+    KIND_SUBCATEGORY: 'publico.productos_por_slug',
+}
+# Cache tags (services/invalidation.py) whose changes the index must reflect
+SOURCE_TAGS = ('products', 'articles', 'categories')
+# Index entries looked at per query before ranking; bounds one-letter queries
+MAX_SCAN = 200
+
+
+def suggestion_for(instance):
+    """(kind, id, label, slug) suggested for a model instance, or None."""
+    if isinstance(instance, Producto):
+        return KIND_PRODUCT, instance.id, instance.nombre, instance.slug
+    if isinstance(instance, Articulo):
+        return KIND_ARTICLE, instance.id, instance.titulo, instance.slug
+    if isinstance(instance, Subcategoria):
+        return KIND_SUBCATEGORY, instance.id, instance.nombre, instance.slug
+    return None
+
+
+def index_keys(label):
+    """
+    slugify-normalized keys under which 'label' is found: the whole text and
+    every word start, so 'Cámara Réflex' matches 'cam', 'camara-r' and 'refl'.
+    """
+    words = slugify(label).split('-')
+    return ['-'.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index for the search box (/api/suggest).
+
+    A sorted list of (key, kind, id) tuples: a prefix query is one
+    bisect plus a short forward scan, and never touches the database. The
+    index is built on first use. Commits made by this process update it in
+    place (see the session hooks below), so an admin save costs a few
+    insorts, not a rebuild. When the 'products', 'articles' or 'categories'
+    tags move past the versions it reflects, i.e. another worker wrote, it
+    is rebuilt in a background thread; lookups keep using the current index
+    until the new one is swapped in.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.limit = 8
+        self._keys = None # sorted [(key, kind, id)]
+        self._docs = {} # {(kind, id): (label, slug, whole-text key)}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self.rebuilds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.limit = app.config.get('SUGGEST_LIMIT', 8)
+        with self._lock:
+            self._keys, self._docs, self._versions = None, {}, {}
+        app.extensions['suggest_index'] = self
+        register_session_hooks()
+
+    # ---- building ----
+    def rebuild(self):
+        # Versions first: a change committed during the build triggers another one
+        versions = tag_versions.snapshot()
+        docs = {}
+        for kind, columns in (
+            (KIND_PRODUCT, (Producto.id, Producto.nombre, Producto.slug)),
+            (KIND_ARTICLE, (Articulo.id, Articulo.titulo, Articulo.slug)),
+            (KIND_SUBCATEGORY, (Subcategoria.id, Subcategoria.nombre, Subcategoria.slug)),
+        ):
+            for ref_id, label, slug in db.session.execute(db.select(*columns)):
+                docs[(kind, ref_id)] = (label, slug, slugify(label))
+        keys = sorted(
+            (key, kind, ref_id) for (kind, ref_id), (label, _, _) in docs.items() for key in index_keys(label)
+        )
+        with self._lock:
+            self._keys, self._docs = keys, docs
+            self._versions = {tag: versions.get(tag, 0) for tag in SOURCE_TAGS}
+            self.rebuilds += 1
+
+    def _sync(self):
+        if self._keys is None:
+            self.rebuild()
+            return
+        versions = tag_versions.snapshot()
+        if any(versions.get(tag, 0) > self._versions.get(tag, 0) for tag in SOURCE_TAGS):
+            self._rebuild_in_background()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                with self.app.app_context():
+                    self.rebuild()
+            except Exception as e:
+                print(f"Error rebuilding the suggest index: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=run, name='suggest-index-rebuild', daemon=True).start()
+
+    # ---- incremental updates ----
+    def _remove(self, kind, ref_id):
+        doc = self._docs.pop((kind, ref_id), None)
+        if doc is None:
+            return
+        for key in index_keys(doc[0]):
+            entry = (key, kind, ref_id)
+            position = bisect_left(self._keys, entry)
+            if position < len(self._keys) and self._keys[position] == entry:
+                del self._keys[position]
+
+    def apply(self, changes, versions):
+        """
+        Applies committed changes {(kind, id): (label, slug) or None} made by
+        this process; 'versions' are the tag versions that commit produced.
+        """
+        with self._lock:
+            if self._keys is None:
+                return # Not built yet: the first lookup loads everything
+            for (kind, ref_id), doc in changes.items():
+                self._remove(kind, ref_id)
+                if doc is not None:
+                    label, slug = doc
+                    self._docs[(kind, ref_id)] = (label, slug, slugify(label))
+                    for key in index_keys(label):
+                        insort(self._keys, (key, kind, ref_id))
+            for tag, version in versions.items():
+                if tag in SOURCE_TAGS:
+                    self._versions[tag] = max(self._versions.get(tag, 0), version)
+
+    # ---- lookups ----
+    def suggest(self, query, limit=None):
+        """
+        Up to 'limit' [(kind, label, slug)] whose text, or one of its words,
+        starts with 'query'. Whole-text matches come first, then shorter labels.
+        """
+        prefix = slugify(query).strip('-')
+        if not prefix:
+            return []
+        self._sync()
+        limit = limit or self.limit
+        candidates = {}
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            for key, kind, ref_id in self._keys[position:position + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                label, slug, whole = self._docs[(kind, ref_id)]
+                rank = (key != whole, len(label), label)
+                if (kind, ref_id) not in candidates or rank < candidates[(kind, ref_id)][0]:
+                    candidates[(kind, ref_id)] = (rank, kind, label, slug)
+        ranked = sorted(candidates.values())
+        return [(kind, label, slug) for _, kind, label, slug in ranked[:limit]]
+
+
+suggest_index = SuggestIndex()
+
+
+# -------------------- Session hooks --------------------
+def _after_flush(session, flush_context):
+    changes = session.info.setdefault('suggest_changes', {})
+    for instance in session.new | session.dirty:
+        suggestion = suggestion_for(instance)
+        if suggestion is not None and (instance in session.new or session.is_modified(instance)):
+            kind, ref_id, label, slug = suggestion
+            changes[(kind, ref_id)] = (label, slug)
+    for instance in session.deleted:
+        suggestion = suggestion_for(instance)
+        if suggestion is not None:
+            changes[suggestion[:2]] = None
+
+
+def _after_commit(session):
+    changes = session.info.pop('suggest_changes', None)
+    if changes:
+        # Tag versions of this commit, recorded by services/invalidation.py
+        versions = {tag: version for tag, (version, _) in session.info.get('cache_tags', {}).items()}
+        suggest_index.apply(changes, versions)
+
+
+def _after_rollback(session):
+    session.info.pop('suggest_changes', None)
+
+
+def register_session_hooks():
+    """Updates the index in place after each commit that changes its rows."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        # Before services/invalidation.py pops the commit's tag versions
+        event.listen(db.session, 'after_commit', _after_commit, insert=True)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,111 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+TEMPLATE_EXTENSIONS = ('.html', '.xml')
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache keyed by template name only, which tolerates a
+    read-only directory. The cache is prebuilt at deploy time (flask
+    templates compile) and shipped; serverless instances only read it, and
+    anything they would add is just dropped.
+    """
+
+    def get_cache_key(self, name, filename=None):
+        # Name only: the deploy path usually differs from the build path
+        return super().get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+class TemplateCache:
+    """
+    Compiled templates for cold starts.
+
+    With TEMPLATE_CACHE_DIR set, Jinja stores the compiled code of every
+    template there, keyed by template name and source checksum, so a new
+    process loads it instead of parsing and compiling the source again. An
+    edited template simply misses and is compiled anew. The templates named in
+    TEMPLATE_WARMUP ('all' for every one) are also loaded while the app is
+    created, so the first request does not pay for them either.
+    """
+
+    def __init__(self, app=None):
+        self.bytecode_cache = None
+        self.warmed = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        directory = app.config.get('TEMPLATE_CACHE_DIR')
+        self.bytecode_cache = None
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                print(f"Template cache directory unavailable ({directory}): {e}")
+            if os.path.isdir(directory):
+                self.bytecode_cache = TemplateBytecodeCache(directory)
+        app.jinja_env.bytecode_cache = self.bytecode_cache
+        app.extensions['template_cache'] = self
+        self.warmed = self.warm_up(app, app.config.get('TEMPLATE_WARMUP', ''))
+
+    def template_names(self, app):
+        return sorted(name for name in app.jinja_env.list_templates() if name.endswith(TEMPLATE_EXTENSIONS))
+
+    def warm_up(self, app, names):
+        """Loads templates into the environment's in-memory cache."""
+        if names == 'all':
+            names = self.template_names(app)
+        elif isinstance(names, str):
+            names = [name.strip() for name in names.split(',') if name.strip()]
+        warmed = []
+        for name in names:
+            try:
+                app.jinja_env.get_template(name)
+                warmed.append(name)
+            except Exception as e:
+                print(f"Error warming up template {name}: {e}")
+        return warmed
+
+    def compile_all(self, app):
+        """Compiles every template into the bytecode cache. Returns (compiled, errors)."""
+        if self.bytecode_cache is None:
+            raise click.ClickException('TEMPLATE_CACHE_DIR no está configurado.')
+        # Templates already in memory (warm-up) would not reach the bytecode cache
+        if app.jinja_env.cache is not None:
+            app.jinja_env.cache.clear()
+        compiled, errors = [], []
+        for name in self.template_names(app):
+            try:
+                app.jinja_env.get_template(name)
+                compiled.append(name)
+            except TemplateSyntaxError as e:
+                errors.append((name, f'{e.message} (línea {e.lineno})'))
+        return compiled, errors
+
+
+template_cache = TemplateCache()
+
+
+# -------------------- CLI: flask templates ... --------------------
+templates_cli = AppGroup('templates', help='Caché de plantillas compiladas.')
+
+
+@templates_cli.command('compile')
+def compile_command():
+    """Precompiles templates/ (including admin/ and partials/) into TEMPLATE_CACHE_DIR."""
+    app = current_app._get_current_object()
+    compiled, errors = template_cache.compile_all(app)
+    click.echo(f"Plantillas compiladas: {len(compiled)} en {app.config['TEMPLATE_CACHE_DIR']}")
+    for name, error in errors:
+        click.echo(f"  Error en {name}: {error}", err=True)